@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+ASYNCIO BLOCKCHAIN NODE
+Single event loop P2P node speaking the same protocol as SimpleP2PNode
+
+All peer connections are served by one asyncio loop running in a background
+thread, so hundreds of peers cost one coroutine each instead of one OS thread
+each. The chain is only changed on the loop thread; the public methods used by
+the interactive shell hop onto the loop before touching it. The write-behind
+saver works from a copy of the chain taken on the loop when the save was
+requested, never the live chain.
+
+Anything slow runs in the loop's default executor so other peers keep being
+served meanwhile: hash checks of sync windows and received chains (the result
+is applied back on the loop, re-checked against the chain as it is by then),
+and waits for pending saves before a snapshot is written or installed, history
+is pruned or segments are archived.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Optional
+import argparse
+
+from p2p_protocol import FrameError, read_message, MAX_FRAME_SIZE
+from peer_manager import PeerManager
+from block_store import DURABILITY_BUFFERED, DURABILITY_POLICIES
+from block_codec import CODEC_JSON, CODECS
+from simple_blockchain import (SimpleP2PNode, run_interactive_node, SEND_QUEUE_SIZE,
+                               OVERFLOW_DISCONNECT, OVERFLOW_DROP_NEWEST, OVERFLOW_POLICIES,
+                               PING_INTERVAL, MAX_MISSED_PINGS, CONNECT_TIMEOUT)
+
+class AsyncPeerSender:
+    """Bounded outbound frame queue for one peer, drained by its own writer task"""
+    def __init__(self, peer_id: str, writer: asyncio.StreamWriter, max_queue: int = SEND_QUEUE_SIZE,
+                 overflow_policy: str = OVERFLOW_DISCONNECT, on_error=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.peer_id = peer_id
+        self.writer = writer
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.on_error = on_error
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+        self.sent = 0
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, frame: bytes) -> bool:
+        """Queue a frame; returns False if the peer should be disconnected"""
+        if self.closed:
+            return False
+        if len(self.queue) >= self.max_queue:
+            if self.overflow_policy == OVERFLOW_DISCONNECT:
+                return False
+            self.dropped += 1
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                return True
+            self.queue.popleft()
+        self.queue.append(frame)
+        self.wakeup.set()
+        return True
+
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def close(self):
+        """Stop the writer task and discard anything still queued"""
+        self.closed = True
+        self.queue.clear()
+        self.wakeup.set()
+
+    async def _run(self):
+        try:
+            while True:
+                while not self.queue and not self.closed:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                if self.closed:
+                    return
+                self.writer.write(self.queue.popleft())
+                await self.writer.drain()
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if not self.closed:
+                print(f"❌ Failed to send to {self.peer_id}: {e}")
+                if self.on_error:
+                    self.on_error(self.peer_id)
+
+class AsyncP2PNode(SimpleP2PNode):
+    """P2P node running every connection on a single asyncio event loop"""
+    def __init__(self, host: str = "localhost", port: int = 8333, node_id: str = None,
+                 blockchain_file: str = None, connect_timeout: float = CONNECT_TIMEOUT,
+                 send_queue_size: int = SEND_QUEUE_SIZE, overflow_policy: str = OVERFLOW_DISCONNECT,
+                 ping_interval: float = PING_INTERVAL, max_missed_pings: int = MAX_MISSED_PINGS,
+                 durability: str = DURABILITY_BUFFERED, write_behind: bool = True,
+                 block_codec: str = CODEC_JSON, segment_size: int = None, archive_dir: str = None,
+                 snapshot_interval: int = None, fast_bootstrap: bool = False):
+        super().__init__(host, port, node_id, blockchain_file, send_queue_size, overflow_policy,
+                         ping_interval, max_missed_pings, durability, write_behind, block_codec,
+                         segment_size, archive_dir, snapshot_interval, fast_bootstrap)
+        self.connect_timeout = connect_timeout
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.peer_writers: Dict[str, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._stopped: Optional[asyncio.Event] = None
+        self._tasks = set()  # Background tasks started by message handlers
+
+    def start(self) -> bool:
+        """Start the event loop thread and the listening server"""
+        self.running = True
+        self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._loop_thread.start()
+        self._started.wait(timeout=5)
+        return self._server is not None
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        self._stopped = asyncio.Event()
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_connection, self.host, self.port, limit=MAX_FRAME_SIZE
+            )
+            print(f"✅ {self.node_id} listening on {self.host}:{self.port} (asyncio)")
+        except Exception as e:
+            print(f"❌ Failed to start server on {self.host}:{self.port}: {e}")
+            self.running = False
+            return
+        finally:
+            self._started.set()
+
+        keepalive = asyncio.get_running_loop().create_task(self._keepalive())
+        async with self._server:
+            await self._stopped.wait()
+            keepalive.cancel()
+            for peer_id in list(self.peer_writers.keys()):
+                self.disconnect_peer(peer_id)
+
+    async def _keepalive(self):
+        while self.running:
+            await asyncio.sleep(self.ping_interval)
+            self.check_keepalive()
+
+    def _call_in_loop(self, func, *args, timeout: float = None):
+        """Run func on the event loop thread and return its result"""
+        if self.loop is None or not self.loop.is_running():
+            return func(*args)
+        if threading.current_thread() is self._loop_thread:
+            return func(*args)
+
+        async def runner():
+            result = func(*args)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+
+        return asyncio.run_coroutine_threadsafe(runner(), self.loop).result(timeout)
+
+    def _on_loop(self) -> bool:
+        return self.loop is not None and threading.current_thread() is self._loop_thread
+
+    def _spawn(self, coroutine):
+        """Run a coroutine as a loop task, holding a reference until it finishes"""
+        task = self.loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush_async(self) -> bool:
+        """Wait for pending saves in the default executor so the loop keeps serving peers"""
+        while self.saver and self.saver.pending():
+            if not await asyncio.get_running_loop().run_in_executor(None, self.saver.flush):
+                return False  # Failed saves stay pending; don't retry them in a loop here
+        return True
+
+    def _call_after_flush(self, func, *args):
+        """Run func on the loop once pending saves are on disk (func's own flush then finds nothing)"""
+        if self.loop is None or not self.loop.is_running() or self._on_loop():
+            return func(*args)
+
+        async def runner():
+            await self.flush_async()
+            return func(*args)
+
+        return asyncio.run_coroutine_threadsafe(runner(), self.loop).result()
+
+    def verify_then(self, check, blocks, apply):
+        """Run the block check in the default executor and apply its result back on the loop"""
+        if not self._on_loop():
+            return super().verify_then(check, blocks, apply)
+
+        async def verify():
+            try:
+                valid = await asyncio.get_running_loop().run_in_executor(None, check, blocks)
+            except Exception as e:
+                print(f"❌ Block verification failed: {e}")
+                return
+            apply(valid)
+
+        self._spawn(verify())
+
+    def bootstrap_from(self, peer_id: str, snapshot):
+        """Install a snapshot once pending saves are on disk, without blocking the loop meanwhile"""
+        if not self._on_loop():
+            return super().bootstrap_from(peer_id, snapshot)
+        bootstrap = super().bootstrap_from
+
+        async def install():
+            await self.flush_async()
+            bootstrap(peer_id, snapshot)
+
+        self._spawn(install())
+
+    def create_snapshot(self, height: int = None):
+        """Snapshot at height on the loop, waiting for saves off it (callable from any thread)"""
+        return self._call_after_flush(super().create_snapshot, height)
+
+    def prune_history(self, keep_recent: int = 0) -> int:
+        return self._call_after_flush(super().prune_history, keep_recent)
+
+    def archive_segments(self, keep_recent: int = 0) -> int:
+        return self._call_after_flush(super().archive_segments, keep_recent)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve an inbound peer connection"""
+        addr = writer.get_extra_info('peername')
+        peer_id = f"{addr[0]}:{addr[1]}"
+        print(f"📡 {self.node_id} received connection from {addr}")
+        self.register_peer_writer(peer_id, writer)
+        await self._read_loop(peer_id, reader, writer)
+
+    async def _read_loop(self, peer_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while self.running:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                self.process_message(message, peer_id)
+        except FrameError as e:
+            print(f"⚠️ Invalid frame from {peer_id}: {e}")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f"❌ Error handling peer {peer_id}: {e}")
+        finally:
+            if self.peer_writers.get(peer_id) is writer:
+                self.disconnect_peer(peer_id)
+            else:
+                writer.close()
+
+    async def connect_to_peer_async(self, host: str, port: int) -> bool:
+        """Open an outbound connection from inside the event loop"""
+        peer_id = f"{host}:{port}"
+
+        if peer_id in self.peer_writers:
+            return True
+
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=MAX_FRAME_SIZE),
+                timeout=self.connect_timeout
+            )
+        except Exception as e:
+            print(f"❌ {self.node_id} failed to connect to {peer_id}: {e}")
+            return False
+
+        self.register_peer_writer(peer_id, writer)
+        if peer_id not in self.peers:
+            self.peers.append(peer_id)
+
+        self.on_outbound_connected(peer_id)
+
+        print(f"✅ {self.node_id} connected to {peer_id}")
+        self.loop.create_task(self._read_loop(peer_id, reader, writer))
+        return True
+
+    def connect_to_peer(self, host: str, port: int) -> bool:
+        """Connect to a peer node (from outside the loop; use connect_to_peer_async inside it)"""
+        if self.loop is None:
+            print(f"❌ {self.node_id} is not running")
+            return False
+        return self._call_in_loop(self.connect_to_peer_async, host, port)
+
+    def register_peer_writer(self, peer_id: str, writer: asyncio.StreamWriter):
+        """Track a peer stream and give it its own outbound queue and writer task"""
+        self.peer_writers[peer_id] = writer
+        self.peer_senders[peer_id] = AsyncPeerSender(
+            peer_id, writer, self.send_queue_size, self.overflow_policy, on_error=self.disconnect_peer
+        )
+
+    def disconnect_peer(self, peer_id: str):
+        """Disconnect from a peer"""
+        self.close_peer_sender(peer_id)
+        writer = self.peer_writers.pop(peer_id, None)
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+        if peer_id in self.peers:
+            self.peers.remove(peer_id)
+
+        self.clear_peer_state(peer_id)
+
+    def add_block(self, data: str):
+        """Add new block to our blockchain (callable from any thread)"""
+        return self._call_in_loop(super().add_block, data)
+
+    def get_status(self) -> Dict:
+        status = self._call_in_loop(super().get_status)
+        status['engine'] = 'asyncio'
+        status['connections'] = len(self.peer_writers)
+        return status
+
+    def stop(self):
+        """Stop the node"""
+        print(f"🛑 Stopping {self.node_id}...")
+        self.running = False
+
+        if self.peer_manager:
+            self.peer_manager.stop()
+
+        if self.loop is not None and self._stopped is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self._loop_thread is not None:
+            self._loop_thread.join(timeout=5)
+
+        self.close_storage()
+        print(f"✅ {self.node_id} stopped")
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Asyncio P2P Blockchain Node')
+    parser.add_argument('--port', type=int, default=8333, help='P2P port (default: 8333)')
+    parser.add_argument('--host', type=str, default='localhost', help='Host address (default: localhost)')
+    parser.add_argument('--connect', type=str, help='Bootstrap node to connect to (host:port)')
+    parser.add_argument('--node-id', type=str, help='Node identifier')
+    parser.add_argument('--target-peers', type=int, default=8, help='Outbound connections to maintain (default: 8)')
+    parser.add_argument('--durability', choices=DURABILITY_POLICIES, default=DURABILITY_BUFFERED,
+                        help='Block persistence policy (default: buffered)')
+    parser.add_argument('--block-codec', choices=CODECS, default=CODEC_JSON,
+                        help='Block encoding for disk and (if the peer agrees) wire (default: json)')
+    parser.add_argument('--segment-mb', type=int, help='Split the block log into segments of this many MB')
+    parser.add_argument('--snapshot-interval', type=int, help='Write a chain snapshot every N blocks')
+    parser.add_argument('--fast-bootstrap', action='store_true',
+                        help="Start from a peer's snapshot instead of syncing from genesis")
+
+    args = parser.parse_args()
+
+    node = AsyncP2PNode(
+        host=args.host,
+        port=args.port,
+        node_id=args.node_id,
+        durability=args.durability,
+        block_codec=args.block_codec,
+        segment_size=args.segment_mb * 1024 * 1024 if args.segment_mb else None,
+        snapshot_interval=args.snapshot_interval,
+        fast_bootstrap=args.fast_bootstrap
+    )
+
+    print(f"🚀 Starting asyncio blockchain node on {args.host}:{args.port}")
+
+    if node.start():
+        print(f"✅ Node started successfully")
+        peer_manager = PeerManager(node, target_outbound=args.target_peers)
+
+        if args.connect:
+            if ':' in args.connect:
+                host, port = args.connect.split(':')
+                print(f"🔗 Connecting to bootstrap node {host}:{port}...")
+                peer_manager.add_peer(host, int(port))
+                if node.connect_to_peer(host, int(port)):
+                    print(f"✅ Connected to bootstrap node")
+                else:
+                    print(f"❌ Failed to connect to bootstrap node, will keep retrying")
+
+        peer_manager.start()
+
+        try:
+            run_interactive_node(node)
+        except KeyboardInterrupt:
+            print("\n🔔 Received interrupt signal")
+
+    else:
+        print("❌ Failed to start node")
+
+    print("👋 Goodbye!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+COMPACT BLOCK CODEC
+Versioned binary encoding of SimpleBlock and PoABlock dicts for disk and wire
+
+An encoded block is one struct-packed fixed-width header - version byte,
+kind byte, flags, index, timestamps as integer microseconds since the epoch
+and the block hash as 32 raw bytes - followed by the optional raw hashes and
+signatures its flags call for, the short strings whose lengths are in the
+header, and finally the data (UTF-8 text, or compact JSON for anything else).
+Inside a block list, a previous_hash equal to the hash of the block before it
+is left out.
+
+Decoding reproduces the original dict exactly (block hashes are computed over
+the original strings), so a block with anything that would not round-trip - a
+timestamp in another format, a hash that isn't lowercase hex, an extra field -
+is embedded as JSON instead.
+"""
+
+import json
+import re
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+CODEC_JSON = "json"
+CODEC_BINARY = "binary-v1"
+CODECS = (CODEC_JSON, CODEC_BINARY)
+
+CODEC_VERSION = 1
+KIND_SIMPLE = 0
+KIND_POA = 1
+KIND_JSON = 2  # anything else, embedded as compact JSON
+KIND_POA_MERKLE = 3  # PoA block committing to a Merkle root of its transactions
+KIND_POA_SIGNED = 4  # Merkle PoA block carrying its creator's signature
+
+SIMPLE_FIELDS = ('index', 'timestamp', 'data', 'previous_hash', 'hash')
+POA_FIELDS = ('index', 'timestamp', 'data', 'previous_hash', 'creator_id', 'creator_name',
+              'created_at', 'validations', 'is_finalized', 'finalized_at', 'hash')
+POA_MERKLE_FIELDS = POA_FIELDS[:3] + ('merkle_root',) + POA_FIELDS[3:]
+POA_SIGNED_FIELDS = POA_MERKLE_FIELDS + ('signature',)
+POA_KINDS = {POA_FIELDS: KIND_POA, POA_MERKLE_FIELDS: KIND_POA_MERKLE, POA_SIGNED_FIELDS: KIND_POA_SIGNED}
+VALIDATION_FIELDS = ('validator_id', 'validator_name', 'validation_timestamp', 'signature')
+
+# version, kind, flags, index, timestamp, hash, data length
+SIMPLE_HEADER = struct.Struct('<BBBIq32sI')
+# version, kind, flags, index, timestamp, created_at, finalized_at, hash,
+# creator_id length, creator_name length, validation count, data length
+POA_HEADER = struct.Struct('<BBHIqqq32sBBHI')
+# flags, validator_id length, validator_name length, text signature length, timestamp
+VALIDATION_HEADER = struct.Struct('<BBBBq')
+LIST_COUNT = struct.Struct('<I')
+BLOCK_LENGTH = struct.Struct('<I')
+
+# Timestamps: two flag bits each
+TIME_SECONDS, TIME_FRACTION, TIME_NONE = 0, 1, 2
+
+# Block flags
+DATA_JSON = 0x01         # data is not a string
+PREVIOUS_ZERO = 0x02     # previous_hash is "0" (genesis)
+PREVIOUS_LINKED = 0x04   # previous_hash is the hash of the block before it in the list
+FINALIZED = 0x08
+SIGNATURE_NONE = 0x10    # signed PoA block whose signature is None
+TIME_SHIFT = 5           # simple: timestamp; PoA: timestamp, created_at, finalized_at
+
+# Validation flags
+SIGNATURE_RAW, SIGNATURE_TEXT, SIGNATURE_ABSENT = 0, 1, 2
+VALIDATION_TIME_SHIFT = 2
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+ONE_MINUTE = timedelta(minutes=1)
+# The naive datetime.isoformat() forms: whole seconds, or six fraction digits
+ISO_TIMESTAMP = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?\Z', re.ASCII)
+MINUTE_CACHE_SIZE = 4096
+_minutes: Dict[int, str] = {}
+_compact_json = json.JSONEncoder(separators=(',', ':'))  # json.dumps builds a new encoder for each call
+
+class CodecError(ValueError):
+    """Raised when encoded block bytes are malformed"""
+    pass
+
+class _Unencodable(Exception):
+    pass
+
+def _time(value):
+    """(microseconds since the epoch, TIME_* form) of a timestamp that formats back identically"""
+    if value is None:
+        return 0, TIME_NONE
+    if type(value) is not str or not ISO_TIMESTAMP.match(value):
+        raise _Unencodable()
+    try:
+        micros = (datetime.fromisoformat(value) - EPOCH) // ONE_MICROSECOND
+    except ValueError:
+        raise _Unencodable()
+    return micros, TIME_FRACTION if len(value) == 26 else TIME_SECONDS
+
+def _read_time(micros: int, form: int):
+    """Format like datetime.isoformat, reusing the text up to the minute (blocks come in runs)"""
+    if form == TIME_NONE:
+        return None
+    minute, rest = divmod(micros, 60000000)
+    prefix = _minutes.get(minute)
+    if prefix is None:
+        if len(_minutes) >= MINUTE_CACHE_SIZE:
+            _minutes.clear()
+        prefix = _minutes[minute] = (EPOCH + minute * ONE_MINUTE).isoformat()[:17]
+    if form == TIME_FRACTION:
+        return f"{prefix}{rest // 1000000:02d}.{rest % 1000000:06d}"
+    return f"{prefix}{rest // 1000000:02d}"
+
+def _raw(value, length: int) -> bytes:
+    """Lowercase hex of length bytes as raw bytes"""
+    if type(value) is str and len(value) == 2 * length:
+        try:
+            raw = bytes.fromhex(value)
+        except ValueError:
+            raise _Unencodable()
+        if raw.hex() == value:
+            return raw
+    raise _Unencodable()
+
+def _data(value):
+    """(bytes, flags) of a block's data"""
+    if type(value) is str:
+        return value.encode('utf-8'), 0
+    return _compact_json.encode(value).encode('utf-8'), DATA_JSON
+
+def _check_length(buf, end: int):
+    if end != len(buf):
+        raise CodecError("Truncated block" if end > len(buf) else "Trailing bytes after block")
+
+def _read_data(buf, flags: int):
+    text = bytes(buf).decode('utf-8')
+    return json.loads(text) if flags & DATA_JSON else text
+
+def _previous(value, linked_to: Optional[str]):
+    """(bytes, flags) of previous_hash: left out if it is "0" or the hash of the block before"""
+    if value == linked_to:
+        return b'', PREVIOUS_LINKED
+    if value == "0":
+        return b'', PREVIOUS_ZERO
+    return _raw(value, 32), 0
+
+def _read_previous(buf, pos: int, flags: int, linked_to: Optional[str]):
+    if flags & PREVIOUS_LINKED:
+        if linked_to is None:
+            raise CodecError("Linked block outside a block list")
+        return linked_to, pos
+    if flags & PREVIOUS_ZERO:
+        return "0", pos
+    return bytes(buf[pos:pos + 32]).hex(), pos + 32
+
+def _encode_simple(block: Dict, linked_to: Optional[str]) -> bytes:
+    if type(block['index']) is not int:
+        raise _Unencodable()
+    timestamp, form = _time(block['timestamp'])
+    if form == TIME_NONE:
+        raise _Unencodable()
+    data, flags = _data(block['data'])
+    previous, previous_flags = _previous(block['previous_hash'], linked_to)
+    flags |= previous_flags | form << TIME_SHIFT
+    return SIMPLE_HEADER.pack(CODEC_VERSION, KIND_SIMPLE, flags, block['index'], timestamp,
+                              _raw(block['hash'], 32), len(data)) + previous + data
+
+def _decode_simple(buf, with_data: bool, linked_to: Optional[str]) -> Dict:
+    _, _, flags, index, timestamp, block_hash, data_length = SIMPLE_HEADER.unpack_from(buf)
+    block = {'index': index, 'timestamp': _read_time(timestamp, flags >> TIME_SHIFT & 3)}
+    previous_hash, pos = _read_previous(buf, SIMPLE_HEADER.size, flags, linked_to)
+    _check_length(buf, pos + data_length)
+    if with_data:
+        block['data'] = _read_data(buf[pos:], flags)
+    block['previous_hash'] = previous_hash
+    block['hash'] = block_hash.hex()
+    return block
+
+def _encode_validation(validation) -> bytes:
+    if type(validation) is not dict or tuple(validation) != VALIDATION_FIELDS:
+        raise _Unencodable()
+    validator_id = validation['validator_id'].encode('utf-8')
+    validator_name = validation['validator_name'].encode('utf-8')
+    timestamp, form = _time(validation['validation_timestamp'])
+    signature = validation['signature']
+    if signature is None:
+        kind, raw = SIGNATURE_ABSENT, b''
+    elif len(signature) == 128:
+        kind, raw = SIGNATURE_RAW, _raw(signature, 64)
+    else:
+        kind, raw = SIGNATURE_TEXT, signature.encode('utf-8')
+    # Lengths over 255 bytes make pack fail, and the block is kept as JSON
+    return VALIDATION_HEADER.pack(kind | form << VALIDATION_TIME_SHIFT, len(validator_id), len(validator_name),
+                                  len(raw) if kind == SIGNATURE_TEXT else 0, timestamp) \
+        + validator_id + validator_name + raw
+
+def _decode_validation(buf, pos: int):
+    flags, id_length, name_length, text_length, timestamp = VALIDATION_HEADER.unpack_from(buf, pos)
+    pos += VALIDATION_HEADER.size
+    validator_id = bytes(buf[pos:pos + id_length]).decode('utf-8')
+    pos += id_length
+    validator_name = bytes(buf[pos:pos + name_length]).decode('utf-8')
+    pos += name_length
+    kind = flags & 3
+    if kind == SIGNATURE_RAW:
+        signature = bytes(buf[pos:pos + 64]).hex()
+        pos += 64
+    elif kind == SIGNATURE_TEXT:
+        signature = bytes(buf[pos:pos + text_length]).decode('utf-8')
+        pos += text_length
+    else:
+        signature = None
+    return {
+        'validator_id': validator_id,
+        'validator_name': validator_name,
+        'validation_timestamp': _read_time(timestamp, flags >> VALIDATION_TIME_SHIFT & 3),
+        'signature': signature
+    }, pos
+
+def _encode_poa(block: Dict, kind: int, linked_to: Optional[str]) -> bytes:
+    if type(block['index']) is not int or type(block['is_finalized']) is not bool:
+        raise _Unencodable()
+    if type(block['validations']) is not list:
+        raise _Unencodable()
+    timestamp, timestamp_form = _time(block['timestamp'])
+    created_at, created_form = _time(block['created_at'])
+    finalized_at, finalized_form = _time(block['finalized_at'])
+    creator_id = block['creator_id'].encode('utf-8')
+    creator_name = block['creator_name'].encode('utf-8')
+    data, flags = _data(block['data'])
+    previous, previous_flags = _previous(block['previous_hash'], linked_to)
+    flags |= previous_flags | (FINALIZED if block['is_finalized'] else 0)
+    flags |= (timestamp_form | created_form << 2 | finalized_form << 4) << TIME_SHIFT
+    parts = [previous]
+    if kind != KIND_POA:
+        parts.append(_raw(block['merkle_root'], 32))
+    if kind == KIND_POA_SIGNED:
+        if block['signature'] is None:
+            flags |= SIGNATURE_NONE
+        else:
+            parts.append(_raw(block['signature'], 64))
+    parts += [creator_id, creator_name]
+    parts += [_encode_validation(validation) for validation in block['validations']]
+    parts.append(data)
+    return POA_HEADER.pack(CODEC_VERSION, kind, flags, block['index'], timestamp, created_at, finalized_at,
+                           _raw(block['hash'], 32), len(creator_id), len(creator_name),
+                           len(block['validations']), len(data)) + b''.join(parts)
+
+def _decode_poa(buf, kind: int, with_data: bool, linked_to: Optional[str]) -> Dict:
+    (_, _, flags, index, timestamp, created_at, finalized_at, block_hash,
+     id_length, name_length, count, data_length) = POA_HEADER.unpack_from(buf)
+    times = flags >> TIME_SHIFT
+    block = {'index': index, 'timestamp': _read_time(timestamp, times & 3)}
+    previous_hash, pos = _read_previous(buf, POA_HEADER.size, flags, linked_to)
+    if kind != KIND_POA:
+        merkle_root = bytes(buf[pos:pos + 32]).hex()
+        pos += 32
+    signature = None
+    if kind == KIND_POA_SIGNED and not flags & SIGNATURE_NONE:
+        signature = bytes(buf[pos:pos + 64]).hex()
+        pos += 64
+    creator_id = bytes(buf[pos:pos + id_length]).decode('utf-8')
+    pos += id_length
+    creator_name = bytes(buf[pos:pos + name_length]).decode('utf-8')
+    pos += name_length
+    validations = []
+    for _ in range(count):
+        validation, pos = _decode_validation(buf, pos)
+        validations.append(validation)
+    _check_length(buf, pos + data_length)
+    if with_data:
+        block['data'] = _read_data(buf[pos:], flags)
+    if kind != KIND_POA:
+        block['merkle_root'] = merkle_root
+    block['previous_hash'] = previous_hash
+    block['creator_id'] = creator_id
+    block['creator_name'] = creator_name
+    block['created_at'] = _read_time(created_at, times >> 2 & 3)
+    block['validations'] = validations
+    block['is_finalized'] = bool(flags & FINALIZED)
+    block['finalized_at'] = _read_time(finalized_at, times >> 4 & 3)
+    block['hash'] = block_hash.hex()
+    if kind == KIND_POA_SIGNED:
+        block['signature'] = signature
+    return block
+
+def encode_block(block: Dict, linked_to: Optional[str] = None) -> bytes:
+    """Encode one block dict; the layout is chosen from its fields
+
+    linked_to is the hash of the block before this one in a block list: a
+    matching previous_hash is left out and must be passed again to decode.
+    """
+    fields = tuple(block)
+    try:
+        if fields == SIMPLE_FIELDS:
+            return _encode_simple(block, linked_to)
+        if fields in POA_KINDS:
+            return _encode_poa(block, POA_KINDS[fields], linked_to)
+    except (_Unencodable, struct.error, AttributeError, TypeError):
+        pass  # a field without a compact form (or out of range for its header field)
+    return bytes([CODEC_VERSION, KIND_JSON]) + _compact_json.encode(block).encode('utf-8')
+
+def decode_block(buf, with_data: bool = True, linked_to: Optional[str] = None) -> Dict:
+    """Decode bytes produced by encode_block; with_data=False skips the payload without parsing it"""
+    if len(buf) < 2:
+        raise CodecError("Encoded block too short")
+    if buf[0] != CODEC_VERSION:
+        raise CodecError(f"Unsupported block codec version {buf[0]}")
+    kind = buf[1]
+    try:
+        if kind == KIND_JSON:
+            block = json.loads(bytes(buf[2:]))
+            if not with_data:
+                block.pop('data', None)
+            return block
+        if kind == KIND_SIMPLE:
+            return _decode_simple(buf, with_data, linked_to)
+        if kind in (KIND_POA, KIND_POA_MERKLE, KIND_POA_SIGNED):
+            return _decode_poa(buf, kind, with_data, linked_to)
+    except (struct.error, IndexError, ValueError, OverflowError, UnicodeDecodeError) as e:
+        raise CodecError(f"Malformed block: {e}")
+    raise CodecError(f"Unknown block kind {kind}")
+
+def encode_blocks(blocks: List[Dict]) -> bytes:
+    """Count followed by length-prefixed encoded blocks, each linked to the one before"""
+    parts = [LIST_COUNT.pack(len(blocks))]
+    linked_to = None
+    for block in blocks:
+        encoded = encode_block(block, linked_to)
+        parts += [BLOCK_LENGTH.pack(len(encoded)), encoded]
+        linked_to = block.get('hash')
+    return b''.join(parts)
+
+def decode_blocks(buf, pos: int = 0) -> List[Dict]:
+    try:
+        count, = LIST_COUNT.unpack_from(buf, pos)
+    except struct.error:
+        raise CodecError("Truncated block list")
+    pos += LIST_COUNT.size
+    blocks = []
+    linked_to = None
+    for _ in range(count):
+        if pos + BLOCK_LENGTH.size > len(buf):
+            raise CodecError("Truncated block list")
+        length, = BLOCK_LENGTH.unpack_from(buf, pos)
+        pos += BLOCK_LENGTH.size
+        if pos + length > len(buf):
+            raise CodecError("Truncated block list")
+        block = decode_block(buf[pos:pos + length], linked_to=linked_to)
+        blocks.append(block)
+        linked_to = block.get('hash')
+        pos += length
+    return blocks
+
+def is_binary(payload) -> bool:
+    """True for encode_block output (JSON text never starts with the version byte)"""
+    return len(payload) > 0 and payload[0] == CODEC_VERSION
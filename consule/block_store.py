@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+APPEND-ONLY BLOCK LOG
+One record per block on disk, so saving a new block writes only that block
+
+A log is two files next to the old JSON chain file:
+  <name>.blocks  records of [length][crc32][block as JSON or compact binary]
+  <name>.idx     fixed-width entries of [offset][length][block hash]
+Loading replays the records in order. A torn write at the end of either file
+(crash mid-append) is detected on open and trimmed back to the last complete
+record. Rolling back after a reorg truncates both files.
+
+Reads go through a read-only mmap of the data file: the index gives the
+(offset, length) of block N, so reading it is one slice of the mapping and a
+single decode, with no scan or parse of the records around it.
+
+Durability is a per-log policy:
+  fsync     every append is fsynced before it returns; appends that arrive
+            while an fsync is in flight share the next one (group commit)
+  interval  appends return once written; a flusher fsyncs at most every
+            fsync_interval_ms
+  buffered  flushing is left to the OS
+Only the data file is fsynced: the index can always be rebuilt from it.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from block_codec import CODEC_JSON, CODEC_BINARY, CODECS, encode_block, decode_block, is_binary
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+RECORD_HEADER = struct.Struct('>II')     # payload length, crc32 of payload
+INDEX_ENTRY = struct.Struct('>QI32s')    # record offset, record length, block hash
+
+DURABILITY_FSYNC = "fsync"
+DURABILITY_INTERVAL = "interval"
+DURABILITY_BUFFERED = "buffered"
+DURABILITY_POLICIES = (DURABILITY_FSYNC, DURABILITY_INTERVAL, DURABILITY_BUFFERED)
+FSYNC_INTERVAL_MS = 100
+
+# Streaming loader: text read per refill and blocks handled per batch
+STREAM_CHUNK_SIZE = 64 * 1024
+LOAD_BATCH_SIZE = 1000
+
+def log_base_for(blockchain_file: str) -> str:
+    """blockchain_8333.json -> blockchain_8333"""
+    base, ext = os.path.splitext(blockchain_file)
+    return base if ext == '.json' else blockchain_file
+
+def encode_record(block_dict: Dict, codec: str = CODEC_JSON) -> bytes:
+    if codec == CODEC_BINARY:
+        return encode_block(block_dict)
+    return json.dumps(block_dict, separators=(',', ':')).encode()
+
+def decode_record(payload, with_data: bool = True) -> Dict:
+    """Decode a record in either codec (a log may mix both after a codec switch)"""
+    if is_binary(payload):
+        return decode_block(payload, with_data)
+    block = json.loads(bytes(payload))  # json does not take a memoryview
+    if not with_data:
+        block.pop('data', None)
+    return block
+
+def hash_key(block_hash: str) -> bytes:
+    """32-byte form of a block hash for the index"""
+    try:
+        key = bytes.fromhex(block_hash)
+        if len(key) == 32:
+            return key
+    except (TypeError, ValueError):
+        pass
+    return hashlib.sha256(str(block_hash).encode()).digest()
+
+class WriteStats:
+    """Write latency and blocks-per-flush for one persistence policy"""
+    def __init__(self, durability: str):
+        self.durability = durability
+        self.writes = 0
+        self.blocks_written = 0
+        self.total_write_time = 0.0
+        self.max_write_time = 0.0
+        self.flushes = 0
+        self.blocks_flushed = 0
+
+    def record_write(self, seconds: float, blocks: int):
+        self.writes += 1
+        self.blocks_written += blocks
+        self.total_write_time += seconds
+        self.max_write_time = max(self.max_write_time, seconds)
+
+    def record_flush(self, blocks: int):
+        self.flushes += 1
+        self.blocks_flushed += blocks
+
+    def to_dict(self) -> Dict:
+        return {
+            'durability': self.durability,
+            'writes': self.writes,
+            'blocks_written': self.blocks_written,
+            'avg_write_ms': round(self.total_write_time / self.writes * 1000, 3) if self.writes else 0.0,
+            'max_write_ms': round(self.max_write_time * 1000, 3),
+            'flushes': self.flushes,
+            'blocks_per_flush': round(self.blocks_flushed / self.flushes, 2) if self.flushes else 0.0
+        }
+
+class BlockLog:
+    """Append-only block file with a fixed-width offset index"""
+    def __init__(self, base_path: str, durability: str = DURABILITY_BUFFERED,
+                 fsync_interval_ms: int = FSYNC_INTERVAL_MS, codec: str = CODEC_JSON):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {durability}")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown block codec: {codec}")
+        self.codec = codec
+        self.data_path = base_path + '.blocks'
+        self.index_path = base_path + '.idx'
+        self.durability = durability
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.lock = threading.RLock()
+        self.sync_lock = threading.Lock()  # held while fsyncing, outside self.lock
+        self.synced_records = 0
+        self.flusher: Optional[threading.Thread] = None
+        self.flusher_stop = threading.Event()
+        self.stats = WriteStats(durability)
+        self.offsets: List[int] = []
+        self.lengths: List[int] = []
+        self.hashes: List[bytes] = []
+        self.data_file = None
+        self.index_file = None
+        self.data_map: Optional[mmap.mmap] = None
+        self.bytes_written = 0
+        self.recovered_records = 0
+        self.trimmed_bytes = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.data_path)
+
+    def open(self):
+        """Open (creating if needed) and recover from a torn tail"""
+        with self.lock:
+            if self.data_file:
+                return
+            for path in (self.data_path, self.index_path):
+                if not os.path.exists(path):
+                    open(path, 'wb').close()
+            self.data_file = open(self.data_path, 'r+b')
+            self.index_file = open(self.index_path, 'r+b')
+            self._load_index()
+            self._recover()
+            self.synced_records = len(self.offsets)
+            if self.durability == DURABILITY_INTERVAL:
+                self.flusher_stop.clear()
+                self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self.flusher.start()
+
+    def _load_index(self):
+        raw = self.index_file.read()
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        data_size = os.path.getsize(self.data_path)
+        for offset, length, key in INDEX_ENTRY.iter_unpack(raw[:usable]):
+            if offset + length > data_size:
+                break
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.hashes.append(key)
+        if len(self.offsets) * INDEX_ENTRY.size != len(raw):
+            self.index_file.truncate(len(self.offsets) * INDEX_ENTRY.size)
+
+    def _recover(self):
+        """Re-index complete records past the index end and trim any partial one"""
+        end = self.offsets[-1] + self.lengths[-1] if self.offsets else 0
+        self.data_file.seek(end)
+        while True:
+            header = self.data_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            length, crc = RECORD_HEADER.unpack(header)
+            payload = self.data_file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            try:
+                block_hash = decode_record(payload)['hash']
+            except (ValueError, KeyError, TypeError):
+                break
+            self._write_index_entry(end, RECORD_HEADER.size + length, hash_key(block_hash))
+            end += RECORD_HEADER.size + length
+            self.recovered_records += 1
+
+        data_size = os.path.getsize(self.data_path)
+        if data_size > end:
+            self.trimmed_bytes = data_size - end
+            self.data_file.truncate(end)
+            print(f"⚠️ Trimmed {self.trimmed_bytes} bytes of incomplete block record from {self.data_path}")
+        if self.recovered_records:
+            print(f"🔧 Re-indexed {self.recovered_records} block records in {self.data_path}")
+        self.data_file.seek(0, os.SEEK_END)
+        self.index_file.seek(0, os.SEEK_END)
+
+    def _write_index_entry(self, offset: int, length: int, key: bytes):
+        self.index_file.seek(len(self.offsets) * INDEX_ENTRY.size)
+        self.index_file.write(INDEX_ENTRY.pack(offset, length, key))
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.hashes.append(key)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def data_size(self) -> int:
+        """Bytes of complete records in the data file"""
+        return self.offsets[-1] + self.lengths[-1] if self.offsets else 0
+
+    def hash_at(self, position: int) -> bytes:
+        return self.hashes[position]
+
+    def append(self, block_dict: Dict) -> int:
+        """Append one block record; returns its position"""
+        return self.append_many([block_dict])
+
+    def append_many(self, block_dicts: List[Dict]) -> int:
+        """Append block records in one write; returns the position of the last one"""
+        return self.append_encoded([(encode_record(block_dict, self.codec), hash_key(block_dict['hash']))
+                                    for block_dict in block_dicts])
+
+    def append_encoded(self, records: List[Tuple[bytes, bytes]]) -> int:
+        """Append already encoded (payload, hash key) records in one write"""
+        started = time.perf_counter()
+        with self.lock:
+            self.open()
+            end = self.offsets[-1] + self.lengths[-1] if self.offsets else 0
+            chunks = []
+            entries = []
+            for payload, key in records:
+                chunks.append(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+                chunks.append(payload)
+                entries.append((end, RECORD_HEADER.size + len(payload), key))
+                end += RECORD_HEADER.size + len(payload)
+
+            # Data before index: a crash between the two is repaired by _recover()
+            self.data_file.seek(entries[0][0] if entries else end)
+            self.data_file.write(b''.join(chunks))
+            self.data_file.flush()
+            for entry in entries:
+                self._write_index_entry(*entry)
+            self.index_file.flush()
+            self.bytes_written += end - (entries[0][0] if entries else end)
+            position = len(self.offsets) - 1
+
+        if self.durability == DURABILITY_FSYNC:
+            self.commit(position + 1)
+        self.stats.record_write(time.perf_counter() - started, len(records))
+        return position
+
+    def commit(self, records: Optional[int] = None):
+        """Make the first records (default: all) durable, sharing one fsync between waiting appenders"""
+        with self.sync_lock:
+            with self.lock:
+                if self.data_file is None:
+                    return
+                target = len(self.offsets) if records is None else records
+                if self.synced_records >= target:
+                    return  # an fsync that started after our write already covered it
+                # Everything written so far rides on this fsync
+                upto = len(self.offsets)
+                fd = self.data_file.fileno()
+            os.fsync(fd)
+            self.stats.record_flush(upto - self.synced_records)
+            self.synced_records = upto
+
+    def _flush_loop(self):
+        while not self.flusher_stop.wait(self.fsync_interval):
+            try:
+                self.commit()
+            except (OSError, ValueError):
+                pass
+
+    def truncate(self, count: int):
+        """Drop every record from position count onwards"""
+        with self.lock:
+            self.open()
+            if count >= len(self.offsets):
+                return
+            self._unmap()
+            self.data_file.truncate(self.offsets[count])
+            self.index_file.truncate(count * INDEX_ENTRY.size)
+            del self.offsets[count:], self.lengths[count:], self.hashes[count:]
+            self.synced_records = min(self.synced_records, count)
+            self.data_file.seek(0, os.SEEK_END)
+            self.index_file.seek(0, os.SEEK_END)
+
+    def _mapping(self, end: int) -> mmap.mmap:
+        """Read-only map of the data file covering at least end bytes"""
+        if self.data_map is None or len(self.data_map) < end:
+            self._unmap()
+            self.data_map = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.data_map
+
+    def _unmap(self):
+        if self.data_map is not None:
+            self.data_map.close()  # Reads release their views before returning, so none pins it
+            self.data_map = None
+
+    def _payload_view(self, position: int) -> memoryview:
+        """Encoded block at position as a view into the mapping; release it before giving up the lock"""
+        self.open()
+        start = self.offsets[position] + RECORD_HEADER.size
+        end = self.offsets[position] + self.lengths[position]
+        return memoryview(self._mapping(end))[start:end]
+
+    def read_payload(self, position: int) -> bytes:
+        """Encoded block at position, copied out of the mapping so a later truncate can't pull it away"""
+        with self.lock, self._payload_view(position) as payload:
+            return bytes(payload)
+
+    def read(self, position: int, with_data: bool = True) -> Dict:
+        """Read a single block record by position, decoding straight from the mapping"""
+        with self.lock, self._payload_view(position) as payload:
+            return decode_record(payload, with_data)
+
+    def iter_blocks(self, start: int = 0) -> Iterator[Dict]:
+        """Replay block records in order from position start"""
+        self.open()
+        for position in range(start, len(self.offsets)):
+            yield self.read(position)
+
+    def iter_headers(self, start: int = 0) -> Iterator[Dict]:
+        """Replay records without their data payload (binary records skip it undecoded)"""
+        self.open()
+        for position in range(start, len(self.offsets)):
+            yield self.read(position, with_data=False)
+
+    def sync_chain(self, block_hashes: List[str], start: int = 0) -> int:
+        """Roll back records that diverge from the given chain (block_hashes[0] is position start,
+        anything below it is assumed to match); returns how many records still match"""
+        with self.lock:
+            self.open()
+            keep = min(len(self.offsets), start + len(block_hashes))
+            while keep > start and self.hashes[keep - 1] != hash_key(block_hashes[keep - 1 - start]):
+                keep -= 1
+            self.truncate(keep)
+            return keep
+
+    def close(self):
+        self.flusher_stop.set()
+        if self.flusher is not None and self.flusher is not threading.current_thread():
+            self.flusher.join(timeout=5)
+        self.flusher = None
+        if self.durability != DURABILITY_BUFFERED:
+            self.commit()
+        with self.sync_lock, self.lock:
+            self._unmap()
+            for f in (self.data_file, self.index_file):
+                if f:
+                    f.close()
+            self.data_file = self.index_file = None
+            self.offsets, self.lengths, self.hashes = [], [], []
+
+    def get_stats(self) -> Dict:
+        return {
+            'records': len(self.offsets),
+            'data_bytes': self.data_size(),
+            'bytes_written': self.bytes_written,
+            'unsynced_records': len(self.offsets) - self.synced_records,
+            **self.stats.to_dict()
+        }
+
+class WriteBehindSaver:
+    """Runs a save callback on a background thread, coalescing bursts of requests"""
+    def __init__(self, save: Callable[[], None], name: str = "chain-saver"):
+        self.save = save
+        self.name = name
+        self.cond = threading.Condition()
+        self.save_lock = threading.Lock()  # one save at a time, without holding cond
+        self.requested = 0   # generation of the latest request
+        self.completed = 0   # generation covered by the last successful save
+        self.attempted = 0   # generation covered by the last save, successful or not
+        self.saves = 0
+        self.failures = 0
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+
+    def mark_dirty(self):
+        """Request a save; returns immediately"""
+        with self.cond:
+            self.requested += 1
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                # A failed save is retried on the next request rather than in a tight loop
+                while self.running and self.attempted >= self.requested:
+                    self.cond.wait()
+                if self.attempted >= self.requested:
+                    return
+                target = self.requested
+            # Every request up to target is covered by this one save
+            self._save(target)
+
+    def _save(self, target: int) -> bool:
+        """Run one save covering requests up to target; completed only advances on success"""
+        with self.save_lock:
+            try:
+                self.save()
+                error = None
+            except Exception as e:
+                error = str(e)
+                print(f"❌ Background save failed: {e}")
+        with self.cond:
+            self.attempted = max(self.attempted, target)
+            self.last_error = error
+            if error is None:
+                self.completed = max(self.completed, target)
+                self.saves += 1
+            else:
+                self.failures += 1
+            self.cond.notify_all()
+        return error is None
+
+    def pending(self) -> bool:
+        """True while a requested save has not finished"""
+        with self.cond:
+            return self.completed < self.requested
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every save requested so far is on disk; False if a save failed or timed out"""
+        with self.cond:
+            if self.completed >= self.requested:
+                return True
+            if self.attempted >= self.requested:
+                # The last attempt failed: ask for one more try
+                self.requested += 1
+            target = self.requested
+            worker = self.thread is not None and self.thread.is_alive() and self.running
+            if worker:
+                self.cond.notify_all()
+                self.cond.wait_for(lambda: self.attempted >= target, timeout)
+                return self.completed >= target
+        # No worker thread: save here, outside cond so mark_dirty callers never wait on the disk
+        return self._save(target)
+
+    def stop(self, timeout: float = 10.0) -> bool:
+        """Finish outstanding saves and end the worker thread; False if they could not be written"""
+        flushed = self.flush(timeout)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        self.thread = None
+        return flushed
+
+    def get_stats(self) -> Dict:
+        with self.cond:
+            return {
+                'save_requests': self.requested,
+                'saves': self.saves,
+                'pending': self.requested - self.completed,
+                'failures': self.failures,
+                'last_error': self.last_error
+            }
+
+class JSONStream:
+    """Incremental reader over a JSON text file, decoding one value at a time"""
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self, f, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Keep only the unconsumed tail
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self.pos += 1
+
+    def skip(self, char: str) -> bool:
+        """Consume char if it is next"""
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value that touches the end of the buffer (e.g. a number) may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_json_members(path: str, stream_key: str = 'blocks',
+                      chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Yield (key, value) per top-level member; the stream_key array is yielded one element at a time"""
+    with open(path, 'r') as f:
+        stream = JSONStream(f, chunk_size)
+        stream.expect('{')
+        if stream.skip('}'):
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == stream_key and stream.skip('['):
+                if not stream.skip(']'):
+                    while True:
+                        yield key, stream.value()
+                        if not stream.skip(','):
+                            break
+                    stream.expect(']')
+            else:
+                yield key, stream.value()
+            if not stream.skip(','):
+                break
+        stream.expect('}')
+
+def batched(items: Iterable, size: int = LOAD_BATCH_SIZE) -> Iterator[List]:
+    """Group an iterable into lists of at most size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_json_atomic(path: str, data: Dict, fsync: bool = False):
+    """Replace a small JSON file without ever leaving a half-written one"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
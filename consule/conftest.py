@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+SHARED TEST FIXTURES
+Free ports, polling, registration events and in-process linked nodes for the pytest suite
+"""
+
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from simple_blockchain import SimpleP2PNode
+
+class LinkedNode(SimpleP2PNode):
+    """SimpleP2PNode whose messages are delivered in-process to linked nodes"""
+    persist = True
+
+    def __init__(self, name: str, tmp_dir: str, persist: bool = True, **kwargs):
+        super().__init__(node_id=name, blockchain_file=os.path.join(tmp_dir, f"{name}.json"), **kwargs)
+        self.persist = persist
+        self.links = {}
+        self.sent_bytes = 0
+        self.sent_types = []
+        self.bodies_sent = {}
+
+    def link(self, other: 'LinkedNode'):
+        self.links[other.node_id] = other
+        other.links[self.node_id] = self
+        self.peers.append(other.node_id)
+        other.peers.append(self.node_id)
+
+    def send_to_peer(self, peer_id: str, message):
+        if peer_id in self.links:
+            self.sent_bytes += len(json.dumps(message))
+            self.sent_types.append(message['type'])
+            if message['type'] == 'new_block':
+                self.bodies_sent[peer_id] = self.bodies_sent.get(peer_id, 0) + 1
+            self.links[peer_id].process_message(message, self.node_id)
+
+    def broadcast_to_peers(self, message, exclude=None):
+        for peer_id in list(self.links):
+            if peer_id != exclude:
+                self.send_to_peer(peer_id, message)
+
+    def save_blockchain(self):
+        if self.persist:
+            super().save_blockchain()
+
+def find_free_port() -> int:
+    """Ask the OS for an unused TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+def poll(condition, timeout: float = 5.0) -> bool:
+    """Poll until condition() is true or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+def make_registration(i: int, node: str = None):
+    """A user registration event; node keeps events from different submitters apart"""
+    if node:
+        return {"type": "USER_REGISTRATION", "user_id": f"{node}-user{i}", "username": f"{node}{i}"}
+    return {"type": "USER_REGISTRATION", "user_id": f"user{i}", "username": f"u{i}"}
+
+@pytest.fixture
+def free_port():
+    return find_free_port
+
+@pytest.fixture
+def wait_until():
+    return poll
+
+@pytest.fixture
+def registration():
+    return make_registration
+
+@pytest.fixture
+def linked_node():
+    """LinkedNode class: linked_node(name, tmp_dir, persist=True, **node_kwargs)"""
+    return LinkedNode
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+MERKLE TREES OVER BLOCK TRANSACTIONS
+Roots committing to every transaction in a block, and inclusion proofs
+
+Leaves are SHA-256 hashes of each transaction's canonical JSON. Leaf and
+interior hashes use different prefixes so an interior node can never be
+passed off as a transaction. A level with an odd number of nodes carries
+its last node up unchanged rather than duplicating it, so two different
+transaction lists never share a root.
+
+A proof is the list of sibling hashes from a leaf up to the root, each
+with the side it sits on. Checking it needs only the transaction, the
+proof and the root - not the rest of the block.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+def transaction_hash(transaction: Any) -> str:
+    """Leaf hash of one transaction (key order doesn't matter)"""
+    encoded = json.dumps(transaction, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(LEAF_PREFIX + encoded).hexdigest()
+
+def _node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+def _next_level(level: List[str]) -> List[str]:
+    parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+def merkle_root(leaf_hashes: List[str]) -> str:
+    """Root over the leaf hashes in order (the hash of nothing for an empty list)"""
+    if not leaf_hashes:
+        return hashlib.sha256(b'').hexdigest()
+    level = list(leaf_hashes)
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+def merkle_proof(leaf_hashes: List[str], position: int) -> List[Dict]:
+    """Sibling hashes from leaf position up to the root"""
+    if not 0 <= position < len(leaf_hashes):
+        raise IndexError(f"No leaf at position {position} of {len(leaf_hashes)}")
+    proof = []
+    level = list(leaf_hashes)
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            proof.append({'hash': level[sibling], 'side': 'left' if sibling < position else 'right'})
+        level = _next_level(level)
+        position //= 2
+    return proof
+
+def verify_proof(leaf_hash: str, proof: List[Dict], root: str) -> bool:
+    """Whether the proof leads from leaf_hash to root"""
+    current = leaf_hash
+    try:
+        for step in proof:
+            if step['side'] == 'left':
+                current = _node_hash(step['hash'], current)
+            elif step['side'] == 'right':
+                current = _node_hash(current, step['hash'])
+            else:
+                return False
+    except (KeyError, TypeError, ValueError):
+        return False
+    return current == root
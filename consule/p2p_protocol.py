@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+P2P WIRE PROTOCOL
+Length-prefixed message framing shared by all blockchain nodes
+
+Every message on the wire is a 4-byte big-endian payload length followed by
+the UTF-8 JSON payload. Frames larger than MAX_FRAME_SIZE are rejected so a
+misbehaving peer cannot make us buffer unbounded data.
+
+Peers that both advertise the binary block codec in hello may instead send
+messages that carry blocks (BLOCK_FIELDS) as a binary envelope: a zero byte,
+a 4-byte JSON header length, the header, then the block or block list in the
+compact codec (see block_codec).
+"""
+
+import asyncio
+import json
+import socket
+import struct
+from typing import Dict, List, Optional
+
+from block_codec import (CODEC_JSON, CODEC_BINARY, CodecError, encode_block, decode_block,
+                         encode_blocks, decode_blocks)
+
+HEADER = struct.Struct('>I')
+HEADER_SIZE = HEADER.size
+MAX_FRAME_SIZE = 32 * 1024 * 1024  # 32 MB
+RECV_BUFFER_SIZE = 64 * 1024
+BINARY_ENVELOPE = 0x00  # JSON payloads always start with '{'
+# Message types whose block dicts go in the binary envelope, and the field holding them
+BLOCK_FIELDS = {
+    'new_block': 'block',
+    'blocks': 'blocks',
+    'blockchain': 'blocks',
+    'propose': 'block',
+    'finalized': 'block',
+    'snapshot': 'blocks',
+}
+
+class FrameError(Exception):
+    """Raised when a peer sends a malformed or oversized frame"""
+    pass
+
+def encode_message(message: Dict, max_frame_size: int = MAX_FRAME_SIZE, codec: str = CODEC_JSON) -> bytes:
+    """Encode a message dict into a length-prefixed frame"""
+    field = BLOCK_FIELDS.get(message.get('type'))
+    if codec == CODEC_BINARY and field in message:
+        payload = encode_envelope(message, field)
+    else:
+        payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    if len(payload) > max_frame_size:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds limit of {max_frame_size}")
+    return HEADER.pack(len(payload)) + payload
+
+def encode_envelope(message: Dict, field: str) -> bytes:
+    """Binary envelope: JSON header with the block (or block list) in field in the compact codec"""
+    header = dict(message)
+    header['binary_field'] = field
+    body = encode_blocks(header.pop(field)) if field == 'blocks' else encode_block(header.pop(field))
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return struct.pack('>BI', BINARY_ENVELOPE, len(header_bytes)) + header_bytes + body
+
+def decode_envelope(payload: bytes) -> Dict:
+    try:
+        _, header_length = struct.unpack_from('>BI', payload)
+        body_start = 5 + header_length
+        message = json.loads(payload[5:body_start])
+        field = message.pop('binary_field')
+        body = memoryview(payload)[body_start:]
+        message[field] = decode_blocks(body) if field == 'blocks' else decode_block(body)
+        return message
+    except (struct.error, CodecError, KeyError, ValueError, UnicodeDecodeError) as e:
+        raise FrameError(f"Invalid binary payload: {e}")
+
+def decode_payload(payload: bytes) -> Dict:
+    """Decode a frame payload back into a message dict"""
+    if payload[:1] == bytes([BINARY_ENVELOPE]):
+        return decode_envelope(payload)
+    try:
+        return json.loads(payload)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise FrameError(f"Invalid JSON payload: {e}")
+
+def send_message(sock: socket.socket, message: Dict, max_frame_size: int = MAX_FRAME_SIZE):
+    """Send one framed message, blocking until every byte is written"""
+    sock.sendall(encode_message(message, max_frame_size))
+
+class FrameReader:
+    """Incremental frame decoder reading from a socket into a reusable buffer"""
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, recv_size: int = RECV_BUFFER_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._recv_buffer = bytearray(recv_size)
+        self._recv_view = memoryview(self._recv_buffer)
+
+    def feed(self, data: bytes) -> List[Dict]:
+        """Add raw bytes and return every complete message now available"""
+        self._buffer += data
+        return self._drain()
+
+    def read_from(self, sock: socket.socket) -> Optional[List[Dict]]:
+        """Receive once from the socket; returns None when the peer closed"""
+        received = sock.recv_into(self._recv_buffer)
+        if not received:
+            return None
+        self._buffer += self._recv_view[:received]
+        return self._drain()
+
+    def pending_bytes(self) -> int:
+        """Number of buffered bytes not yet forming a complete frame"""
+        return len(self._buffer)
+
+    def _drain(self) -> List[Dict]:
+        messages = []
+        offset = 0
+        buffer = self._buffer
+        while len(buffer) - offset >= HEADER_SIZE:
+            (length,) = HEADER.unpack_from(buffer, offset)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds limit of {self.max_frame_size}")
+            end = offset + HEADER_SIZE + length
+            if len(buffer) < end:
+                break
+            payload = bytes(buffer[offset + HEADER_SIZE:end])
+            offset = end
+            messages.append(decode_payload(payload))
+        if offset:
+            del buffer[:offset]
+        return messages
+
+async def read_message(reader: asyncio.StreamReader,
+                       max_frame_size: int = MAX_FRAME_SIZE) -> Optional[Dict]:
+    """Read one framed message from an asyncio stream; None on clean EOF"""
+    try:
+        header = await reader.readexactly(HEADER_SIZE)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise FrameError("Connection closed inside frame header")
+    (length,) = HEADER.unpack(header)
+    if length > max_frame_size:
+        raise FrameError(f"Frame of {length} bytes exceeds limit of {max_frame_size}")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise FrameError("Connection closed inside frame payload")
+    return decode_payload(payload)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+PEER CONNECTION MANAGER
+Keeps a node connected to its configured and learned peers
+
+Remembers every peer address it has been told about or learned from the
+network, redials dropped peers with exponential backoff plus jitter, caps the
+number of dials in flight and keeps the node at a target number of outbound
+connections. Works with both SimpleP2PNode and AsyncP2PNode.
+"""
+
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+class PeerRecord:
+    """Dial bookkeeping for one known peer address"""
+    def __init__(self, host: str, port: int, source: str = "configured"):
+        self.host = host
+        self.port = port
+        self.source = source
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_connected: Optional[float] = None
+        self.dialing = False
+
+    @property
+    def peer_id(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'peer_id': self.peer_id,
+            'source': self.source,
+            'failures': self.failures,
+            'next_attempt_in': max(0.0, round(self.next_attempt - time.time(), 2)),
+            'last_connected': self.last_connected,
+            'dialing': self.dialing
+        }
+
+class PeerManager:
+    """Maintains outbound connections with reconnect, backoff and dial limits"""
+    def __init__(self, node, target_outbound: int = 8, max_concurrent_dials: int = 3,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0, jitter: float = 0.5,
+                 check_interval: float = 1.0, max_known_peers: int = 1000):
+        self.node = node
+        self.target_outbound = target_outbound
+        self.max_concurrent_dials = max_concurrent_dials
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.check_interval = check_interval
+        self.max_known_peers = max_known_peers
+        self.known_peers: Dict[str, PeerRecord] = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.wakeup = threading.Event()
+        node.peer_manager = self
+
+    def add_peer(self, host: str, port: int, source: str = "configured") -> bool:
+        """Remember a peer address; returns False if it was already known or is ourselves"""
+        peer_id = f"{host}:{port}"
+        if peer_id == f"{self.node.host}:{self.node.port}":
+            return False
+        with self.lock:
+            if peer_id in self.known_peers:
+                return False
+            if source != "configured" and len(self.known_peers) >= self.max_known_peers:
+                return False
+            self.known_peers[peer_id] = PeerRecord(host, port, source)
+        self.wakeup.set()
+        return True
+
+    def learn_peer(self, address: str) -> bool:
+        """Remember an address advertised by another node"""
+        if not address or ':' not in address:
+            return False
+        host, port = address.rsplit(':', 1)
+        try:
+            return self.add_peer(host, int(port), source="learned")
+        except ValueError:
+            return False
+
+    def get_known_addresses(self, limit: int = 100) -> List[str]:
+        with self.lock:
+            return list(self.known_peers.keys())[:limit]
+
+    def backoff_delay(self, failures: int) -> float:
+        """Exponential backoff with multiplicative jitter"""
+        delay = min(self.max_backoff, self.base_backoff * (2 ** max(0, failures - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self):
+        """Start the background maintenance thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        while self.running and self.node.running:
+            self.maintain()
+            self.wakeup.wait(self.check_interval)
+            self.wakeup.clear()
+
+    def outbound_count(self) -> int:
+        with self.lock:
+            return sum(1 for peer_id in self.known_peers if self.node.is_connected(peer_id))
+
+    def maintain(self):
+        """Start dials until we reach the outbound target or the dial cap"""
+        now = time.time()
+        with self.lock:
+            connected = [r for r in self.known_peers.values() if self.node.is_connected(r.peer_id)]
+            for record in connected:
+                if record.failures:
+                    record.failures = 0
+            dialing = sum(1 for r in self.known_peers.values() if r.dialing)
+            wanted = self.target_outbound - len(connected) - dialing
+            candidates = [
+                r for r in self.known_peers.values()
+                if not r.dialing and r.next_attempt <= now and not self.node.is_connected(r.peer_id)
+            ]
+            # Prefer configured peers, then those with fewest failures
+            candidates.sort(key=lambda r: (r.source != "configured", r.failures))
+            to_dial = candidates[:max(0, min(wanted, self.max_concurrent_dials - dialing))]
+            for record in to_dial:
+                record.dialing = True
+
+        for record in to_dial:
+            threading.Thread(target=self._dial, args=(record,), daemon=True).start()
+
+    def _dial(self, record: PeerRecord):
+        try:
+            connected = self.node.connect_to_peer(record.host, record.port)
+        except Exception as e:
+            print(f"❌ Dial to {record.peer_id} failed: {e}")
+            connected = False
+
+        with self.lock:
+            record.dialing = False
+            if connected:
+                record.failures = 0
+                record.last_connected = time.time()
+            else:
+                record.failures += 1
+                delay = self.backoff_delay(record.failures)
+                record.next_attempt = time.time() + delay
+                print(f"⏳ Retrying {record.peer_id} in {delay:.1f}s (attempt {record.failures})")
+
+    def get_status(self) -> Dict:
+        with self.lock:
+            peers = [record.to_dict() for record in self.known_peers.values()]
+        return {
+            'known_peers': len(peers),
+            'outbound_connected': self.outbound_count(),
+            'target_outbound': self.target_outbound,
+            'peers': peers
+        }
@@ -12,8 +12,24 @@ import hashlib
 import sys
 import os
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 import uuid
+from collections import OrderedDict
+from itertools import islice
+from block_verifier import verify_blocks, VerificationResult, VerifierPool, DEFAULT_CHUNK_SIZE
+from poa_store import open_store, PayloadCache, STORAGE_LOG, PAYLOAD_CACHE_SIZE
+from block_store import (WriteBehindSaver, iter_json_members, batched, log_base_for,
+                         DURABILITY_BUFFERED, LOAD_BATCH_SIZE)
+from block_codec import CODEC_JSON
+from snapshot import Snapshot, SnapshotStore, SnapshotError, ChainView, chain_base
+from merkle import transaction_hash, merkle_root, merkle_proof, verify_proof
+from tx_pool import (TransactionPool, BlockSealer, block_transactions, batch_data, TX_BATCH_TYPE,
+                     MAX_BLOCK_TRANSACTIONS, MAX_BLOCK_BYTES, BLOCK_SEAL_INTERVAL)
+from signing import (Keyring, SignatureVerifier, generate_keypair, is_signing_key, sign,
+                     block_message, validation_message, VERIFIED_CACHE_SIZE)
+
+# Parts of a snapshot's state derived from the blocks below it
+PROJECTION_KEYS = ('users', 'organizations', 'type_counts')
 
 class Authority:
     """Represents a blockchain authority with validation powers"""
@@ -83,13 +99,23 @@ class Validation:
             data.get('signature')
         )
 
+_UNLOADED = object()  # data of a lazily loaded block that hasn't been fetched yet
+
+def transaction_leaves(data) -> List[str]:
+    """Merkle leaf hashes of a block's data: one per transaction (the data itself if it has none)"""
+    return [transaction_hash(tx) for tx in block_transactions(data) or [data]]
+
 class PoABlock:
     """Proof of Authority blockchain block with complete authority tracking"""
+    # Set on header-only blocks: called with the block index to fetch its data
+    payload_source = None
+    
     def __init__(self, index: int, data: Dict, previous_hash: str = "",
                  creator_id: str = "", creator_name: str = ""):
         self.index = index
         self.timestamp = datetime.now().isoformat()
         self.data = data
+        self.merkle_root = merkle_root(transaction_leaves(data))
         self.previous_hash = previous_hash
         self.creator_id = creator_id
         self.creator_name = creator_name
@@ -98,13 +124,96 @@ class PoABlock:
         self.is_finalized = False
         self.finalized_at: Optional[str] = None
         self.hash = self.calculate_hash()
+        self.signature: Optional[str] = None  # Creator's signature of the hash (None for unsigned blocks)
+    
+    @property
+    def data(self) -> Dict:
+        """Block payload; header-only blocks fetch it on demand and don't keep it"""
+        if self._data is _UNLOADED:
+            return self.payload_source(self.index)
+        return self._data
+    
+    @data.setter
+    def data(self, value: Dict):
+        self._data = value
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not _UNLOADED
     
     def calculate_hash(self) -> str:
         """Calculate block hash including authority information"""
-        content = f"{self.index}{self.timestamp}{json.dumps(self.data, sort_keys=True)}{self.previous_hash}{self.creator_id}{self.created_at}"
+        return self.compute_hash(self.index, self.timestamp, self.data, self.previous_hash,
+                                 self.creator_id, self.created_at, self.merkle_root)
+    
+    @staticmethod
+    def compute_hash(index: int, timestamp: str, data: Dict, previous_hash: str,
+                     creator_id: str, created_at: str, merkle_root: str = None) -> str:
+        """Blocks with a Merkle root commit to their transactions through it; older blocks hash the data"""
+        if merkle_root is None:
+            content = f"{index}{timestamp}{json.dumps(data, sort_keys=True)}{previous_hash}{creator_id}{created_at}"
+        else:
+            content = f"{index}{timestamp}{merkle_root}{previous_hash}{creator_id}{created_at}"
         return hashlib.sha256(content.encode()).hexdigest()
     
-    def add_validation(self, validator_id: str, validator_name: str) -> bool:
+    @staticmethod
+    def hash_from_dict(data: Dict) -> str:
+        """Recompute the hash of a serialized block; empty if its Merkle root doesn't match its data"""
+        root = data.get('merkle_root')
+        if root is not None and merkle_root(transaction_leaves(data['data'])) != root:
+            return ""
+        return PoABlock.compute_hash(
+            data['index'], data['timestamp'], data['data'], data['previous_hash'],
+            data.get('creator_id', ''), data.get('created_at', data['timestamp']), root
+        )
+    
+    @staticmethod
+    def header_hash(header: Dict) -> Optional[str]:
+        """Hash of a block from its header alone (None for blocks from before Merkle roots)"""
+        if header.get('merkle_root') is None:
+            return None
+        return PoABlock.compute_hash(
+            header['index'], header['timestamp'], None, header['previous_hash'],
+            header.get('creator_id', ''), header.get('created_at', header['timestamp']), header['merkle_root']
+        )
+    
+    def transaction_proof(self, position: int) -> Optional[Dict]:
+        """Inclusion proof for one transaction, checkable against the block header alone"""
+        if self.merkle_root is None:
+            return None
+        transactions = block_transactions(self.data) or [self.data]
+        leaves = [transaction_hash(tx) for tx in transactions]
+        return {
+            'block_index': self.index,
+            'position': position,
+            'transaction': transactions[position],
+            'proof': merkle_proof(leaves, position),
+            'header': self.header()
+        }
+    
+    @staticmethod
+    def verify_transaction_proof(proof: Dict) -> bool:
+        """The transaction is in the block, and the header hashes to the block hash it claims"""
+        try:
+            header = proof['header']
+            return (PoABlock.header_hash(header) == header['hash']
+                    and verify_proof(transaction_hash(proof['transaction']), proof['proof'], header['merkle_root']))
+        except (KeyError, TypeError):
+            return False
+    
+    def header(self) -> Dict:
+        """Fields covered by the block hash, without the data"""
+        return {
+            'index': self.index,
+            'timestamp': self.timestamp,
+            'merkle_root': self.merkle_root,
+            'previous_hash': self.previous_hash,
+            'creator_id': self.creator_id,
+            'created_at': self.created_at,
+            'hash': self.hash
+        }
+    
+    def add_validation(self, validator_id: str, validator_name: str, signature: str = None) -> bool:
         """Add validation from an authority"""
         if self.is_finalized:
             return False
@@ -114,7 +223,7 @@ class PoABlock:
             if validation.validator_id == validator_id:
                 return False
         
-        validation = Validation(validator_id, validator_name, datetime.now().isoformat())
+        validation = Validation(validator_id, validator_name, datetime.now().isoformat(), signature)
         self.validations.append(validation)
         return True
     
@@ -136,10 +245,11 @@ class PoABlock:
         }
     
     def to_dict(self) -> Dict:
-        return {
+        block = {
             'index': self.index,
             'timestamp': self.timestamp,
             'data': self.data,
+            'merkle_root': self.merkle_root,
             'previous_hash': self.previous_hash,
             'creator_id': self.creator_id,
             'creator_name': self.creator_name,
@@ -149,33 +259,166 @@ class PoABlock:
             'finalized_at': self.finalized_at,
             'hash': self.hash
         }
+        if self.merkle_root is None:
+            del block['merkle_root']  # Blocks from before Merkle roots keep their original layout
+        if self.signature is not None:
+            block['signature'] = self.signature
+        return block
     
     @classmethod
-    def from_dict(cls, data: Dict) -> 'PoABlock':
-        block = cls(
-            data['index'],
-            data['data'],
-            data['previous_hash'],
-            data.get('creator_id', ''),
-            data.get('creator_name', '')
-        )
+    def from_dict(cls, data: Dict, payload_source=None) -> 'PoABlock':
+        """Rebuild a block without rehashing; a dict without 'data' gives a header-only block"""
+        block = cls.__new__(cls)
+        block.index = data['index']
+        block._data = data.get('data', _UNLOADED)
+        if block._data is _UNLOADED:
+            block.payload_source = payload_source
+        block.merkle_root = data.get('merkle_root')
+        block.previous_hash = data['previous_hash']
+        block.creator_id = data.get('creator_id', '')
+        block.creator_name = data.get('creator_name', '')
         block.timestamp = data['timestamp']
         block.created_at = data.get('created_at', data['timestamp'])
         block.validations = [Validation.from_dict(v) for v in data.get('validations', [])]
         block.is_finalized = data.get('is_finalized', False)
         block.finalized_at = data.get('finalized_at')
         block.hash = data['hash']
+        block.signature = data.get('signature')
         return block
 
+def project_poa_state(state: Dict, block_dicts) -> Dict:
+    """Fold the transactions of finalized blocks into the user/organization projection kept in snapshots"""
+    users = state.setdefault('users', {})
+    organizations = state.setdefault('organizations', {})
+    type_counts = state.setdefault('type_counts', {})
+    for block_dict in block_dicts:
+        for data in block_transactions(block_dict['data']):
+            data_type = data.get('type', 'UNKNOWN')
+            type_counts[data_type] = type_counts.get(data_type, 0) + 1
+            if data_type == 'USER_REGISTRATION' and data.get('user_id'):
+                users[data['user_id']] = {'username': data.get('username'), 'block_index': block_dict['index']}
+            elif data_type == 'ORGANIZATION_CREATION' and data.get('organization_id'):
+                organizations[data['organization_id']] = {
+                    'name': data.get('organization_name'),
+                    'type': data.get('organization_type'),
+                    'creator_user_id': data.get('creator_user_id'),
+                    'members': [],
+                    'block_index': block_dict['index']
+                }
+            elif data_type == 'ORGANIZATION_JOIN':
+                organization = organizations.get(data.get('organization_id'))
+                if organization is not None and data.get('user_id') not in organization['members']:
+                    organization['members'].append(data.get('user_id'))
+    return state
+
+class PendingQueue:
+    """Pipeline of pending blocks, each chained off the one before, finalized strictly in index order"""
+    def __init__(self):
+        self.blocks: OrderedDict = OrderedDict()  # index -> block, lowest first
+        self.by_hash: Dict[str, PoABlock] = {}
+        self.finalized = 0
+    
+    def __len__(self) -> int:
+        return len(self.blocks)
+    
+    def __iter__(self) -> Iterator[PoABlock]:
+        return iter(list(self.blocks.values()))
+    
+    def __getitem__(self, position: int) -> PoABlock:
+        """Pending block by queue position, like a list (0 is the oldest, -1 the newest)"""
+        if position == 0 and self.blocks:
+            return self.head()
+        if position == -1 and self.blocks:
+            return self.tip()
+        return list(self.blocks.values())[position]
+    
+    def head(self) -> Optional[PoABlock]:
+        """Oldest pending block: the next one to be finalized"""
+        return next(iter(self.blocks.values()), None)
+    
+    def tip(self) -> Optional[PoABlock]:
+        """Newest pending block: the parent of the next block created"""
+        return next(reversed(self.blocks.values()), None)
+    
+    def get(self, block_index: int) -> Optional[PoABlock]:
+        return self.blocks.get(block_index)
+    
+    def find(self, block_hash: str) -> Optional[PoABlock]:
+        return self.by_hash.get(block_hash)
+    
+    def add(self, block: PoABlock) -> bool:
+        """Queue a block; it must extend the current tip (or start an empty queue)"""
+        tip = self.tip()
+        if tip and (block.index != tip.index + 1 or block.previous_hash != tip.hash):
+            return False
+        self.blocks[block.index] = block
+        self.by_hash[block.hash] = block
+        return True
+    
+    def drop_from(self, block_index: int) -> List[PoABlock]:
+        """Remove the pending block at block_index and every block queued behind it"""
+        dropped = [block for index, block in self.blocks.items() if index >= block_index]
+        for block in dropped:
+            del self.blocks[block.index]
+            del self.by_hash[block.hash]
+        return dropped
+    
+    def pop_ready(self, min_validations: int) -> List[PoABlock]:
+        """Finalize and remove blocks from the head while they have enough validations"""
+        ready = []
+        while self.blocks:
+            head = self.head()
+            if not head.finalize_block(min_validations):
+                break
+            del self.blocks[head.index]
+            del self.by_hash[head.hash]
+            ready.append(head)
+        self.finalized += len(ready)
+        return ready
+    
+    def clear(self):
+        self.blocks.clear()
+        self.by_hash.clear()
+    
+    def get_stats(self) -> Dict:
+        head, tip = self.head(), self.tip()
+        return {
+            'pending': len(self.blocks),
+            'head_index': head.index if head else None,
+            'tip_index': tip.index if tip else None,
+            'finalized': self.finalized
+        }
+
 class PoABlockchain:
     """Proof of Authority Blockchain with complete authority management"""
     def __init__(self, node_id: str, node_name: str, host: str = "localhost", 
-                 port: int = 8333, blockchain_file: str = None):
+                 port: int = 8333, blockchain_file: str = None, storage: str = STORAGE_LOG,
+                 durability: str = DURABILITY_BUFFERED, write_behind: bool = True,
+                 block_codec: str = CODEC_JSON, lazy_payloads: bool = False,
+                 payload_cache_size: int = PAYLOAD_CACHE_SIZE, segment_size: int = None,
+                 archive_dir: str = None, snapshot_interval: int = None,
+                 max_block_transactions: int = MAX_BLOCK_TRANSACTIONS, max_block_bytes: int = MAX_BLOCK_BYTES,
+                 block_seal_interval: float = BLOCK_SEAL_INTERVAL,
+                 signature_cache_size: int = VERIFIED_CACHE_SIZE):
         self.node_id = node_id
         self.node_name = node_name
         self.host = host
         self.port = port
         self.blockchain_file = blockchain_file or f"poa_blockchain_{port}.json"
+        # Finalized blocks are appended incrementally; see poa_store for backends
+        self.store = open_store(self.blockchain_file, storage, durability, block_codec, segment_size, archive_dir)
+        self.saver = WriteBehindSaver(self.write_blockchain, f"{node_id}-saver") if write_behind else None
+        # Lazy mode keeps only block headers in memory; data comes from the store through an LRU
+        self.lazy_payloads = lazy_payloads
+        self.payload_cache = PayloadCache(self.store.get_payload, payload_cache_size) if lazy_payloads else None
+        # Snapshots of authorities and user/organization state, every snapshot_interval blocks
+        self.snapshots = SnapshotStore(log_base_for(self.blockchain_file))
+        self.snapshot_interval = snapshot_interval
+        self.latest_snapshot: Optional[Snapshot] = None
+        # Private keys of the authorities this node signs for; verified signatures survive restarts
+        self.keyring = Keyring(f"{log_base_for(self.blockchain_file)}.keys")
+        self.signatures = SignatureVerifier(self.keyring.secret, signature_cache_size,
+                                            f"{log_base_for(self.blockchain_file)}.sigcache")
         
         # Authority management
         self.authorities: Dict[str, Authority] = {}
@@ -183,7 +426,12 @@ class PoABlockchain:
         
         # Blockchain
         self.chain: List[PoABlock] = []
-        self.pending_blocks: List[PoABlock] = []
+        self.pending_blocks = PendingQueue()
+        # Events submitted for packing into multi-transaction blocks
+        self.tx_pool = TransactionPool(max_block_transactions, max_block_bytes, block_seal_interval)
+        self.sealer: Optional[BlockSealer] = None
+        # Block creation, validation and sealing may run on different threads
+        self.lock = threading.RLock()
         
         # Network
         self.peers: List[str] = []
@@ -202,11 +450,13 @@ class PoABlockchain:
         """Create the initial genesis block and bootstrap authority"""
         print(f"🌱 Creating genesis block for PoA blockchain")
         
-        # Create genesis authority
+        # Create genesis authority; this node keeps its private key
+        genesis_private_key, genesis_public_key = generate_keypair()
+        self.keyring.add(genesis_private_key)
         genesis_authority = Authority(
             authority_id="GENESIS_AUTH",
             name="Genesis Authority",
-            public_key="GENESIS_PUBLIC_KEY",
+            public_key=genesis_public_key,
             node_address=f"{self.host}:{self.port}",
             granted_by="SYSTEM",
             granted_at=datetime.now().isoformat()
@@ -229,16 +479,21 @@ class PoABlockchain:
             creator_name="Genesis Authority"
         )
         
-        # Auto-validate genesis block
-        genesis_block.add_validation("GENESIS_AUTH", "Genesis Authority")
+        # Sign and auto-validate genesis block
+        genesis_block.signature = self.sign_as("GENESIS_AUTH", block_message(genesis_block.hash))
+        genesis_block.add_validation("GENESIS_AUTH", "Genesis Authority",
+                                     self.sign_as("GENESIS_AUTH", validation_message(genesis_block.hash)))
         genesis_block.finalize_block(min_validations=1)
         
         self.chain.append(genesis_block)
         self.save_blockchain()
     
-    def grant_authority(self, new_authority_name: str, new_authority_public_key: str,
-                       new_authority_address: str, granter_id: str) -> bool:
-        """Grant authority to a new node"""
+    def grant_authority(self, new_authority_name: str, new_authority_public_key: Optional[str],
+                       new_authority_address: str, granter_id: str, packed: bool = False) -> bool:
+        """Grant authority to a new node (packed: record the grant in the next packed block)
+        
+        Without a public key a key pair is generated and kept in this node's keyring.
+        """
         if len(self.authorities) >= self.max_authorities:
             print(f"❌ Maximum authorities ({self.max_authorities}) reached")
             return False
@@ -251,6 +506,13 @@ class PoABlockchain:
             print(f"❌ Granter {granter_id} is not active")
             return False
         
+        if new_authority_public_key is None:
+            new_authority_public_key = self.keyring.add(generate_keypair()[0])
+        elif not is_signing_key(new_authority_public_key):
+            # An authority without an Ed25519 key could neither sign nor be checked
+            print(f"❌ {new_authority_public_key!r} is not an Ed25519 public key")
+            return False
+        
         # Create new authority
         new_authority_id = f"AUTH_{len(self.authorities)}_{int(time.time())}"
         new_authority = Authority(
@@ -269,12 +531,15 @@ class PoABlockchain:
             "type": "AUTHORITY_GRANT",
             "new_authority_id": new_authority_id,
             "new_authority_name": new_authority_name,
+            "new_authority_public_key": new_authority_public_key,
             "new_authority_address": new_authority_address,
             "granted_by": granter_id,
             "granted_by_name": self.authorities[granter_id].name,
             "granted_at": new_authority.granted_at
         }
         
+        if packed:
+            return self.submit_transaction(grant_data, granter_id)
         return self.create_block(grant_data, granter_id)
     
     def revoke_authority(self, authority_id: str, revoker_id: str) -> bool:
@@ -308,71 +573,260 @@ class PoABlockchain:
     
     def create_block(self, data: Dict, creator_id: str) -> bool:
         """Create a new block (must be created by an authority)"""
-        if creator_id not in self.authorities:
-            print(f"❌ Creator {creator_id} is not an authority")
-            return False
+        with self.lock:
+            if creator_id not in self.authorities:
+                print(f"❌ Creator {creator_id} is not an authority")
+                return False
         
-        if not self.authorities[creator_id].is_active:
-            print(f"❌ Creator {creator_id} is not active")
-            return False
+            if not self.authorities[creator_id].is_active:
+                print(f"❌ Creator {creator_id} is not active")
+                return False
         
-        # Get previous block hash
-        previous_hash = self.chain[-1].hash if self.chain else "0"
+            signing_key = self.signing_key(creator_id)
+            if signing_key is None and self.requires_signature(creator_id):
+                print(f"❌ No private key for {creator_id} in this node's keyring")
+                return False
         
-        # Create new block
-        new_block = PoABlock(
-            index=len(self.chain),
-            data=data,
-            previous_hash=previous_hash,
-            creator_id=creator_id,
-            creator_name=self.authorities[creator_id].name
-        )
+            # Chain off the newest pending block so several can be in flight at once
+            parent = self.pending_blocks.tip() or (self.chain[-1] if self.chain else None)
         
-        # Add to pending blocks for validation
-        self.pending_blocks.append(new_block)
-        self.authorities[creator_id].blocks_created += 1
+            # Create new block
+            new_block = PoABlock(
+                index=parent.index + 1 if parent else 0,
+                data=data,
+                previous_hash=parent.hash if parent else "0",
+                creator_id=creator_id,
+                creator_name=self.authorities[creator_id].name
+            )
+            if signing_key:
+                new_block.signature = self.sign_as(creator_id, block_message(new_block.hash))
         
-        print(f"📦 Block #{new_block.index} created by {self.authorities[creator_id].name}")
-        return True
+            # Add to pending blocks for validation
+            self.pending_blocks.add(new_block)
+            self.authorities[creator_id].blocks_created += 1
+            self.save_blockchain()
+        
+            print(f"📦 Block #{new_block.index} created by {self.authorities[creator_id].name}")
+            return True
     
-    def validate_block(self, block_index: int, validator_id: str) -> bool:
-        """Validate a pending block"""
-        if validator_id not in self.authorities:
-            print(f"❌ Validator {validator_id} is not an authority")
-            return False
+    def validate_block(self, block_index: int, validator_id: str, signature: str = None) -> bool:
+        """Validate a pending block (signature: the validator's, when it comes from another node)"""
+        with self.lock:
+            if validator_id not in self.authorities:
+                print(f"❌ Validator {validator_id} is not an authority")
+                return False
         
-        if not self.authorities[validator_id].is_active:
-            print(f"❌ Validator {validator_id} is not active")
-            return False
+            if not self.authorities[validator_id].is_active:
+                print(f"❌ Validator {validator_id} is not active")
+                return False
         
-        # Find the block in pending blocks
-        block_to_validate = None
-        for block in self.pending_blocks:
-            if block.index == block_index:
-                block_to_validate = block
-                break
+            block_to_validate = self.pending_blocks.get(block_index)
+            if not block_to_validate:
+                print(f"❌ Block #{block_index} not found in pending blocks")
+                return False
         
-        if not block_to_validate:
-            print(f"❌ Block #{block_index} not found in pending blocks")
-            return False
+            if signature is None and self.signing_key(validator_id):
+                signature = self.sign_as(validator_id, validation_message(block_to_validate.hash))
+            if self.requires_signature(validator_id) and not self.signatures.verify(
+                    self.authorities[validator_id].public_key, validation_message(block_to_validate.hash), signature):
+                print(f"❌ Validation of block #{block_index} by {validator_id} is not signed with its key")
+                return False
         
-        # Add validation
-        if block_to_validate.add_validation(validator_id, self.authorities[validator_id].name):
-            self.authorities[validator_id].blocks_validated += 1
-            print(f"✅ Block #{block_index} validated by {self.authorities[validator_id].name}")
+            # Add validation
+            if block_to_validate.add_validation(validator_id, self.authorities[validator_id].name, signature):
+                self.authorities[validator_id].blocks_validated += 1
+                print(f"✅ Block #{block_index} validated by {self.authorities[validator_id].name}")
+            
+                # Blocks join the chain in index order: this one may unblock the ones queued behind it
+                finalized = self.pending_blocks.pop_ready(self.min_validations_required)
+                for block in finalized:
+                    self.chain.append(block)
+                    print(f"🔒 Block #{block.index} finalized and added to chain")
+                if finalized:
+                    self.save_blockchain()
+                elif len(block_to_validate.validations) >= self.min_validations_required:
+                    print(f"⏳ Block #{block_index} is validated, waiting for #{self.pending_blocks.head().index}")
             
-            # Check if block can be finalized
-            if block_to_validate.finalize_block(self.min_validations_required):
-                # Move from pending to main chain
-                self.pending_blocks.remove(block_to_validate)
-                self.chain.append(block_to_validate)
-                self.save_blockchain()
-                print(f"🔒 Block #{block_index} finalized and added to chain")
+                return True
+            else:
+                print(f"❌ Failed to validate block #{block_index}")
+                return False
+    
+    def signing_key(self, authority_id: str) -> Optional[str]:
+        """Private key of an authority, if this node holds it"""
+        authority = self.authorities.get(authority_id)
+        return self.keyring.get(authority.public_key) if authority else None
+    
+    def sign_as(self, authority_id: str, message: bytes) -> Optional[str]:
+        """Sign with an authority's key from our keyring; our own signatures go straight into the verified cache"""
+        signing_key = self.signing_key(authority_id)
+        if signing_key is None:
+            return None
+        signature = sign(signing_key, message)
+        self.signatures.remember(self.authorities[authority_id].public_key, message, signature)
+        return signature
+    
+    def requires_signature(self, authority_id: str, authorities: Dict[str, Authority] = None,
+                           stored_block: Dict = None) -> bool:
+        """Every authority must sign, except in stored_block if it was finalized before signing existed
+        (no block signature) by an authority granted before Ed25519 keys"""
+        authority = (authorities or self.authorities).get(authority_id)
+        if authority is None:
+            return False
+        predates_signing = stored_block is not None and 'signature' not in stored_block
+        return not predates_signing or is_signing_key(authority.public_key)
+    
+    def valid_signers(self, block_dict: Dict) -> List[str]:
+        """Validators of a block whose validation signature checks out"""
+        message = validation_message(block_dict['hash'])
+        return [v.get('validator_id') for v in block_dict.get('validations', [])
+                if not self.requires_signature(v.get('validator_id'))
+                or self.signatures.verify(self.authorities[v.get('validator_id')].public_key, message, v.get('signature'))]
+    
+    def check_signatures(self, block_dicts: List[Dict], authorities: Dict[str, Authority] = None,
+                         pool: VerifierPool = None, stored: bool = False) -> List[int]:
+        """Positions of blocks with a bad creator or validator signature, verified as one cached batch
+
+        stored: the blocks come from our own store, where blocks from before signing are exempt.
+        """
+        authorities = authorities or self.authorities
+        items, positions = [], []
+        for position, block_dict in enumerate(block_dicts):
+            signers = [(block_dict.get('creator_id'), block_message(block_dict['hash']), block_dict.get('signature'))]
+            signers += [(v.get('validator_id'), validation_message(block_dict['hash']), v.get('signature'))
+                        for v in block_dict.get('validations', [])]
+            for authority_id, message, signature in signers:
+                if self.requires_signature(authority_id, authorities, block_dict if stored else None):
+                    items.append((authorities[authority_id].public_key, message, signature))
+                    positions.append(position)
+        results = self.signatures.verify_batch(items, pool=pool)
+        return sorted({position for position, ok in zip(positions, results) if not ok})
+    
+    def check_block(self, block_dict: Dict) -> Optional[str]:
+        """Why a block from another node can't be trusted (None if its hash, creator and signature check out)"""
+        try:
+            if PoABlock.hash_from_dict(block_dict) != block_dict['hash']:
+                return "invalid hash"
+        except (KeyError, TypeError):
+            return "malformed block"
+        creator = self.authorities.get(block_dict.get('creator_id'))
+        if creator is None or not creator.is_active:
+            return f"creator {block_dict.get('creator_id')} is not an active authority"
+        if any(tx.get('type') == 'AUTHORITY_GRANT' and not is_signing_key(tx.get('new_authority_public_key'))
+               for tx in block_transactions(block_dict.get('data'))):
+            return "grants authority to a key that is not Ed25519"
+        if self.requires_signature(creator.authority_id) and not self.signatures.verify(
+                creator.public_key, block_message(block_dict['hash']), block_dict.get('signature')):
+            return "invalid creator signature"
+        return None
+    
+    def accept_finalized_block(self, block_dict: Dict) -> bool:
+        """Append a block another authority finalized; our pending blocks built on the old tip go back to the pool"""
+        with self.lock:
+            reason = self.check_block(block_dict)
+            tip = self.chain[-1]
+            if reason is None and (block_dict['index'] != tip.index + 1 or block_dict['previous_hash'] != tip.hash):
+                reason = "does not extend our chain"
+            validators = set(self.valid_signers(block_dict)) if reason is None else set()
+            active = [v for v in validators if v in self.authorities and self.authorities[v].is_active]
+            if reason is None and (len(active) < self.min_validations_required or not block_dict.get('is_finalized')):
+                reason = f"only {len(active)} validations from active authorities"
+            if reason:
+                print(f"❌ Rejected finalized block #{block_dict.get('index')}: {reason}")
+                return False
             
+            self.drop_pending_from(block_dict['index'])
+            block = PoABlock.from_dict(block_dict)
+            self.chain.append(block)
+            self.apply_authority_changes(block.data)
+            for validator_id in active:
+                self.authorities[validator_id].blocks_validated += 1
+            self.authorities[block.creator_id].blocks_created += 1
+            self.save_blockchain()
+            print(f"🔒 Block #{block.index} from {block.creator_name} added to chain")
             return True
-        else:
-            print(f"❌ Failed to validate block #{block_index}")
+    
+    def drop_pending_from(self, block_index: int) -> List[PoABlock]:
+        """Abandon pending blocks from block_index on, returning their transactions to the pool"""
+        with self.lock:
+            dropped = self.pending_blocks.drop_from(block_index)
+            transactions = [tx for block in dropped for tx in block_transactions(block.data) or [block.data]]
+            if transactions:
+                self.tx_pool.requeue(transactions)
+                print(f"↩️ Dropped {len(dropped)} pending blocks from #{block_index}, "
+                      f"{len(transactions)} transactions back in the pool")
+            return dropped
+    
+    def apply_authority_changes(self, data: Dict):
+        """Bring the authority set up to date with grants and revocations in another node's block"""
+        for tx in block_transactions(data):
+            if tx.get('type') == 'AUTHORITY_GRANT' and tx.get('new_authority_id') not in self.authorities:
+                self.authorities[tx['new_authority_id']] = Authority(
+                    tx['new_authority_id'], tx.get('new_authority_name', ''), tx.get('new_authority_public_key', ''),
+                    tx.get('new_authority_address', ''), tx.get('granted_by'), tx.get('granted_at'))
+            elif tx.get('type') == 'AUTHORITY_REVOKE' and tx.get('revoked_authority_id') in self.authorities:
+                self.authorities[tx['revoked_authority_id']].is_active = False
+    
+    def submit_transaction(self, data: Dict, creator_id: str) -> bool:
+        """Pool an event for the next packed block; seals a block once the pool fills one"""
+        if creator_id not in self.authorities or not self.authorities[creator_id].is_active:
+            print(f"❌ Creator {creator_id} is not an active authority")
             return False
+        self.tx_pool.add(data)
+        if self.tx_pool.is_full() or self.tx_pool.is_due():
+            self.seal_due_blocks(creator_id)
+        else:
+            self.save_blockchain()  # Pooled events are kept with the pending state
+        return True
+    
+    def seal_block(self, creator_id: str) -> Optional[PoABlock]:
+        """Pack the oldest pooled transactions into one pending block"""
+        with self.lock:
+            transactions = self.tx_pool.take()
+            if not transactions:
+                return None
+            if not self.create_block(batch_data(transactions), creator_id):
+                self.tx_pool.put_back(transactions)
+                return None
+            print(f"📦 Packed {len(transactions)} transactions into block #{self.pending_blocks.tip().index}")
+            return self.pending_blocks.tip()
+    
+    def seal_due_blocks(self, creator_id: str, now: float = None) -> List[PoABlock]:
+        """Seal blocks while the pool holds a full block or its oldest transaction is due"""
+        sealed = []
+        while self.tx_pool.is_full() or self.tx_pool.is_due(now):
+            block = self.seal_block(creator_id)
+            if block is None:
+                break
+            sealed.append(block)
+        if sealed:
+            self.save_blockchain()
+        return sealed
+    
+    def start_block_builder(self, creator_id: str):
+        """Seal pooled transactions in the background once they reach the time limit"""
+        if self.sealer is None:
+            self.sealer = BlockSealer(lambda: self.seal_due_blocks(creator_id),
+                                      max(self.tx_pool.max_age / 4, 0.05), f"{self.node_id}-sealer")
+            self.sealer.start()
+    
+    def stop_block_builder(self):
+        if self.sealer:
+            self.sealer.stop()
+            self.sealer = None
+    
+    def verify_chain(self, workers: int = None) -> VerificationResult:
+        """Recompute the hash of every block in the chain and check linkage and signatures"""
+        block_dicts = [block.to_dict() for block in self.chain]
+        result = verify_blocks(block_dicts, kind='poa', workers=workers)
+        invalid = set(result.invalid) | set(self.check_signatures(block_dicts, stored=True))
+        for i in range(1, len(block_dicts)):
+            if block_dicts[i]['previous_hash'] != block_dicts[i-1]['hash']:
+                invalid.add(i)
+        result.invalid = sorted(invalid)
+        print(f"🔍 Verified {result.total} blocks in {result.elapsed:.2f}s "
+              f"({result.blocks_per_second:,.0f} blocks/s): {'✅ valid' if result.valid else f'❌ {len(result.invalid)} invalid'}")
+        return result
     
     def get_authority_stats(self) -> Dict:
         """Get statistics about authorities"""
@@ -385,66 +839,327 @@ class PoABlockchain:
             'inactive_authorities': len(inactive_authorities),
             'authorities': {auth_id: auth.to_dict() for auth_id, auth in self.authorities.items()},
             'blocks_in_chain': len(self.chain),
-            'pending_blocks': len(self.pending_blocks)
+            'pending_blocks': len(self.pending_blocks),
+            'pipeline': self.pending_blocks.get_stats(),
+            'transaction_pool': self.tx_pool.get_stats(),
+            'signatures': self.signatures.get_stats()
+        }
+    
+    def get_storage_stats(self) -> Dict:
+        """Write latency and flush batching of the storage backend"""
+        return {
+            **self.store.get_stats(),
+            'write_behind': self.saver.get_stats() if self.saver else None,
+            'payload_cache': self.payload_cache.get_stats() if self.payload_cache else None
         }
     
     def get_block_details(self, block_index: int) -> Optional[Dict]:
-        """Get detailed information about a specific block"""
-        if block_index < 0 or block_index >= len(self.chain):
+        """Get detailed information about a specific block, read from the store by its index"""
+        if block_index < chain_base(self.chain) or block_index >= len(self.chain):
             return None
         
-        block = self.chain[block_index]
+        block_dict = self.store.get_block(block_index)
+        if block_dict is None or block_dict['hash'] != self.chain[block_index].hash:
+            # Not written yet (write-behind) or replaced by a reorganisation since
+            block = self.chain[block_index]
+        else:
+            block = PoABlock.from_dict(block_dict)
         return {
             'block_info': block.to_dict(),
             'validation_info': block.get_validation_info(),
             'creator_info': self.authorities.get(block.creator_id, {}).to_dict() if block.creator_id in self.authorities else None
         }
     
+    def get_transaction_proof(self, block_index: int, position: int) -> Optional[Dict]:
+        """Inclusion proof for the transaction at position in a finalized block"""
+        if not chain_base(self.chain) <= block_index < len(self.chain):
+            return None
+        return self.chain[block_index].transaction_proof(position)
+    
+    def verify_transaction_proof(self, proof: Dict) -> bool:
+        """A proof checks out and its header is the block we hold at that height"""
+        if not PoABlock.verify_transaction_proof(proof):
+            return False
+        index = proof['header']['index']
+        return chain_base(self.chain) <= index < len(self.chain) and self.chain[index].hash == proof['header']['hash']
+    
+    def find_blocks(self, data_type: str = None, creator_id: str = None,
+                    user_id: str = None) -> List[PoABlock]:
+        """Blocks with a transaction matching every given filter (indexed lookup when the store supports it)"""
+        def matches(block, data):
+            if creator_id is not None and block.creator_id != creator_id:
+                return False
+            return any((data_type is None or tx.get('type') == data_type)
+                       and (user_id is None or user_id in (tx.get('user_id'), tx.get('creator_user_id')))
+                       for tx in block_transactions(data))
+        
+        if self.store.indexed:
+            base = chain_base(self.chain)
+            chain = list(self.chain)
+            stored = self.store.stored_height()
+            found = [chain[i - base] for i in self.store.find_block_indexes(data_type, creator_id, user_id)
+                     if base <= i < base + len(chain)]
+            # Finalized blocks the write-behind saver hasn't stored yet
+            return found + [block for block in chain[max(stored - base, 0):] if matches(block, block.data)]
+        return [block for block, data in self.iter_payloads() if matches(block, data)]
+    
+    def count_blocks(self, data_type: str = None) -> int:
+        """Number of blocks in the chain; with a data type, the number of events of that type"""
+        if data_type is None:
+            return len(self.chain)
+        return self.count_transactions(data_type)
+    
+    def count_transactions(self, data_type: str) -> int:
+        """Number of finalized transactions of one data type (a single-event block is one transaction)"""
+        def count(data):
+            return sum(1 for tx in block_transactions(data) if tx.get('type') == data_type)
+        
+        if chain_base(self.chain):
+            # Blocks below the snapshot are only known through its counts
+            snapshot = self.latest_snapshot
+            return snapshot.state['type_counts'].get(data_type, 0) + sum(
+                count(data) for block, data in self.iter_payloads() if block.index >= snapshot.height)
+        if self.store.indexed:
+            chain = list(self.chain)
+            stored = self.store.stored_height()
+            # Finalized blocks the write-behind saver hasn't stored yet are counted from memory
+            return self.store.count_transactions(data_type, stored) + sum(
+                count(block.data) for block in chain[max(stored - chain_base(self.chain), 0):])
+        return sum(count(data) for _, data in self.iter_payloads())
+    
+    def iter_payloads(self):
+        """(block, data) for every block held; lazy chains stream data from the store past the cache"""
+        base = chain_base(self.chain)
+        chain = list(self.chain)
+        position = 0
+        if self.lazy_payloads:
+            for block_dict in self.store.iter_blocks(base):
+                if position >= len(chain) or block_dict['hash'] != chain[position].hash:
+                    break
+                yield chain[position], block_dict['data']
+                position += 1
+        # Blocks not on disk yet (write-behind) still have their data in memory
+        for block in chain[position:]:
+            yield block, block.data
+    
+    def archive_segments(self, keep_recent: int = 0) -> int:
+        """Compress stored block segments older than the last keep_recent blocks"""
+        self.flush()
+        return self.store.archive_blocks(len(self.chain) - keep_recent)
+    
+    def genesis_hash(self) -> str:
+        if chain_base(self.chain) and self.latest_snapshot:
+            return self.latest_snapshot.genesis_hash
+        return self.chain[0].hash
+    
+    def build_snapshot(self, height: int) -> Snapshot:
+        """Snapshot at height from the stored blocks, extending the previous snapshot's projection"""
+        previous = self.latest_snapshot
+        if previous and previous.height <= height:
+            state = json.loads(json.dumps({key: previous.state.get(key, {}) for key in PROJECTION_KEYS}))
+            start = previous.height
+        elif self.store.first_position() == 0:
+            state, start = {}, 0
+        else:
+            raise SnapshotError(f"History below height {height} is no longer stored")
+        project_poa_state(state, islice(self.store.iter_blocks(start), height - start))
+        state['authorities'] = {auth_id: auth.to_dict() for auth_id, auth in dict(self.authorities).items()}
+        state['min_validations_required'] = self.min_validations_required
+        return Snapshot('poa', self.store.get_block(height - 1), self.genesis_hash(), state)
+    
+    def write_snapshot(self, height: int) -> Snapshot:
+        snapshot = self.build_snapshot(height)
+        self.snapshots.save(snapshot)
+        self.latest_snapshot = snapshot
+        print(f"📸 PoA snapshot at height {height} saved ({snapshot.snapshot_id[:12]})")
+        return snapshot
+    
+    def create_snapshot(self, height: int = None) -> Snapshot:
+        """Write a snapshot at height (default: our tip) once pending saves are on disk"""
+        self.flush()
+        return self.write_snapshot(height or len(self.chain))
+    
+    def get_snapshot(self) -> Optional[Dict]:
+        """Latest snapshot in the form a new node bootstraps from"""
+        return self.latest_snapshot.to_dict() if self.latest_snapshot else None
+    
+    def verify_snapshot(self, snapshot: Snapshot) -> bool:
+        """Check a snapshot against our chain; the projection is recomputed when the history is stored"""
+        index = snapshot.height - 1
+        if snapshot.kind != 'poa' or snapshot.genesis_hash != self.genesis_hash():
+            return False
+        if not chain_base(self.chain) <= index < len(self.chain) or self.chain[index].hash != snapshot.tip_hash:
+            return False
+        self.flush()
+        if self.store.first_position() > 0:
+            return True  # Only the tip can be checked without the blocks below it
+        projection = project_poa_state({}, islice(self.store.iter_blocks(), snapshot.height))
+        return all(projection[key] == snapshot.state.get(key) for key in PROJECTION_KEYS)
+    
+    def bootstrap_from_snapshot(self, snapshot_dict: Dict, tail_blocks: List[Dict] = ()) -> bool:
+        """Start from a peer's snapshot plus the finalized blocks after it instead of replaying from genesis"""
+        try:
+            snapshot = Snapshot.from_dict(snapshot_dict)
+        except SnapshotError as e:
+            print(f"❌ Rejected snapshot: {e}")
+            return False
+        if snapshot.kind != 'poa' or snapshot.height <= len(self.chain):
+            print(f"⚠️ Snapshot at height {snapshot.height} is not ahead of our chain, ignoring")
+            return False
+        # A fresh node only has its own genesis; any longer chain must be the same one
+        if len(self.chain) > 1 and snapshot.genesis_hash != self.genesis_hash():
+            print(f"❌ Rejected snapshot: different chain")
+            return False
+        tail_blocks = list(tail_blocks)
+        parent = snapshot.tip
+        for block_dict in tail_blocks:
+            if block_dict['index'] != parent['index'] + 1 or block_dict['previous_hash'] != parent['hash']:
+                print(f"❌ Block #{block_dict['index']} does not extend the snapshot, not bootstrapping")
+                return False
+            parent = block_dict
+        if not verify_blocks(tail_blocks, kind='poa').valid:
+            print(f"❌ Blocks after the snapshot have invalid hashes, not bootstrapping")
+            return False
+        authorities = {auth_id: Authority.from_dict(auth_data)
+                       for auth_id, auth_data in snapshot.state.get('authorities', {}).items()}
+        if self.check_signatures(tail_blocks, authorities):
+            print(f"❌ Blocks after the snapshot have invalid signatures, not bootstrapping")
+            return False
+        
+        with self.lock:
+            self.flush()
+            tip = PoABlock.from_dict(snapshot.tip)
+            self.chain = ChainView(tip.index, [tip])
+            self.pending_blocks.clear()
+            self.authorities = authorities
+            self.min_validations_required = snapshot.state.get('min_validations_required', self.min_validations_required)
+            # The store restarts at the tip so it lines up with the chain we hold
+            self.store.reset(tip.index)
+            self.store.append_blocks([snapshot.tip])
+            self.snapshots.save(snapshot)
+            self.latest_snapshot = snapshot
+            self.chain.extend(PoABlock.from_dict(block_dict) for block_dict in tail_blocks)
+            self.save_blockchain()
+            print(f"⚡ Bootstrapped from snapshot at height {snapshot.height} plus {len(tail_blocks)} blocks")
+            return True
+    
+    def prune_history(self, keep_recent: int = 0) -> int:
+        """Snapshot at len - keep_recent, verify it, then drop stored blocks and memory below it"""
+        height = len(self.chain) - keep_recent
+        if height <= chain_base(self.chain) + 1:
+            return 0
+        snapshot = self.create_snapshot(height)
+        if not self.verify_snapshot(snapshot):
+            print(f"❌ Snapshot at height {height} failed verification, not pruning")
+            return 0
+        base = snapshot.height - 1
+        pruned = self.store.prune_blocks(base)
+        self.chain = ChainView(base, self.chain[base:])
+        return pruned
+    
     def save_blockchain(self):
-        """Save blockchain and authorities to JSON file"""
+        """Persist the chain: queued for the background saver, or written now"""
+        if self.saver:
+            self.saver.mark_dirty()
+        else:
+            self.write_blockchain()
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every save requested so far is on disk"""
+        if self.saver:
+            return self.saver.flush(timeout)
+        return True
+    
+    def close(self):
+        """Finish outstanding saves and close the store; False if they could not be written"""
+        self.stop_block_builder()
+        flushed = self.saver.stop() if self.saver else True
+        if not flushed:
+            print(f"❌ {self.node_id} closed with unsaved blocks: {self.saver.last_error or 'save timed out'}")
+        self.signatures.save()
+        self.store.close()
+        return flushed
+    
+    def write_blockchain(self):
+        """Append newly finalized blocks to the store and save authorities/pending state"""
+        # Snapshot first: the chain keeps changing while the saver thread writes
+        base = chain_base(self.chain)
+        chain = list(self.chain)
+        pending = list(self.pending_blocks)
         data = {
             'node_id': self.node_id,
             'node_name': self.node_name,
             'blockchain_type': 'Proof_of_Authority',
-            'authorities': {auth_id: auth.to_dict() for auth_id, auth in self.authorities.items()},
-            'chain_length': len(self.chain),
-            'pending_blocks_count': len(self.pending_blocks),
+            'authorities': {auth_id: auth.to_dict() for auth_id, auth in dict(self.authorities).items()},
+            'chain_length': base + len(chain),
+            'pending_blocks_count': len(pending),
             'min_validations_required': self.min_validations_required,
-            'blocks': [block.to_dict() for block in self.chain],
-            'pending_blocks': [block.to_dict() for block in self.pending_blocks],
+            'pending_blocks': [block.to_dict() for block in pending],
+            'pooled_transactions': self.tx_pool.pending(),
             'last_saved': datetime.now().isoformat()
         }
         
-        try:
-            with open(self.blockchain_file, 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"💾 PoA Blockchain saved to {self.blockchain_file}")
-        except Exception as e:
-            print(f"❌ Error saving blockchain: {e}")
+        keep = self.store.sync_chain([block.hash for block in chain], base)
+        self.store.append_blocks([block.to_dict() for block in chain[keep - base:]])
+        self.store.save_state(data)
+        self.signatures.save()
+        print(f"💾 PoA Blockchain saved to {self.store.location}")
+        if self.snapshot_interval:
+            height = (base + len(chain)) // self.snapshot_interval * self.snapshot_interval
+            if height > (self.latest_snapshot.height if self.latest_snapshot else 0):
+                self.write_snapshot(height)
     
     def load_blockchain(self):
-        """Load blockchain and authorities from JSON file"""
-        if not os.path.exists(self.blockchain_file):
+        """Load authorities and pending blocks, then replay the block log"""
+        if not self.store.exists() and os.path.exists(self.blockchain_file):
+            self.migrate_legacy_file()
+        
+        if not self.store.exists():
             print(f"📁 No existing PoA blockchain file found, will create new one")
             return
         
         try:
-            with open(self.blockchain_file, 'r') as f:
-                data = json.load(f)
+            data = self.store.load_state()
+            self.latest_snapshot = self.snapshots.latest()
             
             # Load authorities
             for auth_id, auth_data in data.get('authorities', {}).items():
                 self.authorities[auth_id] = Authority.from_dict(auth_data)
             
-            # Load main chain
-            for block_data in data.get('blocks', []):
-                block = PoABlock.from_dict(block_data)
-                self.chain.append(block)
+            start = 0
+            if self.store.first_position() > 0:
+                # History below the snapshot was pruned (or never downloaded): start at its tip
+                if self.latest_snapshot is None or self.latest_snapshot.height - 1 < self.store.first_position():
+                    print(f"❌ {self.store.location} starts at #{self.store.first_position()} "
+                          f"with no snapshot covering the blocks below")
+                    return
+                start = self.latest_snapshot.height - 1
+                self.chain = ChainView(start)
+            
+            # One worker pool serves every batch of the load (hashes and signatures alike)
+            with VerifierPool() as pool:
+                if self.lazy_payloads:
+                    self.load_headers(start, pool)
+                else:
+                    # Stream the chain in batches, recomputing every stored hash before trusting it;
+                    # only one batch of raw block dicts is alive at a time
+                    for batch in batched(self.store.iter_blocks(start), DEFAULT_CHUNK_SIZE):
+                        invalid = verify_blocks(batch, kind='poa', pool=pool).invalid
+                        if not self.extend_checked(batch, invalid, PoABlock.from_dict, pool):
+                            break
             
-            # Load pending blocks
-            for block_data in data.get('pending_blocks', []):
+            # Load pending blocks; the queue must still extend the chain tip
+            tip = self.chain[-1] if self.chain else None
+            for block_data in sorted(data.get('pending_blocks', []), key=lambda b: b['index']):
                 block = PoABlock.from_dict(block_data)
-                self.pending_blocks.append(block)
+                parent = self.pending_blocks.tip() or tip
+                if parent and (block.index != parent.index + 1 or block.previous_hash != parent.hash):
+                    print(f"⚠️ Dropping pending block #{block.index}: it does not extend #{parent.index}")
+                    continue
+                self.pending_blocks.add(block)
+            
+            for transaction in data.get('pooled_transactions', []):
+                self.tx_pool.add(transaction)
             
             self.min_validations_required = data.get('min_validations_required', 1)
             
@@ -453,12 +1168,74 @@ class PoABlockchain:
         except Exception as e:
             print(f"❌ Error loading blockchain: {e}")
     
+    def load_headers(self, start: int = 0, pool: VerifierPool = None):
+        """Load header-only blocks, checking linkage, signatures and hashes (from the header when it has a
+        Merkle root, from the whole stored block for older blocks whose hash covers their data)"""
+        loader = self.payload_cache.get
+        for batch in batched(self.store.iter_headers(start), DEFAULT_CHUNK_SIZE):
+            hashes = [PoABlock.header_hash(header) for header in batch]
+            invalid = [position for position, header_hash in enumerate(hashes)
+                       if header_hash not in (None, batch[position]['hash'])]
+            legacy = [position for position, header_hash in enumerate(hashes) if header_hash is None]
+            if legacy:
+                full = [self.store.get_block(batch[position]['index']) for position in legacy]
+                invalid.extend(legacy[i] for i in verify_blocks(full, kind='poa', pool=pool).invalid)
+            if not self.extend_checked(batch, invalid, lambda header: PoABlock.from_dict(header, loader), pool):
+                break
+    
+    def extend_checked(self, block_dicts: List[Dict], invalid: List[int], make_block,
+                       pool: VerifierPool = None) -> bool:
+        """Append stored blocks up to the first that doesn't link, has an invalid hash or signature;
+        False (and the chain stops before it) if one doesn't check out"""
+        invalid = set(invalid)
+        # Signatures verified on an earlier run are cache hits, not public-key operations
+        unsigned = set(self.check_signatures(block_dicts, pool=pool, stored=True))
+        parent = self.chain[-1] if self.chain else None
+        for position, block_dict in enumerate(block_dicts):
+            problem = None
+            if parent and (block_dict['index'] != parent.index + 1 or block_dict['previous_hash'] != parent.hash):
+                problem = "does not link to its parent"
+            elif position in invalid:
+                problem = "has an invalid hash"
+            elif position in unsigned:
+                problem = "has an invalid signature"
+            if problem:
+                print(f"❌ Block #{block_dict['index']} in {self.store.location} {problem}: "
+                      f"chain truncated at #{len(self.chain)}, later blocks are replaced on the next save")
+                return False
+            parent = make_block(block_dict)
+            self.chain.append(parent)
+        return True
+    
+    def migrate_legacy_file(self):
+        """Split an old single-file JSON chain into the block log and state file"""
+        try:
+            data = {}
+            batch = []
+            migrated = 0
+            # Stream the old document: blocks go to the store in batches, everything else is state
+            for key, value in iter_json_members(self.blockchain_file, 'blocks'):
+                if key != 'blocks':
+                    data[key] = value
+                    continue
+                batch.append(value)
+                if len(batch) >= LOAD_BATCH_SIZE:
+                    self.store.append_blocks(batch)
+                    migrated += len(batch)
+                    batch = []
+            self.store.append_blocks(batch)
+            migrated += len(batch)
+            self.store.save_state(data)
+            print(f"📦 Migrated {migrated} blocks from {self.blockchain_file} to {self.store.location}")
+        except Exception as e:
+            print(f"❌ Error migrating {self.blockchain_file}: {e}")
+    
     def display_blockchain_summary(self):
         """Display a summary of the blockchain"""
         print(f"\n🔗 PROOF OF AUTHORITY BLOCKCHAIN SUMMARY")
         print(f"=" * 60)
         print(f"Node: {self.node_name} ({self.node_id})")
-        print(f"Blockchain File: {self.blockchain_file}")
+        print(f"Blockchain File: {self.store.location}")
         print(f"Blocks in Chain: {len(self.chain)}")
         print(f"Pending Blocks: {len(self.pending_blocks)}")
         print(f"Total Authorities: {len(self.authorities)}")
@@ -483,6 +1260,8 @@ class PoABlockchain:
                 print(f"      Creator: {block.creator_name}")
                 print(f"      Validations: {validation_info['validation_count']}")
                 print(f"      Type: {block.data.get('type', 'UNKNOWN')}")
+                if block.data.get('type') == TX_BATCH_TYPE:
+                    print(f"      Transactions: {block.data.get('tx_count', 0)}")
 
 def main():
     """Main function to run PoA blockchain demo"""
@@ -526,7 +1305,7 @@ def main():
     # Grant authority to a new node
     node.grant_authority(
         new_authority_name="Secondary Authority",
-        new_authority_public_key="SEC_AUTH_PUBLIC_KEY",
+        new_authority_public_key=None,  # Key pair generated and kept in this node's keyring
         new_authority_address="localhost:8334",
         granter_id="GENESIS_AUTH"
     )
@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+"""
+POA VALIDATION NETWORK
+Asyncio network layer that lets PoA authorities validate each other's blocks
+
+An authority node proposes every block it creates to its peers and counts
+its own validation. Each other authority checks the block and answers
+with a validation (or a rejection). Once min_validations_required is met
+the proposer finalizes the block and gossips it. Peers append it and relay
+it onwards.
+
+Many proposals can be outstanding at once, each chained off the one before
+(see PendingQueue). A proposal that times out, or that is rejected by so
+many authorities that it can no longer reach the quorum, is dropped along
+with everything queued behind it, and its transactions go back to the pool.
+
+Two authorities may propose on the same parent at the same time. Each
+validator validates only the first child it sees of any parent, so with a
+quorum of more than half the authorities at most one of them finalizes.
+So that simultaneous proposers don't all stall each other, a proposer that
+sees a rival with a lower hash on the parent of its own in-flight block
+drops its block (only it could finalize it) and validates the rival; a
+losing block's transactions are proposed again on top of the winner.
+Otherwise a validator releases its vote after twice the
+proposal timeout, by which time the proposer has either finalized the
+block or given up on it.
+
+Blocks and validations are signed with the authorities' Ed25519 keys (see
+signing); a block or validation whose signature doesn't check out is
+rejected.
+
+A peer is only taken for an authority once it signs the random challenge
+in our hello with that authority's key (the claim is checked again whenever
+the authority's key changes, e.g. after we bootstrap). Rejections are signed
+too, so a peer can't talk a proposer out of its block on another
+authority's behalf.
+
+A node with nothing but its own genesis joins an existing chain through a
+snapshot from its first peer (see PoABlockchain.bootstrap_from_snapshot).
+Peers that fell behind catch up with getblocks. Replies carry at most
+MAX_BLOCKS_PER_MESSAGE blocks (fewer if they wouldn't fit in one frame) and
+the sender's height, so the receiver keeps asking until it has caught up.
+
+Handlers that change the chain take turns, in arrival order, and run its
+blocking parts (snapshot and signature verification, store writes) in the
+default executor, so one slow bootstrap or SQLite write doesn't hold up
+the other peers' messages.
+
+Messages (JSON frames, see p2p_protocol):
+  hello        node_id, authority_id, chain_length, genesis_hash, challenge
+  auth         authority_id, signature   (of the peer's hello challenge)
+  propose      block                     -> validation | reject
+  validation   block_index, block_hash, validator_id, signature
+  reject       block_index, block_hash, validator_id, reason, signature
+  finalized    block (with its validations)
+  getblocks    start                     -> blocks | snapshot
+  blocks       blocks, height
+  getsnapshot                            -> snapshot
+  snapshot     snapshot, blocks, height
+"""
+
+import asyncio
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+import argparse
+
+from p2p_protocol import FrameError, encode_message, read_message, MAX_FRAME_SIZE
+from async_blockchain import AsyncPeerSender
+from simple_blockchain import SEND_QUEUE_SIZE, OVERFLOW_DISCONNECT, CONNECT_TIMEOUT
+from snapshot import chain_base
+from poa_blockchain import PoABlockchain
+from signing import hello_message, is_signing_key, reject_message, sign, validation_message, verify
+
+PROPOSAL_TIMEOUT = 10.0          # Seconds a proposal may wait for its quorum
+MAX_OUTSTANDING_PROPOSALS = 64   # Proposals in flight per authority
+PROPOSER_TICK = 0.05             # Seconds between sealing / timeout checks
+MAX_TRACKED_VOTES = 10000        # Parents whose validated child we remember
+MAX_BLOCKS_PER_MESSAGE = 500     # Finalized blocks per blocks reply
+KEY_ENV_VAR = "POA_AUTHORITY_KEY"  # Private key of the authority a node signs as
+
+class Proposal:
+    """A block of ours waiting for validations from other authorities"""
+    def __init__(self, block_index: int, block_hash: str, timeout: float):
+        self.block_index = block_index
+        self.block_hash = block_hash
+        self.sent_at = time.time()
+        self.deadline = self.sent_at + timeout
+        self.rejections: Dict[str, str] = {}
+
+class PoANetworkNode:
+    """Networked PoA authority: proposes its blocks, validates its peers' and gossips finalized blocks"""
+    def __init__(self, chain: PoABlockchain, authority_id: str = None, host: str = None, port: int = None,
+                 proposal_timeout: float = PROPOSAL_TIMEOUT,
+                 max_outstanding: int = MAX_OUTSTANDING_PROPOSALS,
+                 connect_timeout: float = CONNECT_TIMEOUT, send_queue_size: int = SEND_QUEUE_SIZE):
+        self.chain = chain
+        self.authority_id = authority_id  # None: follow the chain without proposing or validating
+        self.node_id = chain.node_id
+        self.host = host or chain.host
+        self.port = port if port is not None else chain.port
+        self.proposal_timeout = proposal_timeout
+        self.max_outstanding = max_outstanding
+        self.connect_timeout = connect_timeout
+        self.send_queue_size = send_queue_size
+
+        self.running = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._stopped: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Handlers that change the chain take turns on this lane, in arrival order; their blocking
+        # chain calls (verification, store writes) run in the default executor meanwhile
+        self.chain_lane = asyncio.Lock()
+
+        self.peer_writers: Dict[str, asyncio.StreamWriter] = {}
+        self.peer_senders: Dict[str, AsyncPeerSender] = {}
+        self.challenges: Dict[str, str] = {}       # peer id -> nonce it must sign to claim an authority
+        self.peer_challenges: Dict[str, str] = {}  # peer id -> its nonce we haven't signed yet
+        self.peer_claims: Dict[str, Dict] = {}   # peer id -> authority it claims, signature, check result
+        self.greeted: set = set()
+        self.proposals: "OrderedDict[str, Proposal]" = OrderedDict()   # block hash -> proposal, oldest first
+        self.votes: "OrderedDict[str, tuple]" = OrderedDict()          # parent hash -> (child we validated, when)
+        self.voted_indexes: "OrderedDict[str, int]" = OrderedDict()    # validated block hash -> index
+        self.future_blocks: Dict[int, Dict] = {}
+        self.announced_height = len(chain.chain)
+        self.stats = {'proposed': 0, 'finalized': 0, 'abandoned': 0, 'timeouts': 0, 'yielded': 0,
+                      'validations_sent': 0, 'rejections_sent': 0, 'blocks_received': 0,
+                      'finalize_seconds': 0.0}
+
+    # --- lifecycle -------------------------------------------------------
+
+    def start(self) -> bool:
+        """Start the event loop thread, the listening server and the proposer"""
+        self.running = True
+        self._loop_thread = threading.Thread(target=self._run_loop, name=f"{self.node_id}-poa-net", daemon=True)
+        self._loop_thread.start()
+        self._started.wait(timeout=5)
+        return self._server is not None
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+            # Chain calls handed to the executor finish before stop() returns and the chain is closed
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        self._stopped = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_connection, self.host, self.port, limit=MAX_FRAME_SIZE
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            print(f"✅ PoA node {self.node_id} listening on {self.host}:{self.port}")
+        except Exception as e:
+            print(f"❌ Failed to start PoA server on {self.host}:{self.port}: {e}")
+            self.running = False
+            return
+        finally:
+            self._started.set()
+
+        proposer = asyncio.get_running_loop().create_task(self._proposer())
+        async with self._server:
+            await self._stopped.wait()
+            proposer.cancel()
+            for peer_id in list(self.peer_writers):
+                self.disconnect_peer(peer_id)
+            # Let connection readers and the proposer unwind before the loop closes
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        """Stop networking; the chain stays open (close it separately)"""
+        print(f"🛑 Stopping PoA node {self.node_id}...")
+        self.running = False
+        if self.loop is not None and self._stopped is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self._loop_thread is not None:
+            self._loop_thread.join(timeout=5)
+
+    def _call_in_loop(self, func, *args, timeout: float = None):
+        """Run func on the event loop thread and return its result"""
+        if self.loop is None or not self.loop.is_running() or threading.current_thread() is self._loop_thread:
+            return func(*args)
+
+        async def runner():
+            result = func(*args)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+
+        return asyncio.run_coroutine_threadsafe(runner(), self.loop).result(timeout)
+
+    # --- connections -----------------------------------------------------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        addr = writer.get_extra_info('peername')
+        peer_id = f"{addr[0]}:{addr[1]}"
+        self.register_peer_writer(peer_id, writer)
+        await self._read_loop(peer_id, reader, writer)
+
+    async def _read_loop(self, peer_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while self.running:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                result = self.process_message(message, peer_id)
+                if asyncio.iscoroutine(result):
+                    await result  # The peer's next message waits; other peers are served meanwhile
+        except FrameError as e:
+            print(f"⚠️ Invalid frame from {peer_id}: {e}")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f"❌ Error handling PoA peer {peer_id}: {e}")
+        finally:
+            if self.peer_writers.get(peer_id) is writer:
+                self.disconnect_peer(peer_id)
+            else:
+                writer.close()
+
+    async def connect_to_peer_async(self, host: str, port: int) -> bool:
+        peer_id = f"{host}:{port}"
+        if peer_id in self.peer_writers:
+            return True
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=MAX_FRAME_SIZE), timeout=self.connect_timeout)
+        except Exception as e:
+            print(f"❌ {self.node_id} failed to connect to {peer_id}: {e}")
+            return False
+        self.register_peer_writer(peer_id, writer)
+        self.greeted.add(peer_id)
+        self.send_to_peer(peer_id, self.build_hello(peer_id))
+        self.loop.create_task(self._read_loop(peer_id, reader, writer))
+        print(f"✅ {self.node_id} connected to PoA peer {peer_id}")
+        return True
+
+    def connect_to_peer(self, host: str, port: int) -> bool:
+        """Connect to another PoA node (callable from any thread)"""
+        if self.loop is None:
+            print(f"❌ {self.node_id} is not running")
+            return False
+        return self._call_in_loop(self.connect_to_peer_async, host, port)
+
+    def register_peer_writer(self, peer_id: str, writer: asyncio.StreamWriter):
+        self.peer_writers[peer_id] = writer
+        self.peer_senders[peer_id] = AsyncPeerSender(
+            peer_id, writer, self.send_queue_size, OVERFLOW_DISCONNECT, on_error=self.disconnect_peer)
+
+    def disconnect_peer(self, peer_id: str):
+        sender = self.peer_senders.pop(peer_id, None)
+        if sender is not None:
+            sender.close()
+        writer = self.peer_writers.pop(peer_id, None)
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        self.challenges.pop(peer_id, None)
+        self.peer_challenges.pop(peer_id, None)
+        self.peer_claims.pop(peer_id, None)
+        self.greeted.discard(peer_id)
+
+    def send_to_peer(self, peer_id: str, message: Dict):
+        self.send_frame(peer_id, encode_message(message))
+
+    def send_frame(self, peer_id: str, frame: bytes):
+        sender = self.peer_senders.get(peer_id)
+        if sender is not None and not sender.enqueue(frame):
+            print(f"⚠️ Send queue to {peer_id} overflowed, disconnecting")
+            self.disconnect_peer(peer_id)
+
+    def send_blocks(self, peer_id: str, message: Dict, blocks: List):
+        """Send message with as many of blocks as fit in one frame; the peer getblocks the rest"""
+        blocks = blocks[:MAX_BLOCKS_PER_MESSAGE]
+        while True:
+            reply = dict(message, blocks=[block.to_dict() for block in blocks], height=len(self.chain.chain))
+            try:
+                frame = encode_message(reply)
+                break
+            except FrameError:
+                if not blocks:
+                    raise
+                blocks = blocks[:len(blocks) // 2]
+        self.send_frame(peer_id, frame)
+
+    def broadcast(self, message: Dict, exclude: str = None):
+        frame = encode_message(message)
+        for peer_id, sender in list(self.peer_senders.items()):
+            if peer_id != exclude and not sender.enqueue(frame):
+                self.disconnect_peer(peer_id)
+
+    # --- messages --------------------------------------------------------
+
+    def build_hello(self, peer_id: str) -> Dict:
+        self.challenges[peer_id] = secrets.token_hex(16)
+        return {
+            'type': 'hello',
+            'node_id': self.node_id,
+            'authority_id': self.authority_id,
+            'chain_length': len(self.chain.chain),
+            'genesis_hash': self.chain.genesis_hash(),
+            'challenge': self.challenges[peer_id]
+        }
+
+    def sign_message(self, message: bytes) -> Optional[str]:
+        """Our authority's signature of a network message (None without its private key)"""
+        private_key = self.chain.signing_key(self.authority_id) if self.authority_id else None
+        return sign(private_key, message) if private_key else None
+
+    def prove_authority(self):
+        """Sign the hello challenges of peers we haven't answered, once our authority's key is known"""
+        for peer_id, challenge in list(self.peer_challenges.items()):
+            signature = self.sign_message(hello_message(challenge))
+            if signature is None:
+                return  # Until a snapshot or grant tells us our authority's public key
+            del self.peer_challenges[peer_id]
+            self.send_to_peer(peer_id, {'type': 'auth', 'authority_id': self.authority_id, 'signature': signature})
+
+    def peer_authority(self, peer_id: str) -> Optional[str]:
+        """The authority a peer proved to be by signing our hello challenge with its current key"""
+        claim = self.peer_claims.get(peer_id)
+        authority = self.chain.authorities.get(claim['authority_id']) if claim else None
+        if authority is None:
+            return None
+        if claim['checked_key'] != authority.public_key:
+            # Checked once per key: a bootstrap or grant may give the authority the key that signed
+            claim['checked_key'] = authority.public_key
+            claim['proven'] = is_signing_key(authority.public_key) and verify(
+                authority.public_key, hello_message(self.challenges.get(peer_id, '')), claim['signature'])
+        return authority.authority_id if claim['proven'] else None
+
+    def process_message(self, message: Dict, peer_id: str):
+        """Dispatch a message; handlers that change the chain return a coroutine for the read loop to await"""
+        handler = {
+            'hello': self.handle_hello,
+            'auth': self.handle_auth,
+            'propose': self.handle_proposal,
+            'validation': self.handle_validation,
+            'reject': self.handle_reject,
+            'finalized': self.handle_finalized,
+            'getblocks': self.handle_getblocks,
+            'blocks': self.handle_blocks,
+            'getsnapshot': self.handle_getsnapshot,
+            'snapshot': self.handle_snapshot
+        }.get(message.get('type'))
+        if handler is None:
+            print(f"⚠️ Unknown PoA message type from {peer_id}: {message.get('type')}")
+            return
+        return handler(message, peer_id)
+
+    async def off_loop(self, func, *args):
+        """Run a blocking chain call in the default executor so the loop keeps serving other peers"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def handle_hello(self, message: Dict, peer_id: str):
+        if peer_id not in self.greeted:
+            # Answer an inbound hello with ours (outbound connections sent theirs already)
+            self.greeted.add(peer_id)
+            self.send_to_peer(peer_id, self.build_hello(peer_id))
+        self.peer_challenges[peer_id] = str(message.get('challenge'))
+        self.prove_authority()
+        if message.get('chain_length', 0) <= len(self.chain.chain):
+            return
+        if message.get('genesis_hash') != self.chain.genesis_hash():
+            if len(self.chain.chain) == 1 and not self.chain.pending_blocks:
+                print(f"📥 Joining the chain of {message.get('node_id')} from its snapshot")
+                self.send_to_peer(peer_id, {'type': 'getsnapshot'})
+            else:
+                print(f"⚠️ {message.get('node_id')} runs a different chain, not syncing")
+            return
+        self.send_to_peer(peer_id, {'type': 'getblocks', 'start': len(self.chain.chain)})
+
+    def handle_auth(self, message: Dict, peer_id: str):
+        """Record which authority a peer claims to be; peer_authority checks the signature"""
+        self.peer_claims[peer_id] = {'authority_id': message.get('authority_id'),
+                                     'signature': message.get('signature'), 'checked_key': None, 'proven': False}
+        if self.peer_authority(peer_id) is None and message.get('authority_id') in self.chain.authorities:
+            print(f"⚠️ {peer_id} has not proven it is authority {message.get('authority_id')}")
+
+    async def handle_proposal(self, message: Dict, peer_id: str):
+        async with self.chain_lane:
+            self.answer_proposal(message, peer_id)
+
+    def answer_proposal(self, message: Dict, peer_id: str):
+        """Validate another authority's block if it extends our chain and we haven't backed a rival"""
+        block = message.get('block') or {}
+        authority = self.chain.authorities.get(self.authority_id)
+        if authority is None or not authority.is_active:
+            return  # Observers don't vote
+        reason = self.chain.check_block(block)
+        if reason is None and block.get('creator_id') != self.peer_authority(peer_id):
+            reason = "proposer is not the block creator"
+        parent_hash = block.get('previous_hash')
+        if reason is None:
+            # The parent is our tip or a block in flight above it that we validated
+            tip = self.chain.chain[-1]
+            parent_index = tip.index if parent_hash == tip.hash else self.voted_indexes.get(parent_hash)
+            if parent_index is None or parent_index < tip.index or (parent_index == tip.index and parent_hash != tip.hash) \
+                    or block['index'] != parent_index + 1:
+                reason = "unknown or stale parent"
+            elif self.backed_child(parent_hash) not in (None, block['hash']):
+                own = self.proposals.get(self.backed_child(parent_hash))
+                if own is not None and block['hash'] < own.block_hash:
+                    # Rival proposals on one parent: the lower hash wins and we drop ours (only we could finalize it)
+                    print(f"🤝 Block #{block['index']} of {block.get('creator_name')} wins over ours, yielding")
+                    self.stats['yielded'] += 1
+                    self.abandon(own)
+                else:
+                    reason = "validated another block on the same parent"
+        if reason:
+            self.stats['rejections_sent'] += 1
+            self.send_to_peer(peer_id, {'type': 'reject', 'block_index': block.get('index'),
+                                        'block_hash': block.get('hash'), 'validator_id': self.authority_id,
+                                        'reason': reason,
+                                        'signature': self.sign_message(reject_message(str(block.get('hash'))))})
+            return
+        signature = self.chain.sign_as(self.authority_id, validation_message(block['hash']))
+        if signature is None and self.chain.requires_signature(self.authority_id):
+            return  # Without our private key a validation wouldn't count
+        self.record_vote(parent_hash, block['hash'], block['index'])
+        authority.blocks_validated += 1
+        self.stats['validations_sent'] += 1
+        self.send_to_peer(peer_id, {
+            'type': 'validation',
+            'block_index': block['index'],
+            'block_hash': block['hash'],
+            'validator_id': self.authority_id,
+            'validation_timestamp': datetime.now().isoformat(),
+            'signature': signature
+        })
+
+    def backed_child(self, parent_hash: str) -> Optional[str]:
+        """The child of parent_hash we validated, while that vote still stands"""
+        vote = self.votes.get(parent_hash)
+        if vote is None or time.time() - vote[1] > 2 * self.proposal_timeout:
+            return None
+        return vote[0]
+
+    def record_vote(self, parent_hash: str, block_hash: str, block_index: int):
+        self.votes[parent_hash] = (block_hash, time.time())
+        self.votes.move_to_end(parent_hash)
+        self.voted_indexes[block_hash] = block_index
+        while len(self.votes) > MAX_TRACKED_VOTES:
+            self.votes.popitem(last=False)
+        while len(self.voted_indexes) > MAX_TRACKED_VOTES:
+            self.voted_indexes.popitem(last=False)
+
+    async def handle_validation(self, message: Dict, peer_id: str):
+        async with self.chain_lane:
+            proposal = self.proposals.get(message.get('block_hash'))
+            validator_id = self.peer_authority(peer_id)
+            if proposal is None or validator_id is None or validator_id != message.get('validator_id'):
+                return
+            block = self.chain.pending_blocks.get(proposal.block_index)
+            if block is None or block.hash != proposal.block_hash:
+                return
+            # Checks the signature and, once the quorum is met, finalizes and saves
+            await self.off_loop(self.chain.validate_block, proposal.block_index, validator_id,
+                                message.get('signature'))
+            self.announce_finalized()
+
+    def handle_reject(self, message: Dict, peer_id: str):
+        proposal = self.proposals.get(message.get('block_hash'))
+        validator_id = self.peer_authority(peer_id)
+        if proposal is None or validator_id is None or validator_id != message.get('validator_id'):
+            return
+        authority = self.chain.authorities[validator_id]
+        if not authority.is_active or not verify(authority.public_key, reject_message(proposal.block_hash),
+                                                 message.get('signature')):
+            print(f"⚠️ Ignoring unsigned rejection of block #{proposal.block_index} from {peer_id}")
+            return
+        proposal.rejections[validator_id] = message.get('reason', '')
+        active = sum(1 for auth in self.chain.authorities.values() if auth.is_active)
+        if len(proposal.rejections) > active - self.chain.min_validations_required:
+            print(f"❌ Block #{proposal.block_index} can't reach its quorum: {message.get('reason')}")
+            self.abandon(proposal)
+
+    async def handle_finalized(self, message: Dict, peer_id: str):
+        block = message.get('block') or {}
+        async with self.chain_lane:
+            if await self.receive_finalized(block) == 'gap':
+                self.send_to_peer(peer_id, {'type': 'getblocks', 'start': len(self.chain.chain)})
+            self.announce_finalized(exclude=peer_id)
+
+    async def receive_finalized(self, block: Dict) -> str:
+        """Apply a finalized block (buffering it if blocks before it are missing); call holding chain_lane"""
+        index = block.get('index', -1)
+        if index < len(self.chain.chain):
+            return 'known'
+        if index > len(self.chain.chain):
+            self.future_blocks[index] = block
+            return 'gap'
+        if not await self.off_loop(self.chain.accept_finalized_block, block):
+            return 'rejected'
+        self.stats['blocks_received'] += 1
+        while len(self.chain.chain) in self.future_blocks:
+            if not await self.off_loop(self.chain.accept_finalized_block,
+                                       self.future_blocks.pop(len(self.chain.chain))):
+                break
+            self.stats['blocks_received'] += 1
+        self.future_blocks = {i: b for i, b in self.future_blocks.items() if i >= len(self.chain.chain)}
+        self.prune_proposals()
+        return 'accepted'
+
+    def handle_getblocks(self, message: Dict, peer_id: str):
+        start = max(message.get('start', 0), 0)
+        if start < chain_base(self.chain.chain):
+            self.handle_getsnapshot(message, peer_id)
+            return
+        self.send_blocks(peer_id, {'type': 'blocks'}, self.chain.chain[start:start + MAX_BLOCKS_PER_MESSAGE])
+
+    async def handle_blocks(self, message: Dict, peer_id: str):
+        blocks = message.get('blocks', [])
+        async with self.chain_lane:
+            for block in blocks:
+                if await self.receive_finalized(block) == 'rejected':
+                    return
+            self.announce_finalized(exclude=peer_id)
+        if blocks and len(self.chain.chain) < message.get('height', 0):
+            self.send_to_peer(peer_id, {'type': 'getblocks', 'start': len(self.chain.chain)})
+
+    def handle_getsnapshot(self, message: Dict, peer_id: str):
+        self.loop.create_task(self.send_snapshot(peer_id))
+
+    async def send_snapshot(self, peer_id: str):
+        snapshot = self.chain.latest_snapshot
+        if snapshot is None or snapshot.height < chain_base(self.chain.chain) + 1:
+            # Writing a snapshot waits for the saver and reads the store: keep it off the event loop
+            snapshot = await asyncio.get_running_loop().run_in_executor(
+                None, self.chain.create_snapshot, len(self.chain.chain))
+        tail = self.chain.chain[snapshot.height:snapshot.height + MAX_BLOCKS_PER_MESSAGE]
+        self.send_blocks(peer_id, {'type': 'snapshot', 'snapshot': snapshot.to_dict()}, tail)
+
+    async def handle_snapshot(self, message: Dict, peer_id: str):
+        async with self.chain_lane:
+            # Verifying the tail, flushing and resetting the store all block: keep them off the loop
+            if not await self.off_loop(self.chain.bootstrap_from_snapshot, message.get('snapshot') or {},
+                                       message.get('blocks', [])):
+                return
+            self.announced_height = len(self.chain.chain)
+            self.proposals.clear()
+            self.prove_authority()
+            if len(self.chain.chain) < message.get('height', 0):
+                self.send_to_peer(peer_id, {'type': 'getblocks', 'start': len(self.chain.chain)})
+
+    # --- proposing -------------------------------------------------------
+
+    def submit(self, data: Dict) -> bool:
+        """Pool an event for our next block (callable from any thread)"""
+        if not self.chain.submit_transaction(data, self.authority_id):
+            return False
+        self.wake()
+        return True
+
+    def wake(self):
+        if self.loop is not None and self._wakeup is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _proposer(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), PROPOSER_TICK)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                async with self.chain_lane:
+                    if self.authority_id:
+                        self.chain.seal_due_blocks(self.authority_id)
+                        self.propose_pending()
+                    self.expire_proposals()
+            except Exception as e:
+                print(f"❌ PoA proposer error: {e}")
+
+    def propose_pending(self):
+        """Propose our pending blocks that haven't been sent, up to the outstanding limit"""
+        for block in self.chain.pending_blocks:
+            if len(self.proposals) >= self.max_outstanding:
+                break
+            if block.hash in self.proposals or block.creator_id != self.authority_id:
+                continue
+            if self.backed_child(block.previous_hash) not in (None, block.hash):
+                break  # We validated a rival on this parent; wait for it to finalize or expire
+            self.proposals[block.hash] = Proposal(block.index, block.hash, self.proposal_timeout)
+            self.record_vote(block.previous_hash, block.hash, block.index)
+            self.stats['proposed'] += 1
+            self.broadcast({'type': 'propose', 'block': block.to_dict()})
+            # Our own validation counts towards the quorum
+            self.chain.validate_block(block.index, self.authority_id)
+        self.announce_finalized()
+
+    def announce_finalized(self, exclude: str = None):
+        """Gossip blocks that joined our chain since the last announcement"""
+        height = len(self.chain.chain)
+        if height > self.announced_height:
+            for block in self.chain.chain[max(self.announced_height, chain_base(self.chain.chain)):height]:
+                self.broadcast({'type': 'finalized', 'block': block.to_dict()}, exclude)
+            self.announced_height = height
+            self.prove_authority()
+        self.prune_proposals()
+
+    def prune_proposals(self):
+        """Forget proposals that were finalized or are no longer pending"""
+        for block_hash, proposal in list(self.proposals.items()):
+            if proposal.block_index < len(self.chain.chain):
+                block = self.chain.chain[proposal.block_index]
+                if block.hash == block_hash:
+                    self.stats['finalized'] += 1
+                    self.stats['finalize_seconds'] += time.time() - proposal.sent_at
+                del self.proposals[block_hash]
+            elif self.chain.pending_blocks.find(block_hash) is None:
+                del self.proposals[block_hash]
+
+    def expire_proposals(self, now: float = None):
+        """Abandon the oldest proposal past its deadline (and everything queued behind it)"""
+        now = now or time.time()
+        for proposal in list(self.proposals.values()):
+            if proposal.deadline <= now:
+                print(f"⏰ Block #{proposal.block_index} timed out waiting for validations")
+                self.stats['timeouts'] += 1
+                self.abandon(proposal)
+                return
+
+    def abandon(self, proposal: Proposal):
+        dropped = self.chain.drop_pending_from(proposal.block_index)
+        self.stats['abandoned'] += len(dropped)
+        for block in dropped:
+            # Our votes for our own dropped blocks go with them: nobody else can finalize those
+            if self.votes.get(block.previous_hash, (None,))[0] == block.hash:
+                del self.votes[block.previous_hash]
+        self.prune_proposals()
+
+    def get_stats(self) -> Dict:
+        """Proposal pipeline and gossip counters (callable from any thread)"""
+        def collect():
+            finalized = self.stats['finalized']
+            return {
+                **self.stats,
+                'outstanding': len(self.proposals),
+                'peers': len(self.peer_writers),
+                'authority_peers': sum(1 for peer_id in self.peer_claims if self.peer_authority(peer_id)),
+                'avg_finalize_seconds': round(self.stats['finalize_seconds'] / finalized, 4) if finalized else 0.0,
+                'chain_length': len(self.chain.chain),
+                'pending_blocks': len(self.chain.pending_blocks)
+            }
+        return self._call_in_loop(collect)
+
+def read_private_key(key_file: str = None) -> Optional[str]:
+    """Authority private key from a file or the environment, never the command line (ps, shell history)"""
+    if key_file:
+        with open(key_file, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    return os.environ.get(KEY_ENV_VAR) or None
+
+def main():
+    """Run a PoA authority node and connect it to its peers"""
+    parser = argparse.ArgumentParser(description="PoA authority node with networked validation")
+    parser.add_argument('--port', type=int, default=8340, help="Port to listen on")
+    parser.add_argument('--authority', default=None, help="Authority id this node validates as")
+    parser.add_argument('--key-file', default=None,
+                        help=f"File holding that authority's private key (hex) to add to the keyring; "
+                             f"or set {KEY_ENV_VAR}")
+    parser.add_argument('--peers', nargs='*', default=[], help="Peers to connect to (host:port)")
+    parser.add_argument('--min-validations', type=int, default=None,
+                        help="Validations needed to finalize a block")
+    parser.add_argument('--proposal-timeout', type=float, default=PROPOSAL_TIMEOUT,
+                        help="Seconds a proposal may wait for its quorum")
+    args = parser.parse_args()
+
+    chain = PoABlockchain(f"POA_{args.port}", f"PoA Node {args.port}", port=args.port)
+    private_key = read_private_key(args.key_file)
+    if private_key:
+        print(f"🔑 Signing as {chain.keyring.add(private_key)}")
+    if args.min_validations:
+        chain.min_validations_required = args.min_validations
+    node = PoANetworkNode(chain, args.authority, proposal_timeout=args.proposal_timeout)
+    if not node.start():
+        return
+    for peer in args.peers:
+        host, port = peer.rsplit(':', 1)
+        node.connect_to_peer(host, int(port))
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📊 {node.get_stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.stop()
+        chain.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+POA CHAIN STORAGE BACKENDS
+Where PoABlockchain keeps its blocks, pending blocks and authorities
+
+Both backends offer the same interface so PoABlockchain can switch with a
+single constructor argument:
+  log     append-only block log plus a small JSON state file (default)
+  sqlite  one SQLite database with indexed blocks, pending blocks and
+          authorities, so history queries don't need a chain scan
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from block_store import (WriteStats, log_base_for, write_json_atomic, LOAD_BATCH_SIZE,
+                         DURABILITY_FSYNC, DURABILITY_INTERVAL, DURABILITY_BUFFERED, DURABILITY_POLICIES)
+from block_codec import CODEC_JSON
+from segment_store import SegmentedBlockLog, open_block_log, restart_block_log, first_position
+from tx_pool import block_transactions
+
+STORAGE_LOG = "log"
+STORAGE_SQLITE = "sqlite"
+STORAGE_BACKENDS = (STORAGE_LOG, STORAGE_SQLITE)
+
+PAYLOAD_CACHE_SIZE = 1024  # Block payloads kept in memory when the chain is loaded lazily
+STORE_BASE_KEY = "store_base"  # Meta row holding where a reset SQLite store restarts
+
+# Durability policy -> SQLite synchronous mode. In WAL mode NORMAL only
+# syncs at checkpoints, which is the closest SQLite has to an fsync interval.
+SQLITE_SYNCHRONOUS = {
+    DURABILITY_FSYNC: "FULL",
+    DURABILITY_INTERVAL: "NORMAL",
+    DURABILITY_BUFFERED: "OFF"
+}
+
+class LogChainStore:
+    """Finalized blocks in an append-only log, mutable state in a side file"""
+    indexed = False
+
+    def __init__(self, blockchain_file: str, durability: str = DURABILITY_BUFFERED, codec: str = CODEC_JSON,
+                 segment_size: int = None, archive_dir: str = None):
+        self.block_log = open_block_log(log_base_for(blockchain_file), durability, codec, segment_size, archive_dir)
+        self.durability = durability
+        self.segment_size = segment_size
+        self.archive_dir = archive_dir
+        self.state_file = log_base_for(blockchain_file) + '.state.json'
+        self.location = self.block_log.data_path
+
+    def exists(self) -> bool:
+        return self.block_log.exists() or os.path.exists(self.state_file)
+
+    def sync_chain(self, block_hashes: List[str], start: int = 0) -> int:
+        return self.block_log.sync_chain(block_hashes, start)
+
+    def stored_height(self) -> int:
+        """Position after the last stored block"""
+        return len(self.block_log)
+
+    def first_position(self) -> int:
+        return first_position(self.block_log)
+
+    def reset(self, start: int):
+        """Drop every stored block; the next one appended is block start"""
+        self.block_log = restart_block_log(self.block_log, start, self.segment_size, self.archive_dir)
+        self.location = self.block_log.data_path
+
+    def prune_blocks(self, upto: int) -> int:
+        """Delete stored history below upto where the layout allows it (whole segments only)"""
+        if isinstance(self.block_log, SegmentedBlockLog):
+            return self.block_log.prune_segments(upto)
+        return 0
+
+    def append_blocks(self, block_dicts: List[Dict]):
+        if block_dicts:
+            self.block_log.append_many(block_dicts)
+
+    def iter_blocks(self, start: int = 0) -> Iterator[Dict]:
+        return self.block_log.iter_blocks(start)
+
+    def get_block(self, index: int) -> Optional[Dict]:
+        if 0 <= index < len(self.block_log):
+            return self.block_log.read(index)
+        return None
+
+    def iter_headers(self, start: int = 0) -> Iterator[Dict]:
+        return self.block_log.iter_headers(start)
+
+    def get_payload(self, index: int):
+        return self.block_log.read(index)['data']
+
+    def save_state(self, state: Dict):
+        write_json_atomic(self.state_file, state, fsync=self.durability == DURABILITY_FSYNC)
+
+    def load_state(self) -> Dict:
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r') as f:
+            return json.load(f)
+
+    def archive_blocks(self, upto: int) -> int:
+        """Compress sealed segments below upto (single-file logs have none)"""
+        if isinstance(self.block_log, SegmentedBlockLog):
+            return self.block_log.archive_segments(upto)
+        return 0
+
+    def get_stats(self) -> Dict:
+        return self.block_log.get_stats()
+
+    def close(self):
+        self.block_log.close()
+
+class SQLiteChainStore:
+    """Blocks, pending blocks and authorities in SQLite with indexed lookups"""
+    indexed = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blocks (
+            block_index INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL,
+            previous_hash TEXT NOT NULL,
+            creator_id TEXT,
+            data_type TEXT,
+            user_id TEXT,
+            creator_user_id TEXT,
+            body TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_blocks_hash ON blocks(hash);
+        CREATE INDEX IF NOT EXISTS idx_blocks_creator ON blocks(creator_id);
+        CREATE INDEX IF NOT EXISTS idx_blocks_type ON blocks(data_type);
+        CREATE INDEX IF NOT EXISTS idx_blocks_user ON blocks(user_id);
+        CREATE INDEX IF NOT EXISTS idx_blocks_creator_user ON blocks(creator_user_id);
+        CREATE TABLE IF NOT EXISTS transactions (
+            block_index INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            data_type TEXT,
+            user_id TEXT,
+            creator_user_id TEXT,
+            PRIMARY KEY (block_index, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tx_type ON transactions(data_type);
+        CREATE INDEX IF NOT EXISTS idx_tx_user ON transactions(user_id);
+        CREATE INDEX IF NOT EXISTS idx_tx_creator_user ON transactions(creator_user_id);
+        CREATE TABLE IF NOT EXISTS pending_blocks (
+            position INTEGER PRIMARY KEY,
+            block_index INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS authorities (
+            authority_id TEXT PRIMARY KEY,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, blockchain_file: str, durability: str = DURABILITY_BUFFERED):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {durability}")
+        self.location = log_base_for(blockchain_file) + '.db'
+        self.durability = durability
+        self.lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        self.stats = WriteStats(durability)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.location)
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.location, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS[self.durability]}")
+            self.conn.executescript(self.SCHEMA)
+            # Databases from before packed blocks: every block was a single transaction
+            if (self.conn.execute("SELECT 1 FROM blocks LIMIT 1").fetchone()
+                    and not self.conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone()):
+                with self.conn:
+                    self.conn.execute("INSERT INTO transactions SELECT block_index, 0, data_type, user_id, "
+                                      "creator_user_id FROM blocks")
+        return self.conn
+
+    def sync_chain(self, block_hashes: List[str], start: int = 0) -> int:
+        """Delete stored blocks that diverge from the given chain (block_hashes[0] is block start);
+        returns the height that still matches"""
+        with self.lock:
+            conn = self.connect()
+            stored = conn.execute("SELECT COALESCE(MAX(block_index) + 1, 0) FROM blocks").fetchone()[0]
+            keep = min(stored, start + len(block_hashes))
+            while keep > start:
+                row = conn.execute("SELECT hash FROM blocks WHERE block_index = ?", (keep - 1,)).fetchone()
+                if row and row[0] == block_hashes[keep - 1 - start]:
+                    break
+                keep -= 1
+            if keep < stored:
+                with conn:
+                    conn.execute("DELETE FROM blocks WHERE block_index >= ?", (keep,))
+                    conn.execute("DELETE FROM transactions WHERE block_index >= ?", (keep,))
+            return keep
+
+    def append_blocks(self, block_dicts: List[Dict]):
+        rows, tx_rows = [], []
+        for block_dict in block_dicts:
+            data = block_dict['data'] if isinstance(block_dict['data'], dict) else {}
+            rows.append((
+                block_dict['index'], block_dict['hash'], block_dict['previous_hash'],
+                block_dict.get('creator_id'), data.get('type'), data.get('user_id'),
+                data.get('creator_user_id'), json.dumps(block_dict)
+            ))
+            # Packed blocks are indexed per transaction so lookups find events inside them
+            tx_rows.extend((block_dict['index'], position, tx.get('type'), tx.get('user_id'), tx.get('creator_user_id'))
+                           for position, tx in enumerate(block_transactions(data)))
+        if not rows:
+            return
+        started = time.perf_counter()
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?)", tx_rows)
+        # One transaction per call: every block in it shares the commit
+        self.stats.record_write(time.perf_counter() - started, len(rows))
+        if self.durability == DURABILITY_FSYNC:
+            self.stats.record_flush(len(rows))
+
+    def iter_blocks(self, start: int = 0) -> Iterator[Dict]:
+        """Blocks in chain order, fetched one page at a time"""
+        while True:
+            with self.lock:
+                rows = self.connect().execute(
+                    "SELECT block_index, body FROM blocks WHERE block_index >= ? ORDER BY block_index LIMIT ?",
+                    (start, LOAD_BATCH_SIZE)).fetchall()
+            for _, body in rows:
+                yield json.loads(body)
+            if len(rows) < LOAD_BATCH_SIZE:
+                return
+            start = rows[-1][0] + 1
+
+    def get_block(self, index: int) -> Optional[Dict]:
+        return self._select_one("SELECT body FROM blocks WHERE block_index = ?", (index,))
+
+    def iter_headers(self, start: int = 0) -> Iterator[Dict]:
+        for block in self.iter_blocks(start):
+            block.pop('data', None)
+            yield block
+
+    def get_payload(self, index: int):
+        block = self.get_block(index)
+        if block is None:
+            raise KeyError(f"Block #{index} not in store")
+        return block['data']
+
+    def get_block_by_hash(self, block_hash: str) -> Optional[Dict]:
+        return self._select_one("SELECT body FROM blocks WHERE hash = ?", (block_hash,))
+
+    def _select_one(self, query: str, params: tuple) -> Optional[Dict]:
+        with self.lock:
+            row = self.connect().execute(query, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_block_indexes(self, data_type: str = None, creator_id: str = None,
+                           user_id: str = None) -> List[int]:
+        """Indexes of blocks with a transaction matching every given filter, in chain order"""
+        clauses, params = [], []
+        if data_type is not None:
+            clauses.append("t.data_type = ?")
+            params.append(data_type)
+        if creator_id is not None:
+            clauses.append("b.creator_id = ?")
+            params.append(creator_id)
+        if user_id is not None:
+            clauses.append("(t.user_id = ? OR t.creator_user_id = ?)")
+            params.extend([user_id, user_id])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            rows = self.connect().execute(
+                f"SELECT DISTINCT t.block_index FROM transactions t JOIN blocks b ON b.block_index = t.block_index "
+                f"{where} ORDER BY t.block_index", params).fetchall()
+        return [row[0] for row in rows]
+
+    def count_blocks(self) -> int:
+        with self.lock:
+            return self.connect().execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    def count_transactions(self, data_type: str = None, upto: int = None) -> int:
+        """Stored transactions, optionally of one data type and in blocks below upto"""
+        clauses, params = [], []
+        if data_type is not None:
+            clauses.append("data_type = ?")
+            params.append(data_type)
+        if upto is not None:
+            clauses.append("block_index < ?")
+            params.append(upto)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            return self.connect().execute(f"SELECT COUNT(*) FROM transactions {where}", params).fetchone()[0]
+
+    def save_state(self, state: Dict):
+        """Replace pending blocks, upsert authorities and store the remaining fields as meta"""
+        state = dict(state)
+        authorities = state.pop('authorities', {})
+        pending = state.pop('pending_blocks', [])
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO authorities VALUES (?, ?)",
+                                 [(auth_id, json.dumps(auth)) for auth_id, auth in authorities.items()])
+                conn.execute("DELETE FROM pending_blocks")
+                conn.executemany("INSERT INTO pending_blocks VALUES (?, ?, ?, ?)",
+                                 [(i, b['index'], b['hash'], json.dumps(b)) for i, b in enumerate(pending)])
+                conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                 [(key, json.dumps(value)) for key, value in state.items()])
+
+    def load_state(self) -> Dict:
+        with self.lock:
+            conn = self.connect()
+            rows = conn.execute("SELECT key, value FROM meta WHERE key != ?", (STORE_BASE_KEY,))
+            state = {key: json.loads(value) for key, value in rows}
+            state['authorities'] = {
+                auth_id: json.loads(body) for auth_id, body in conn.execute("SELECT authority_id, body FROM authorities")
+            }
+            state['pending_blocks'] = [
+                json.loads(body) for (body,) in conn.execute("SELECT body FROM pending_blocks ORDER BY position")
+            ]
+        return state
+
+    def archive_blocks(self, upto: int) -> int:
+        """SQLite manages its own pages; there are no segments to archive"""
+        return 0
+
+    def _base(self, conn) -> int:
+        """Position an empty store starts at (0 until a reset moves it)"""
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (STORE_BASE_KEY,)).fetchone()
+        return json.loads(row[0]) if row else 0
+
+    def stored_height(self) -> int:
+        with self.lock:
+            conn = self.connect()
+            return conn.execute("SELECT COALESCE(MAX(block_index) + 1, ?) FROM blocks", (self._base(conn),)).fetchone()[0]
+
+    def first_position(self) -> int:
+        with self.lock:
+            conn = self.connect()
+            return conn.execute("SELECT COALESCE(MIN(block_index), ?) FROM blocks", (self._base(conn),)).fetchone()[0]
+
+    def reset(self, start: int):
+        """Drop every stored block; the next one appended is block start"""
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute("DELETE FROM blocks")
+                conn.execute("DELETE FROM transactions")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (STORE_BASE_KEY, json.dumps(start)))
+
+    def prune_blocks(self, upto: int) -> int:
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute("DELETE FROM transactions WHERE block_index < ?", (upto,))
+                return conn.execute("DELETE FROM blocks WHERE block_index < ?", (upto,)).rowcount
+
+    def get_stats(self) -> Dict:
+        return {'records': self.count_blocks(), **self.stats.to_dict()}
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+class PayloadCache:
+    """LRU of block data payloads, loading misses from the store by block index"""
+    def __init__(self, loader: Callable[[int], Any], max_size: int = PAYLOAD_CACHE_SIZE):
+        self.loader = loader
+        self.max_size = max_size
+        self.entries: "OrderedDict[int, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, index: int) -> Any:
+        with self.lock:
+            if index in self.entries:
+                self.entries.move_to_end(index)
+                self.hits += 1
+                return self.entries[index]
+        # Load outside the lock so one slow read doesn't stall other lookups
+        payload = self.loader(index)
+        with self.lock:
+            self.misses += 1
+            self.entries[index] = payload
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return payload
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'cached': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+def open_store(blockchain_file: str, storage: str = STORAGE_LOG, durability: str = DURABILITY_BUFFERED,
+               codec: str = CODEC_JSON, segment_size: int = None, archive_dir: str = None):
+    """Create the storage backend named by storage (SQLite keeps JSON bodies so they stay queryable)"""
+    if storage == STORAGE_LOG:
+        return LogChainStore(blockchain_file, durability, codec, segment_size, archive_dir)
+    if storage == STORAGE_SQLITE:
+        if segment_size is not None:
+            raise ValueError("Segmented storage only applies to the log backend")
+        return SQLiteChainStore(blockchain_file, durability)
+    raise ValueError(f"Unknown storage backend: {storage}")
@@ -10,6 +10,7 @@ from typing import Dict, List, Optional, Any
 from user_manager import UserManager, User
 from organization_manager import OrganizationManager
 from poa_blockchain import PoABlockchain, Authority
+from tx_pool import block_transactions, TX_BATCH_TYPE
 
 class PoABlockchainUserSystem:
     """Integration of user management with PoA blockchain"""
@@ -62,7 +63,7 @@ class PoABlockchainUserSystem:
         
         success = self.blockchain.grant_authority(
             new_authority_name=authority_name,
-            new_authority_public_key=user.public_key_pem[:100] if user.public_key_pem else f"USER_KEY_{user_id}",
+            new_authority_public_key=None,  # Signing key pair generated and kept by this node
             new_authority_address=authority_address,
             granter_id=granter_authority_id
         )
@@ -218,16 +219,21 @@ class PoABlockchainUserSystem:
             return []
         
         user_blocks = []
-        for block in self.blockchain.chain:
-            if block.data.get('user_id') == user_id or block.data.get('creator_user_id') == user_id:
+        for block in self.blockchain.find_blocks(user_id=user_id):
+            # A packed block carries other users' events too; only this user's are listed
+            for position, transaction in enumerate(block_transactions(block.data)):
+                if user_id not in (transaction.get('user_id'), transaction.get('creator_user_id')):
+                    continue
                 user_blocks.append({
                     'block_index': block.index,
-                    'type': block.data.get('type'),
+                    'type': transaction.get('type'),
                     'timestamp': block.timestamp,
                     'creator': block.creator_name,
-                    'data': block.data,
+                    'data': transaction,
                     'validations': len(block.validations),
-                    'is_finalized': block.is_finalized
+                    'is_finalized': block.is_finalized,
+                    # Lets a client check the entry against the block header alone
+                    'proof': block.transaction_proof(position)
                 })
         
         return user_blocks
@@ -240,10 +246,10 @@ class PoABlockchainUserSystem:
         stats = self.blockchain.get_authority_stats()
         
         # Add user management specific stats
-        user_registrations = len([b for b in self.blockchain.chain if b.data.get('type') == 'USER_REGISTRATION'])
-        org_creations = len([b for b in self.blockchain.chain if b.data.get('type') == 'ORGANIZATION_CREATION'])
-        org_joins = len([b for b in self.blockchain.chain if b.data.get('type') == 'ORGANIZATION_JOIN'])
-        authority_grants = len([b for b in self.blockchain.chain if b.data.get('type') == 'AUTHORITY_GRANT'])
+        user_registrations = self.blockchain.count_transactions('USER_REGISTRATION')
+        org_creations = self.blockchain.count_transactions('ORGANIZATION_CREATION')
+        org_joins = self.blockchain.count_transactions('ORGANIZATION_JOIN')
+        authority_grants = self.blockchain.count_transactions('AUTHORITY_GRANT')
         
         stats.update({
             'user_registrations_on_blockchain': user_registrations,
@@ -295,6 +301,8 @@ class PoABlockchainUserSystem:
             recent_blocks = self.blockchain.chain[-5:] if len(self.blockchain.chain) > 5 else self.blockchain.chain
             for block in recent_blocks:
                 block_type = block.data.get('type', 'UNKNOWN')
+                if block_type == TX_BATCH_TYPE:
+                    block_type = f"{block_type} ({block.data.get('tx_count', 0)} transactions)"
                 validation_count = len(block.validations)
                 status = "🔒" if block.is_finalized else "⏳"
                 print(f"   {status} Block #{block.index}: {block_type}")
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+SEGMENTED BLOCK STORAGE
+A block log split into fixed-size segment files that can be archived or pruned
+
+Segments live in <name>.segments/, each one a BlockLog named after the chain
+position of its first block:
+  000000000000.blocks / .idx   blocks 0 .. 4999 (sealed)
+  000000005000.blocks / .idx   blocks 5000 .. tip (active)
+Appends go to the active segment. When the next record would take it past
+segment_size bytes it is sealed and a new segment is started, so a record
+never straddles two files. Sealed segments are opened on demand and only a
+few are kept open at a time.
+
+Old sealed segments can be
+  archived  gzip-compressed into the archive directory (still readable): each
+            frame of about ARCHIVE_FRAME_SIZE bytes of whole records is its own
+            gzip member, and a .frames table maps records to frames, so a read
+            decompresses one frame rather than the whole segment
+  pruned    deleted, which is only safe once a verified snapshot covers them
+A segment's block count is the gap to the next segment's start, so the
+directory listing is the whole manifest.
+"""
+
+import bisect
+import gzip
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from block_store import (BlockLog, WriteStats, RECORD_HEADER, INDEX_ENTRY, FSYNC_INTERVAL_MS,
+                         DURABILITY_BUFFERED, DURABILITY_POLICIES, encode_record, decode_record, hash_key)
+from block_codec import CODEC_JSON, CODECS
+
+SEGMENT_SIZE = 64 * 1024 * 1024  # Bytes of records per segment file
+OPEN_SEGMENTS = 8                # Sealed segments kept open for reads
+ARCHIVE_FRAME_SIZE = 256 * 1024  # Uncompressed bytes of records per archive frame
+FRAME_ENTRY = struct.Struct('<IQI')  # first record, compressed offset, compressed length
+ARCHIVE_EXTENSIONS = ('.blocks.gz', '.frames', '.idx')
+
+class PrunedBlockError(LookupError):
+    """Raised when a block's segment has been pruned from disk"""
+    pass
+
+class ArchivedSegment:
+    """Read-only view of a compressed sealed segment, decompressed one frame at a time"""
+    def __init__(self, base_path: str):
+        self.data_path = base_path + '.blocks.gz'
+        with open(base_path + '.idx', 'rb') as f:
+            entries = list(INDEX_ENTRY.iter_unpack(f.read()))
+        self.offsets = [offset for offset, _, _ in entries]
+        self.lengths = [length for _, length, _ in entries]
+        self.hashes = [key for _, _, key in entries]
+        if os.path.exists(base_path + '.frames'):
+            with open(base_path + '.frames', 'rb') as f:
+                self.frames = list(FRAME_ENTRY.iter_unpack(f.read()))
+        else:
+            # Archived as one gzip stream: the whole segment is a single frame
+            self.frames = [(0, 0, os.path.getsize(self.data_path))]
+        self.frame_starts = [first for first, _, _ in self.frames]
+        self.file = None
+        self.frame: Optional[Tuple[int, int, bytes]] = None  # (frame, its first byte, its records)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def hash_at(self, position: int) -> bytes:
+        return self.hashes[position]
+
+    def read_payload(self, position: int) -> bytes:
+        frame = bisect.bisect_right(self.frame_starts, position) - 1
+        if self.frame is None or self.frame[0] != frame:
+            first, offset, length = self.frames[frame]
+            if self.file is None:
+                self.file = open(self.data_path, 'rb')
+            self.file.seek(offset)
+            self.frame = (frame, self.offsets[first], gzip.decompress(self.file.read(length)))
+        _, base, data = self.frame
+        start = self.offsets[position] - base
+        return data[start + RECORD_HEADER.size:start + self.lengths[position]]
+
+    def read(self, position: int, with_data: bool = True) -> Dict:
+        return decode_record(self.read_payload(position), with_data)
+
+    def close(self):
+        self.frame = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def write_archive(source_base: str, target_base: str, frame_size: int = ARCHIVE_FRAME_SIZE):
+    """Compress a sealed segment frame by frame; the .blocks.gz is written last, once its tables are in place"""
+    with open(source_base + '.idx', 'rb') as f:
+        index = f.read()
+    entries = list(INDEX_ENTRY.iter_unpack(index))
+    frames = bytearray()
+    with open(source_base + '.blocks', 'rb') as src, open(target_base + '.blocks.gz.tmp', 'wb') as dst:
+        first = 0
+        while first < len(entries):
+            # Whole records up to frame_size bytes; a larger record gets a frame to itself
+            start = entries[first][0]
+            end = first + 1
+            while end < len(entries) and entries[end][0] + entries[end][1] - start <= frame_size:
+                end += 1
+            src.seek(start)
+            compressed = gzip.compress(src.read(entries[end - 1][0] + entries[end - 1][1] - start))
+            frames += FRAME_ENTRY.pack(first, dst.tell(), len(compressed))
+            dst.write(compressed)
+            first = end
+    for ext, content in (('.idx', index), ('.frames', frames)):
+        with open(target_base + ext + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(target_base + ext + '.tmp', target_base + ext)
+    os.replace(target_base + '.blocks.gz.tmp', target_base + '.blocks.gz')
+
+class SegmentedBlockLog:
+    """BlockLog-compatible block log spread over fixed-size segment files"""
+    def __init__(self, base_path: str, durability: str = DURABILITY_BUFFERED,
+                 fsync_interval_ms: int = FSYNC_INTERVAL_MS, codec: str = CODEC_JSON,
+                 segment_size: int = SEGMENT_SIZE, archive_dir: str = None):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {durability}")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown block codec: {codec}")
+        self.base_path = base_path
+        self.name = os.path.basename(base_path)
+        self.dir = base_path + '.segments'
+        self.archive_dir = archive_dir or os.path.join(self.dir, 'archive')
+        self.data_path = self.dir
+        self.durability = durability
+        self.fsync_interval_ms = fsync_interval_ms
+        self.codec = codec
+        self.segment_size = segment_size
+        self.lock = threading.RLock()
+        self.stats = WriteStats(durability)  # shared by every segment
+        self.starts: List[int] = []          # first position of each retained segment, ascending
+        self.archived: Set[int] = set()
+        self.active: Optional[BlockLog] = None
+        self.readers: "OrderedDict[int, Union[BlockLog, ArchivedSegment]]" = OrderedDict()
+        self.bytes_written = 0
+        self.rotations = 0
+
+    def _segment_base(self, start: int) -> str:
+        return os.path.join(self.dir, f"{start:012d}")
+
+    def _archive_base(self, start: int) -> str:
+        return os.path.join(self.archive_dir, f"{self.name}.{start:012d}")
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.dir) or os.path.exists(self.base_path + '.blocks')
+
+    def open(self):
+        """Discover segments (adopting a single-file log as the first one) and open the active one"""
+        with self.lock:
+            if self.active is not None:
+                return
+            os.makedirs(self.dir, exist_ok=True)
+            hot = {int(name[:-7]) for name in os.listdir(self.dir)
+                   if name.endswith('.blocks') and name[:-7].isdigit()}
+            if not hot and os.path.exists(self.base_path + '.blocks'):
+                for ext in ('.blocks', '.idx'):
+                    if os.path.exists(self.base_path + ext):
+                        os.replace(self.base_path + ext, self._segment_base(0) + ext)
+                hot.add(0)
+                print(f"📦 Adopted {self.base_path}.blocks as the first segment in {self.dir}")
+            archived = set()
+            prefix = self.name + '.'
+            if os.path.isdir(self.archive_dir):
+                for name in os.listdir(self.archive_dir):
+                    digits = name[len(prefix):-len('.blocks.gz')]
+                    if name.startswith(prefix) and name.endswith('.blocks.gz') and digits.isdigit():
+                        archived.add(int(digits))
+            # A segment present in both places was mid-archive at a crash: the hot copy wins
+            self.archived = archived - hot
+            self.starts = sorted(hot | self.archived) or [0]
+            if self.starts[-1] in self.archived:
+                last = self.starts[-1]
+                self.starts.append(last + len(ArchivedSegment(self._archive_base(last))))
+            self.active = self._open_log(self.starts[-1], self.durability)
+
+    def _open_log(self, start: int, durability: str) -> BlockLog:
+        log = BlockLog(self._segment_base(start), durability, self.fsync_interval_ms, codec=self.codec)
+        log.stats = self.stats
+        log.open()
+        return log
+
+    def _reader(self, start: int) -> Union[BlockLog, ArchivedSegment]:
+        """The active log, or a cached reader for a sealed segment"""
+        if start == self.starts[-1]:
+            return self.active
+        reader = self.readers.get(start)
+        if reader is None:
+            if start in self.archived:
+                reader = ArchivedSegment(self._archive_base(start))
+            else:
+                reader = self._open_log(start, DURABILITY_BUFFERED)
+            self.readers[start] = reader
+            while len(self.readers) > OPEN_SEGMENTS:
+                self.readers.popitem(last=False)[1].close()
+        else:
+            self.readers.move_to_end(start)
+        return reader
+
+    def _drop_reader(self, start: int):
+        reader = self.readers.pop(start, None)
+        if reader is not None:
+            reader.close()
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """(segment start, position within segment) of a chain position"""
+        if position < self.starts[0]:
+            raise PrunedBlockError(f"Block #{position} was pruned (log starts at #{self.starts[0]})")
+        if position >= len(self):
+            raise IndexError(f"Block #{position} is past the end of the log")
+        start = self.starts[bisect.bisect_right(self.starts, position) - 1]
+        return start, position - start
+
+    def __len__(self) -> int:
+        self.open()
+        return self.starts[-1] + len(self.active)
+
+    @property
+    def first_position(self) -> int:
+        """Lowest position still on disk (hot or archived)"""
+        self.open()
+        return self.starts[0]
+
+    def hash_at(self, position: int) -> bytes:
+        with self.lock:
+            start, offset = self._locate(position)
+            return self._reader(start).hash_at(offset)
+
+    def append(self, block_dict: Dict) -> int:
+        return self.append_many([block_dict])
+
+    def append_many(self, block_dicts: List[Dict]) -> int:
+        """Append block records, rotating segments as they fill; returns the last position"""
+        return self.append_encoded([(encode_record(block_dict, self.codec), hash_key(block_dict['hash']))
+                                    for block_dict in block_dicts])
+
+    def append_encoded(self, records: List[Tuple[bytes, bytes]]) -> int:
+        with self.lock:
+            self.open()
+            position = len(self) - 1
+            i = 0
+            while i < len(records):
+                # Take as many records as fit; an oversized record gets a segment to itself
+                room = self.segment_size - self.active.data_size()
+                end, size = i, 0
+                while end < len(records):
+                    record_size = RECORD_HEADER.size + len(records[end][0])
+                    if size + record_size > room and (end > i or len(self.active)):
+                        break
+                    size += record_size
+                    end += 1
+                if end == i:
+                    self._rotate()
+                    continue
+                position = self.starts[-1] + self.active.append_encoded(records[i:end])
+                self.bytes_written += size
+                i = end
+            return position
+
+    def _rotate(self):
+        """Seal the active segment and start a new one after it"""
+        sealed_start = self.starts[-1]
+        start = sealed_start + len(self.active)
+        self.active.close()  # commits first unless the policy is buffered
+        self.active = self._open_log(start, self.durability)
+        self.starts.append(start)
+        self.rotations += 1
+        print(f"🗂️ Sealed segment #{sealed_start}-#{start - 1}, new segment starts at #{start}")
+
+    def commit(self, records: Optional[int] = None):
+        """Make the first records durable (sealed segments were committed when sealed)"""
+        with self.lock:
+            self.open()
+            active, start = self.active, self.starts[-1]
+        active.commit(None if records is None else max(0, records - start))
+
+    def truncate(self, count: int):
+        """Drop every record from position count onwards, deleting whole segments past it"""
+        with self.lock:
+            self.open()
+            if count >= len(self):
+                return
+            if count < self.starts[0]:
+                raise PrunedBlockError(f"Cannot roll back to #{count}: log starts at #{self.starts[0]}")
+            target = self.starts[bisect.bisect_right(self.starts, count) - 1]
+            if target in self.archived:
+                raise ValueError(f"Cannot roll back into archived segment #{target}")
+            if target != self.starts[-1]:
+                self.active.close()
+                for start in [s for s in self.starts if s > target]:
+                    self._drop_reader(start)
+                    for ext in ('.blocks', '.idx'):
+                        os.remove(self._segment_base(start) + ext)
+                self.starts = [s for s in self.starts if s <= target]
+                self._drop_reader(target)
+                self.active = self._open_log(target, self.durability)
+            self.active.truncate(count - target)
+
+    def read_payload(self, position: int) -> bytes:
+        """Encoded block at position, copied out of its segment"""
+        with self.lock:
+            start, offset = self._locate(position)
+            return self._reader(start).read_payload(offset)
+
+    def read(self, position: int, with_data: bool = True) -> Dict:
+        # Decoded under the lock so the segment can't be closed while it is read
+        with self.lock:
+            start, offset = self._locate(position)
+            return self._reader(start).read(offset, with_data)
+
+    def iter_blocks(self, start: int = 0) -> Iterator[Dict]:
+        """Replay block records in order from position start"""
+        for position in range(start, len(self)):
+            yield self.read(position)
+
+    def iter_headers(self, start: int = 0) -> Iterator[Dict]:
+        for position in range(start, len(self)):
+            yield self.read(position, with_data=False)
+
+    def sync_chain(self, block_hashes: List[str], start: int = 0) -> int:
+        """Roll back records that diverge from the given chain (block_hashes[0] is position start);
+        returns how many records still match"""
+        with self.lock:
+            keep = min(len(self), start + len(block_hashes))
+            floor = max(self.starts[0], start)
+            while keep > floor and self.hash_at(keep - 1) != hash_key(block_hashes[keep - 1 - start]):
+                keep -= 1
+            self.truncate(keep)
+            return keep
+
+    def reset(self, start: int):
+        """Delete every segment and continue as an empty log beginning at position start"""
+        with self.lock:
+            self.open()
+            for reader in self.readers.values():
+                reader.close()
+            self.readers.clear()
+            self.active.close()
+            for segment in self.starts:
+                if segment in self.archived:
+                    paths = [self._archive_base(segment) + ext for ext in ARCHIVE_EXTENSIONS]
+                else:
+                    paths = [self._segment_base(segment) + ext for ext in ('.blocks', '.idx')]
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.starts, self.archived = [start], set()
+            self.active = self._open_log(start, self.durability)
+
+    def sealed_segments(self, upto: int) -> List[int]:
+        """Starts of sealed segments whose every block is below position upto"""
+        self.open()
+        return [start for start, following in zip(self.starts, self.starts[1:]) if following <= upto]
+
+    def archive_segments(self, upto: int) -> int:
+        """Compress sealed segments entirely below upto into the archive directory"""
+        archived = 0
+        with self.lock:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for start in self.sealed_segments(upto):
+                if start in self.archived:
+                    continue
+                self._drop_reader(start)
+                source = self._segment_base(start)
+                write_archive(source, self._archive_base(start))
+                os.remove(source + '.blocks')
+                os.remove(source + '.idx')
+                self.archived.add(start)
+                archived += 1
+        if archived:
+            print(f"🗄️ Archived {archived} segment(s) of {self.name} to {self.archive_dir}")
+        return archived
+
+    def prune_segments(self, upto: int) -> int:
+        """Delete sealed segments entirely below upto; the caller must hold a verified snapshot covering them"""
+        with self.lock:
+            doomed = self.sealed_segments(upto)
+            for start in doomed:
+                self._drop_reader(start)
+                base = self._archive_base(start) if start in self.archived else self._segment_base(start)
+                for ext in ARCHIVE_EXTENSIONS if start in self.archived else ('.blocks', '.idx'):
+                    if os.path.exists(base + ext):
+                        os.remove(base + ext)
+                self.archived.discard(start)
+            self.starts = self.starts[len(doomed):]
+        if doomed:
+            print(f"✂️ Pruned {len(doomed)} segment(s) of {self.name}; log now starts at #{self.starts[0]}")
+        return len(doomed)
+
+    def close(self):
+        with self.lock:
+            for reader in self.readers.values():
+                reader.close()
+            self.readers.clear()
+            if self.active is not None:
+                self.active.close()
+                self.active = None
+            self.starts, self.archived = [], set()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            self.open()
+            hot = [start for start in self.starts if start not in self.archived]
+            return {
+                'records': len(self),
+                'first_position': self.starts[0],
+                'data_bytes': sum(os.path.getsize(self._segment_base(start) + '.blocks') for start in hot),
+                'bytes_written': self.bytes_written,
+                'unsynced_records': len(self.active) - self.active.synced_records,
+                'segments': len(self.starts),
+                'archived_segments': len(self.archived),
+                'segment_size': self.segment_size,
+                'rotations': self.rotations,
+                **self.stats.to_dict()
+            }
+
+def restart_block_log(log: Union[BlockLog, SegmentedBlockLog], start: int, segment_size: int = None,
+                      archive_dir: str = None) -> SegmentedBlockLog:
+    """Empty a log and restart it at position start; a single-file log is replaced by segments
+    of segment_size (default SEGMENT_SIZE) archived to archive_dir"""
+    if not isinstance(log, SegmentedBlockLog):
+        base_path = log.data_path[:-len('.blocks')]
+        log.close()
+        for path in (log.data_path, log.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+        log = SegmentedBlockLog(base_path, log.durability, log.fsync_interval * 1000, codec=log.codec,
+                                segment_size=segment_size or SEGMENT_SIZE, archive_dir=archive_dir)
+    log.reset(start)
+    return log
+
+def first_position(log: Union[BlockLog, SegmentedBlockLog]) -> int:
+    """Lowest block position a log still holds (single-file logs always start at genesis)"""
+    return log.first_position if isinstance(log, SegmentedBlockLog) else 0
+
+def open_block_log(base_path: str, durability: str = DURABILITY_BUFFERED, codec: str = CODEC_JSON,
+                   segment_size: int = None, archive_dir: str = None):
+    """A single-file BlockLog, or a SegmentedBlockLog when segment_size is set or segments already exist"""
+    if segment_size is None and not os.path.isdir(base_path + '.segments'):
+        return BlockLog(base_path, durability, codec=codec)
+    return SegmentedBlockLog(base_path, durability, codec=codec, segment_size=segment_size or SEGMENT_SIZE,
+                             archive_dir=archive_dir)
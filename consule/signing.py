@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+BLOCK AND VALIDATION SIGNATURES
+Ed25519 signatures by PoA block creators and validators, with a verified-signature cache
+
+An authority's public key is stored as "ed25519:<hex>" in its Authority
+record; the private key stays in the node's keyring file next to its block
+log and never enters chain state or snapshots. Creators sign "block:<hash>"
+and validators sign "validation:<hash>", so one signature can't stand in
+for the other. Over the network, authorities also sign "reject:<hash>" when
+they refuse a proposal and "hello:<challenge>" to prove who they are to a
+peer.
+
+Public-key checks are the expensive part of loading or receiving blocks, so
+every signature that verified is remembered in an LRU keyed by an HMAC of
+(public key, message, signature) under a per-node secret. The cache is saved
+with the chain, so a restart only checks signatures it hasn't seen before;
+an entry can't be forged without the keyring, and a changed block, key or
+signature simply misses it. Batches are deduplicated against the cache and
+the remainder spread over a process pool when large enough.
+
+Signing needs the cryptography library (see requirements.txt): keys and
+signatures are never made without a constant-time implementation. When it
+isn't installed, signatures can still be checked by a slow pure-Python
+Ed25519 (RFC 8032) verifier, which only ever handles public values.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from block_verifier import VerifierPool
+
+# Signing requires cryptography; without it only verification is available
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+    from cryptography.exceptions import InvalidSignature
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+KEY_PREFIX = "ed25519:"
+VERIFIED_CACHE_SIZE = 100000  # (hash, authority) signatures remembered as verified
+PARALLEL_THRESHOLD = 256      # Below this many uncached signatures, verify inline
+CACHE_ENTRY_SIZE = 32
+
+class SigningUnavailableError(RuntimeError):
+    """Keys and signatures need the cryptography library"""
+
+# --- pure-Python Ed25519 (RFC 8032), verification only -------------------------
+
+_P = 2 ** 255 - 19
+_L = 2 ** 252 + 27742317777372353535851937790883648493
+_D = -121665 * pow(121666, _P - 2, _P) % _P
+_SQRT_M1 = pow(2, (_P - 1) // 4, _P)
+_IDENTITY = (0, 1, 1, 0)
+
+def _point_add(a, b):
+    """Sum of two points in extended coordinates"""
+    A = (a[1] - a[0]) * (b[1] - b[0]) % _P
+    B = (a[1] + a[0]) * (b[1] + b[0]) % _P
+    C = 2 * a[3] * b[3] * _D % _P
+    D = 2 * a[2] * b[2] % _P
+    E, F, G, H = B - A, D - C, D + C, B + A
+    return (E * F % _P, G * H % _P, F * G % _P, E * H % _P)
+
+def _point_mul(scalar: int, point):
+    result = _IDENTITY
+    while scalar > 0:
+        if scalar & 1:
+            result = _point_add(result, point)
+        point = _point_add(point, point)
+        scalar >>= 1
+    return result
+
+def _point_equal(a, b) -> bool:
+    return (a[0] * b[2] - b[0] * a[2]) % _P == 0 and (a[1] * b[2] - b[1] * a[2]) % _P == 0
+
+def _recover_x(y: int, sign: int) -> Optional[int]:
+    if y >= _P:
+        return None
+    x2 = (y * y - 1) * pow(_D * y * y + 1, _P - 2, _P)
+    if x2 == 0:
+        return None if sign else 0
+    x = pow(x2, (_P + 3) // 8, _P)
+    if (x * x - x2) % _P:
+        x = x * _SQRT_M1 % _P
+    if (x * x - x2) % _P:
+        return None
+    if (x & 1) != sign:
+        x = _P - x
+    return x
+
+def _compress(point) -> bytes:
+    z_inv = pow(point[2], _P - 2, _P)
+    x, y = point[0] * z_inv % _P, point[1] * z_inv % _P
+    return (y | ((x & 1) << 255)).to_bytes(32, 'little')
+
+def _decompress(encoded: bytes):
+    if len(encoded) != 32:
+        return None
+    y = int.from_bytes(encoded, 'little')
+    sign, y = y >> 255, y & ((1 << 255) - 1)
+    x = _recover_x(y, sign)
+    if x is None:
+        return None
+    return (x, y, 1, x * y % _P)
+
+_BASE_Y = 4 * pow(5, _P - 2, _P) % _P
+_BASE_X = _recover_x(_BASE_Y, 0)
+_BASE = (_BASE_X, _BASE_Y, 1, _BASE_X * _BASE_Y % _P)
+_BASE_POWERS = [_BASE]  # 2^i * base: multiples of the base point need additions only
+for _ in range(255):
+    _BASE_POWERS.append(_point_add(_BASE_POWERS[-1], _BASE_POWERS[-1]))
+
+def _base_mul(scalar: int):
+    result = _IDENTITY
+    for power in _BASE_POWERS:
+        if scalar & 1:
+            result = _point_add(result, power)
+        scalar >>= 1
+        if not scalar:
+            break
+    return result
+
+def _sha512_int(*parts: bytes) -> int:
+    return int.from_bytes(hashlib.sha512(b''.join(parts)).digest(), 'little')
+
+def _py_verify(public: bytes, message: bytes, signature: bytes) -> bool:
+    if len(signature) != 64:
+        return False
+    A = _decompress(public)
+    R = _decompress(signature[:32])
+    s = int.from_bytes(signature[32:], 'little')
+    if A is None or R is None or s >= _L:
+        return False
+    h = _sha512_int(signature[:32], public, message) % _L
+    return _point_equal(_base_mul(s), _point_add(R, _point_mul(h, A)))
+
+# --- keys and signatures ------------------------------------------------------
+
+def _private_key(private_key: str) -> "Ed25519PrivateKey":
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise SigningUnavailableError("Signing requires the cryptography library "
+                                      "(pip install -r requirements.txt)")
+    return Ed25519PrivateKey.from_private_bytes(bytes.fromhex(private_key))
+
+def generate_keypair() -> Tuple[str, str]:
+    """New (private key hex, public key) pair for an authority"""
+    seed = secrets.token_bytes(32)
+    return seed.hex(), public_key_for(seed.hex())
+
+def public_key_for(private_key: str) -> str:
+    key = _private_key(private_key)
+    from cryptography.hazmat.primitives import serialization
+    raw = key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return KEY_PREFIX + raw.hex()
+
+def is_signing_key(public_key) -> bool:
+    """Whether an authority's public key is one signatures can be checked against"""
+    return _raw_public_key(public_key) is not None
+
+def _raw_public_key(public_key) -> Optional[bytes]:
+    if not isinstance(public_key, str) or not public_key.startswith(KEY_PREFIX):
+        return None
+    try:
+        raw = bytes.fromhex(public_key[len(KEY_PREFIX):])
+    except ValueError:
+        return None
+    return raw if len(raw) == 32 else None
+
+def block_message(block_hash: str) -> bytes:
+    return f"block:{block_hash}".encode()
+
+def validation_message(block_hash: str) -> bytes:
+    return f"validation:{block_hash}".encode()
+
+def reject_message(block_hash: str) -> bytes:
+    return f"reject:{block_hash}".encode()
+
+def hello_message(challenge: str) -> bytes:
+    return f"hello:{challenge}".encode()
+
+def sign(private_key: str, message: bytes) -> str:
+    """Sign message (raises SigningUnavailableError without the cryptography library)"""
+    return _private_key(private_key).sign(message).hex()
+
+def verify(public_key: str, message: bytes, signature) -> bool:
+    """Whether signature is public_key's signature of message (never raises)"""
+    raw = _raw_public_key(public_key)
+    if raw is None or not isinstance(signature, str):
+        return False
+    try:
+        signature_bytes = bytes.fromhex(signature)
+    except ValueError:
+        return False
+    if CRYPTOGRAPHY_AVAILABLE:
+        try:
+            Ed25519PublicKey.from_public_bytes(raw).verify(signature_bytes, message)
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+    return _py_verify(raw, message, signature_bytes)
+
+def _verify_chunk(items: List[Tuple[str, bytes, str]]) -> List[bool]:
+    return [verify(public_key, message, signature) for public_key, message, signature in items]
+
+# --- keyring and verified-signature cache -------------------------------------
+
+class Keyring:
+    """A node's private authority keys (by public key) and cache secret, in a file only this node reads"""
+    def __init__(self, path: str = None):
+        self.path = path
+        self.keys: Dict[str, str] = {}  # public key -> private key
+        self.secret = b''
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.keys = data.get('keys', {})
+                self.secret = bytes.fromhex(data.get('cache_secret', ''))
+            except (OSError, ValueError) as e:
+                print(f"❌ Error loading keyring {path}: {e}")
+        if not self.secret:
+            self.secret = secrets.token_bytes(32)
+            self.save()
+
+    def get(self, public_key: str) -> Optional[str]:
+        """Private key for public_key, if this node holds it"""
+        return self.keys.get(public_key)
+
+    def add(self, private_key: str) -> str:
+        """Keep a private key; returns its public key"""
+        public_key = public_key_for(private_key)
+        self.keys[public_key] = private_key
+        self.save()
+        return public_key
+
+    def save(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'keys': self.keys, 'cache_secret': self.secret.hex()}, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"❌ Error saving keyring {self.path}: {e}")
+
+class SignatureVerifier:
+    """Checks signatures, remembering verified ones in an LRU that can be saved and reloaded"""
+    def __init__(self, secret: bytes, cache_size: int = VERIFIED_CACHE_SIZE, path: str = None):
+        self.secret = secret
+        self.cache_size = cache_size
+        self.path = path
+        self.lock = threading.Lock()
+        self.verified: OrderedDict = OrderedDict()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.verify_seconds = 0.0
+        if path:
+            self.load()
+
+    def _entry(self, public_key: str, message: bytes, signature: str) -> bytes:
+        return hmac.new(self.secret, f"{public_key}|{signature}|".encode() + message, hashlib.sha256).digest()
+
+    def _remember(self, entry: bytes):
+        self.verified[entry] = True
+        while len(self.verified) > self.cache_size:
+            self.verified.popitem(last=False)
+        self.dirty = True
+
+    def verify(self, public_key: str, message: bytes, signature) -> bool:
+        return self.verify_batch([(public_key, message, signature)])[0]
+
+    def remember(self, public_key: str, message: bytes, signature: str):
+        """Record a signature this node made itself, so it is never checked again"""
+        with self.lock:
+            self._remember(self._entry(public_key, message, signature))
+
+    def verify_batch(self, items: List[Tuple[str, bytes, str]], workers: int = None,
+                     pool: VerifierPool = None) -> List[bool]:
+        """Results for (public key, message, signature) items; only uncached ones are checked"""
+        results: List[Optional[bool]] = [None] * len(items)
+        uncached: Dict[bytes, List[int]] = {}
+        with self.lock:
+            for position, (public_key, message, signature) in enumerate(items):
+                if not isinstance(signature, str) or not is_signing_key(public_key):
+                    results[position] = False
+                    continue
+                entry = self._entry(public_key, message, signature)
+                if entry in self.verified:
+                    self.verified.move_to_end(entry)
+                    self.hits += 1
+                    results[position] = True
+                else:
+                    uncached.setdefault(entry, []).append(position)
+        if not uncached:
+            return results
+
+        started = time.perf_counter()
+        entries = list(uncached)
+        pending = [items[uncached[entry][0]] for entry in entries]
+        workers = pool.workers if pool else workers or os.cpu_count() or 1
+        if len(pending) < PARALLEL_THRESHOLD or workers == 1:
+            outcomes = _verify_chunk(pending)
+        else:
+            chunk = -(-len(pending) // workers)
+            owned = pool is None
+            pool = pool or VerifierPool(workers)
+            try:
+                outcomes = [ok for part in pool.executor().map(
+                                _verify_chunk, [pending[i:i + chunk] for i in range(0, len(pending), chunk)])
+                            for ok in part]
+            finally:
+                if owned:
+                    pool.close()
+        with self.lock:
+            self.verify_seconds += time.perf_counter() - started
+            for entry, ok in zip(entries, outcomes):
+                self.misses += 1
+                if ok:
+                    self._remember(entry)
+                else:
+                    self.failures += 1
+                for position in uncached[entry]:
+                    results[position] = ok
+        return results
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"❌ Error loading signature cache {self.path}: {e}")
+            return
+        with self.lock:
+            for start in range(0, len(data) - CACHE_ENTRY_SIZE + 1, CACHE_ENTRY_SIZE):
+                self.verified[data[start:start + CACHE_ENTRY_SIZE]] = True
+            while len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+
+    def save(self):
+        """Write the cache if it changed since the last save (oldest entries first)"""
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            data = b''.join(self.verified)
+            self.dirty = False
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"❌ Error saving signature cache {self.path}: {e}")
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'backend': 'cryptography' if CRYPTOGRAPHY_AVAILABLE else 'pure-python',
+                'cached': len(self.verified),
+                'hits': self.hits,
+                'misses': self.misses,
+                'failures': self.failures,
+                'verify_seconds': round(self.verify_seconds, 4)
+            }
@@ -11,9 +11,46 @@ import time
 import hashlib
 import sys
 import os
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import argparse
+from p2p_protocol import FrameReader, FrameError, encode_message
+from peer_manager import PeerManager
+from block_verifier import verify_blocks, VerifierPool, DEFAULT_CHUNK_SIZE
+from block_codec import CODEC_JSON, CODEC_BINARY, CODECS
+from block_store import (WriteBehindSaver, log_base_for, iter_json_members, batched,
+                         DURABILITY_BUFFERED, DURABILITY_POLICIES)
+from segment_store import SegmentedBlockLog, open_block_log, restart_block_log, first_position
+from snapshot import Snapshot, SnapshotStore, SnapshotError, ChainView, chain_base
+
+# Fixed genesis timestamp so independently started nodes share block #0
+GENESIS_TIMESTAMP = "2025-01-01T00:00:00"
+
+# Headers-first sync batch limits: the blocks of one headers message form a window verified together
+MAX_HEADERS_PER_MESSAGE = 10000
+MAX_BLOCKS_PER_MESSAGE = 500
+
+# Inventory gossip limits
+SEEN_CACHE_SIZE = 10000
+MAX_INV_PER_MESSAGE = 500
+
+# Outbound send queue limits and overflow policies
+SEND_QUEUE_SIZE = 1000
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_DISCONNECT)
+
+# Keepalive: ping every PING_INTERVAL seconds, evict after MAX_MISSED_PINGS unanswered
+PING_INTERVAL = 30.0
+MAX_MISSED_PINGS = 3
+CONNECT_TIMEOUT = 10.0
+
+# Orphan pool limits for blocks that arrive before their parent
+MAX_ORPHANS = 1000
+MAX_ORPHAN_BYTES = 8 * 1024 * 1024
+ORPHAN_EXPIRY = 600.0
 
 class SimpleBlock:
     """Basic blockchain block"""
@@ -26,9 +63,18 @@ class SimpleBlock:
     
     def calculate_hash(self) -> str:
         """Calculate block hash"""
-        content = f"{self.index}{self.timestamp}{self.data}{self.previous_hash}"
+        return self.compute_hash(self.index, self.timestamp, self.data, self.previous_hash)
+    
+    @staticmethod
+    def compute_hash(index: int, timestamp: str, data: str, previous_hash: str) -> str:
+        content = f"{index}{timestamp}{data}{previous_hash}"
         return hashlib.sha256(content.encode()).hexdigest()
     
+    @staticmethod
+    def hash_from_dict(data: Dict) -> str:
+        """Recompute the hash of a serialized block"""
+        return SimpleBlock.compute_hash(data['index'], data['timestamp'], data['data'], data['previous_hash'])
+    
     def to_dict(self) -> Dict:
         return {
             'index': self.index,
@@ -37,28 +83,244 @@ class SimpleBlock:
             'previous_hash': self.previous_hash,
             'hash': self.hash
         }
+    
+    def to_header(self) -> Dict:
+        """Minimal header used by headers-first sync"""
+        return {
+            'index': self.index,
+            'previous_hash': self.previous_hash,
+            'hash': self.hash
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SimpleBlock':
+        # Bypass __init__: the stored hash is authoritative, recomputing it is wasted work
+        block = cls.__new__(cls)
+        block.index = data['index']
+        block.timestamp = data['timestamp']
+        block.data = data['data']
+        block.previous_hash = data['previous_hash']
+        block.hash = data['hash']
+        return block
+
+class PeerSender:
+    """Bounded outbound frame queue for one peer, drained by its own writer thread"""
+    def __init__(self, peer_id: str, sock: socket.socket, max_queue: int = SEND_QUEUE_SIZE,
+                 overflow_policy: str = OVERFLOW_DISCONNECT, on_error=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.peer_id = peer_id
+        self.sock = sock
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.on_error = on_error
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.sent = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def enqueue(self, frame: bytes) -> bool:
+        """Queue a frame; returns False if the peer should be disconnected"""
+        with self.condition:
+            if self.closed:
+                return False
+            if len(self.queue) >= self.max_queue:
+                if self.overflow_policy == OVERFLOW_DISCONNECT:
+                    return False
+                self.dropped += 1
+                if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                    return True
+                self.queue.popleft()
+            self.queue.append(frame)
+            self.condition.notify()
+            return True
+    
+    def depth(self) -> int:
+        return len(self.queue)
+    
+    def close(self):
+        """Stop the writer thread and discard anything still queued"""
+        with self.condition:
+            self.closed = True
+            self.queue.clear()
+            self.condition.notify()
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                frame = self.queue.popleft()
+            try:
+                self.sock.sendall(frame)
+                self.sent += 1
+            except Exception as e:
+                if not self.closed:
+                    print(f"❌ Failed to send to {self.peer_id}: {e}")
+                    if self.on_error:
+                        self.on_error(self.peer_id)
+                return
+
+class OrphanPool:
+    """Bounded pool of blocks whose parent we have not seen yet, keyed by previous_hash"""
+    def __init__(self, max_orphans: int = MAX_ORPHANS, max_bytes: int = MAX_ORPHAN_BYTES,
+                 expiry: float = ORPHAN_EXPIRY):
+        self.max_orphans = max_orphans
+        self.max_bytes = max_bytes
+        self.expiry = expiry
+        self.by_parent: Dict[str, Dict[str, Dict]] = {}
+        self.entries: OrderedDict = OrderedDict()  # hash -> (previous_hash, received_at, size), oldest first
+        self.total_bytes = 0
+        self.connected = 0
+        self.evicted = 0
+    
+    def __contains__(self, block_hash: str) -> bool:
+        return block_hash in self.entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def add(self, block_dict: Dict) -> bool:
+        """Hold a block until its parent arrives; returns False if it cannot be held"""
+        block_hash = block_dict['hash']
+        if block_hash in self.entries:
+            return False
+        size = len(json.dumps(block_dict))
+        if size > self.max_bytes:
+            self.evicted += 1
+            return False
+        
+        self.expire()
+        while self.entries and (len(self.entries) >= self.max_orphans or self.total_bytes + size > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.evicted += 1
+        
+        previous_hash = block_dict['previous_hash']
+        self.by_parent.setdefault(previous_hash, {})[block_hash] = block_dict
+        self.entries[block_hash] = (previous_hash, time.time(), size)
+        self.total_bytes += size
+        return True
+    
+    def pop_children(self, parent_hash: str) -> List[Dict]:
+        """Remove and return every held block whose parent is parent_hash"""
+        children = list(self.by_parent.get(parent_hash, {}).values())
+        for block_dict in children:
+            self._remove(block_dict['hash'])
+        return children
+    
+    def expire(self, now: float = None):
+        """Evict orphans older than the expiry window"""
+        cutoff = (now or time.time()) - self.expiry
+        while self.entries:
+            block_hash, (_, received_at, _) = next(iter(self.entries.items()))
+            if received_at >= cutoff:
+                break
+            self._remove(block_hash)
+            self.evicted += 1
+    
+    def _remove(self, block_hash: str):
+        previous_hash, _, size = self.entries.pop(block_hash)
+        self.total_bytes -= size
+        siblings = self.by_parent.get(previous_hash)
+        if siblings is not None:
+            siblings.pop(block_hash, None)
+            if not siblings:
+                del self.by_parent[previous_hash]
+    
+    def get_stats(self) -> Dict:
+        return {
+            'held': len(self.entries),
+            'bytes': self.total_bytes,
+            'connected': self.connected,
+            'evicted': self.evicted
+        }
 
 class SimpleP2PNode:
     """Simple P2P networking node"""
-    def __init__(self, host: str = "localhost", port: int = 8333, node_id: str = None, blockchain_file: str = None):
+    def __init__(self, host: str = "localhost", port: int = 8333, node_id: str = None, blockchain_file: str = None,
+                 send_queue_size: int = SEND_QUEUE_SIZE, overflow_policy: str = OVERFLOW_DISCONNECT,
+                 ping_interval: float = PING_INTERVAL, max_missed_pings: int = MAX_MISSED_PINGS,
+                 durability: str = DURABILITY_BUFFERED, write_behind: bool = True,
+                 block_codec: str = CODEC_JSON, segment_size: int = None, archive_dir: str = None,
+                 snapshot_interval: int = None, fast_bootstrap: bool = False):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        if block_codec not in CODECS:
+            raise ValueError(f"Unknown block codec: {block_codec}")
         self.host = host
         self.port = port
         self.node_id = node_id or f"node-{port}"
         self.blockchain_file = blockchain_file or f"blockchain_{port}.json"
+        self.block_codec = block_codec
+        self.block_log = open_block_log(log_base_for(self.blockchain_file), durability, block_codec,
+                                        segment_size, archive_dir)
+        self.segment_size = segment_size
+        self.archive_dir = archive_dir
+        # Saves are handed to a background thread so block acceptance never waits on disk
+        self.saver = WriteBehindSaver(self.write_blockchain, f"{self.node_id}-saver") if write_behind else None
+        # (base, blocks) copied when a save is requested; the saver never reads the live chain
+        self.save_target: Optional[tuple] = None
+        # Snapshots every snapshot_interval blocks; fast_bootstrap lets a node behind a peer's
+        # snapshot start from it instead of downloading the history below it
+        self.snapshots = SnapshotStore(log_base_for(self.blockchain_file))
+        self.snapshot_interval = snapshot_interval
+        self.fast_bootstrap = fast_bootstrap
+        self.latest_snapshot: Optional[Snapshot] = None
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = overflow_policy
+        self.ping_interval = ping_interval
+        self.max_missed_pings = max_missed_pings
         self.peers: List[str] = []
         self.blockchain: List[SimpleBlock] = []
+        self.block_index: Dict[str, int] = {}  # block hash -> height on our chain
         self.running = False
         
+        # Headers-first sync state
+        self.peer_heights: Dict[str, int] = {}
+        self.pending_headers: Dict[str, List[Dict]] = {}
+        # Blocks of the pending header window received so far: peer -> {'blocks': {hash: block}, ...}
+        self.sync_windows: Dict[str, Dict] = {}
+        # Competing branches being downloaded: peer -> {'ancestor': height, 'blocks': [...]}
+        self.sync_forks: Dict[str, Dict] = {}
+        
+        # Inventory gossip state: LRU of block hashes we have seen or requested
+        self.seen_blocks: OrderedDict = OrderedDict()
+        self.requested_blocks: Dict[str, str] = {}
+        self.orphans = OrphanPool()
+        
+        # Wire codec agreed with each peer in hello (JSON unless both sides offer binary)
+        self.peer_codecs: Dict[str, str] = {}
+        
+        # Keepalive state per peer: outstanding ping nonce, send time, misses and last RTT
+        self.ping_state: Dict[str, Dict] = {}
+        self.ping_nonce = 0
+        
+        # Guards the chain, index and sync/gossip/ping state shared by the peer handler,
+        # keepalive and interactive threads (the asyncio engine only touches them on its loop)
+        self.chain_lock = threading.RLock()
+        
         # Load existing blockchain or create genesis block
         self.load_blockchain()
         if not self.blockchain:
             genesis = SimpleBlock(0, "Genesis Block")
-            self.blockchain.append(genesis)
+            genesis.timestamp = GENESIS_TIMESTAMP
+            genesis.hash = genesis.calculate_hash()
+            self.append_block(genesis)
             self.save_blockchain()
         
         # Socket for listening
         self.server_socket = None
         self.peer_sockets: Dict[str, socket.socket] = {}
+        self.peer_senders: Dict[str, PeerSender] = {}
+        self.messages_dropped = 0
+        
+        # Optional PeerManager that redials dropped peers (attaches itself)
+        self.peer_manager = None
         
         print(f"🚀 Initializing node {self.node_id} on {host}:{port}")
     
@@ -88,24 +350,33 @@ class SimpleP2PNode:
     def handle_peer(self, client_socket: socket.socket, addr):
         """Handle incoming peer connection"""
         peer_id = f"{addr[0]}:{addr[1]}"
+        # Register inbound connections so replies (e.g. to hello) can be sent
+        if peer_id not in self.peer_sockets:
+            self.register_peer_socket(peer_id, client_socket)
+        reader = FrameReader()
         try:
             while self.running:
-                data = client_socket.recv(1024).decode()
-                if not data:
+                messages = reader.read_from(client_socket)
+                if messages is None:
                     break
                 
-                try:
-                    message = json.loads(data)
-                    self.process_message(message, peer_id)
-                except json.JSONDecodeError:
-                    print(f"⚠️ Invalid JSON from {peer_id}")
+                for message in messages:
+                    # One handler thread at a time mutates the chain and sync state
+                    with self.chain_lock:
+                        self.process_message(message, peer_id)
                 
+        except FrameError as e:
+            print(f"⚠️ Invalid frame from {peer_id}: {e}")
         except Exception as e:
             print(f"❌ Error handling peer {peer_id}: {e}")
         finally:
             client_socket.close()
-            if peer_id in self.peer_sockets:
+            if self.peer_sockets.get(peer_id) is client_socket:
                 del self.peer_sockets[peer_id]
+                self.close_peer_sender(peer_id)
+                if peer_id in self.peers:
+                    self.peers.remove(peer_id)
+            self.clear_peer_state(peer_id)
     
     def connect_to_peer(self, host: str, port: int) -> bool:
         """Connect to a peer node"""
@@ -116,19 +387,16 @@ class SimpleP2PNode:
         
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(10.0)
+            sock.settimeout(CONNECT_TIMEOUT)
             sock.connect((host, port))
+            # Idle connections are policed by keepalive pings, not recv timeouts
+            sock.settimeout(None)
             
-            self.peer_sockets[peer_id] = sock
-            self.peers.append(peer_id)
+            self.register_peer_socket(peer_id, sock)
+            if peer_id not in self.peers:
+                self.peers.append(peer_id)
             
-            # Send hello message
-            hello_msg = {
-                'type': 'hello',
-                'node_id': self.node_id,
-                'blockchain_length': len(self.blockchain)
-            }
-            self.send_to_peer(peer_id, hello_msg)
+            self.on_outbound_connected(peer_id)
             
             print(f"✅ {self.node_id} connected to {peer_id}")
             
@@ -141,20 +409,67 @@ class SimpleP2PNode:
             print(f"❌ {self.node_id} failed to connect to {peer_id}: {e}")
             return False
     
+    def on_outbound_connected(self, peer_id: str):
+        """Greet a freshly dialed peer and ask it for addresses if we manage peers"""
+        self.send_to_peer(peer_id, self.build_hello())
+        if self.peer_manager:
+            self.send_to_peer(peer_id, {'type': 'getaddr'})
+    
+    def is_connected(self, peer_id: str) -> bool:
+        return peer_id in self.peer_senders
+    
+    def register_peer_socket(self, peer_id: str, sock: socket.socket):
+        """Track a peer socket and give it its own outbound queue and writer"""
+        self.peer_sockets[peer_id] = sock
+        self.peer_senders[peer_id] = PeerSender(
+            peer_id, sock, self.send_queue_size, self.overflow_policy, on_error=self.disconnect_peer
+        )
+    
+    def close_peer_sender(self, peer_id: str):
+        sender = self.peer_senders.pop(peer_id, None)
+        if sender is not None:
+            self.messages_dropped += sender.dropped
+            sender.close()
+    
     def send_to_peer(self, peer_id: str, message: Dict):
-        """Send message to a specific peer"""
-        if peer_id in self.peer_sockets:
-            try:
-                data = json.dumps(message).encode()
-                self.peer_sockets[peer_id].send(data)
-            except Exception as e:
-                print(f"❌ Failed to send to {peer_id}: {e}")
-                self.disconnect_peer(peer_id)
+        """Queue message for a specific peer; never blocks on the network"""
+        sender = self.peer_senders.get(peer_id)
+        if sender is None:
+            return
+        try:
+            frame = encode_message(message, codec=self.peer_codecs.get(peer_id, CODEC_JSON))
+        except Exception as e:
+            print(f"❌ Failed to encode message for {peer_id}: {e}")
+            return
+        self.enqueue_frame(peer_id, sender, frame)
+    
+    def enqueue_frame(self, peer_id: str, sender: PeerSender, frame: bytes):
+        if not sender.enqueue(frame):
+            print(f"⚠️ Send queue for {peer_id} overflowed, disconnecting")
+            self.disconnect_peer(peer_id)
     
-    def broadcast_to_peers(self, message: Dict):
+    def broadcast_to_peers(self, message: Dict, exclude: Optional[str] = None):
         """Broadcast message to all connected peers"""
-        for peer_id in list(self.peer_sockets.keys()):
-            self.send_to_peer(peer_id, message)
+        frames: Dict[str, bytes] = {}  # encoded once per codec in use
+        for peer_id, sender in list(self.peer_senders.items()):
+            if peer_id != exclude:
+                codec = self.peer_codecs.get(peer_id, CODEC_JSON)
+                if codec not in frames:
+                    frames[codec] = encode_message(message, codec=codec)
+                self.enqueue_frame(peer_id, sender, frames[codec])
+    
+    def build_hello(self, reply: bool = False) -> Dict:
+        """Hello message advertising our tip height and hash"""
+        return {
+            'type': 'hello',
+            'node_id': self.node_id,
+            'blockchain_length': len(self.blockchain),
+            'tip_hash': self.blockchain[-1].hash,
+            'listen_addr': f"{self.host}:{self.port}",
+            'codecs': [CODEC_JSON, CODEC_BINARY] if self.block_codec == CODEC_BINARY else [CODEC_JSON],
+            'snapshot_height': self.latest_snapshot.height if self.latest_snapshot else 0,
+            'reply': reply
+        }
     
     def process_message(self, message: Dict, peer_id: str):
         """Process incoming message from peer"""
@@ -162,17 +477,416 @@ class SimpleP2PNode:
         
         if msg_type == 'hello':
             print(f"👋 Received hello from {message.get('node_id', peer_id)}")
-            # Send our blockchain if theirs is shorter
-            if message.get('blockchain_length', 0) < len(self.blockchain):
-                self.send_blockchain(peer_id)
+            peer_height = message.get('blockchain_length', 0)
+            self.peer_heights[peer_id] = peer_height
+            if self.block_codec == CODEC_BINARY and CODEC_BINARY in message.get('codecs', []):
+                self.peer_codecs[peer_id] = CODEC_BINARY
+            if self.peer_manager:
+                self.peer_manager.learn_peer(message.get('listen_addr'))
+            if self.fast_bootstrap and message.get('snapshot_height', 0) > len(self.blockchain):
+                # Far enough behind that their snapshot covers everything we have
+                self.send_to_peer(peer_id, {'type': 'getsnapshot'})
+            elif peer_height > len(self.blockchain):
+                # They are ahead: pull the missing suffix
+                self.request_headers(peer_id)
+            if not message.get('reply'):
+                # Answer with our tip (so they pull from us if we are ahead) and codecs
+                self.send_to_peer(peer_id, self.build_hello(reply=True))
+        
+        elif msg_type == 'ping':
+            self.send_to_peer(peer_id, {'type': 'pong', 'nonce': message.get('nonce')})
+        
+        elif msg_type == 'pong':
+            self.process_pong(peer_id, message.get('nonce'))
+        
+        elif msg_type == 'getaddr':
+            addresses = self.peer_manager.get_known_addresses() if self.peer_manager else []
+            self.send_to_peer(peer_id, {'type': 'addr', 'addresses': addresses})
+        
+        elif msg_type == 'addr':
+            if self.peer_manager:
+                for address in message.get('addresses', [])[:100]:
+                    self.peer_manager.learn_peer(address)
+        
+        elif msg_type == 'getsnapshot':
+            self.send_snapshot(peer_id)
+        
+        elif msg_type == 'snapshot':
+            self.process_snapshot(peer_id, message.get('snapshot'))
+        
+        elif msg_type == 'getheaders':
+            self.send_headers(peer_id, message.get('locator', []))
+        
+        elif msg_type == 'headers':
+            if 'blockchain_length' in message:
+                self.peer_heights[peer_id] = message['blockchain_length']
+            self.process_headers(peer_id, message.get('headers', []))
+        
+        elif msg_type == 'getblocks':
+            self.send_blocks(peer_id, message.get('blocks', []))
+        
+        elif msg_type == 'blocks':
+            self.process_blocks(peer_id, message.get('blocks', []))
         
         elif msg_type == 'blockchain':
             print(f"⛓️ Received blockchain from {peer_id}")
             self.update_blockchain(message.get('blocks', []))
         
+        elif msg_type == 'inv':
+            self.process_inv(peer_id, message.get('hashes', []))
+        
+        elif msg_type == 'getdata':
+            self.send_block_data(peer_id, message.get('hashes', []))
+        
         elif msg_type == 'new_block':
             print(f"🆕 Received new block from {peer_id}")
-            self.add_block_from_peer(message.get('block'))
+            self.receive_block(peer_id, message.get('block'))
+    
+    def mark_seen(self, block_hash: str) -> bool:
+        """Record a block hash in the seen cache; returns False if it was already there"""
+        if block_hash in self.seen_blocks:
+            self.seen_blocks.move_to_end(block_hash)
+            return False
+        self.seen_blocks[block_hash] = True
+        if len(self.seen_blocks) > SEEN_CACHE_SIZE:
+            self.seen_blocks.popitem(last=False)
+        return True
+    
+    def announce_block(self, block: SimpleBlock, exclude: Optional[str] = None):
+        """Announce a block by hash; peers fetch the body with getdata if they need it"""
+        self.broadcast_to_peers({'type': 'inv', 'hashes': [block.hash]}, exclude=exclude)
+    
+    def process_inv(self, peer_id: str, hashes: List[str]):
+        """Request the bodies of announced blocks we have not seen yet"""
+        wanted = []
+        for block_hash in hashes[:MAX_INV_PER_MESSAGE]:
+            if block_hash in self.seen_blocks or block_hash in self.requested_blocks:
+                continue
+            self.requested_blocks[block_hash] = peer_id
+            wanted.append(block_hash)
+        if wanted:
+            self.send_to_peer(peer_id, {'type': 'getdata', 'hashes': wanted})
+    
+    def get_block_by_hash(self, block_hash: str) -> Optional[SimpleBlock]:
+        """O(1) lookup of a block on our chain by hash"""
+        height = self.block_index.get(block_hash)
+        return self.blockchain[height] if height is not None else None
+    
+    def append_block(self, block: SimpleBlock):
+        """Append a block to the chain and index it"""
+        self.blockchain.append(block)
+        self.block_index[block.hash] = block.index
+    
+    def rebuild_block_index(self):
+        self.block_index = {block.hash: height for height, block in enumerate(self.blockchain, chain_base(self.blockchain))}
+    
+    def reorganize(self, ancestor_height: int, new_blocks: List[SimpleBlock]) -> List[SimpleBlock]:
+        """Roll back everything above ancestor_height and apply new_blocks; returns removed blocks"""
+        with self.chain_lock:
+            removed = self.blockchain[ancestor_height + 1:]
+            for block in removed:
+                self.block_index.pop(block.hash, None)
+            del self.blockchain[ancestor_height + 1:]
+            for block in new_blocks:
+                self.append_block(block)
+                self.mark_seen(block.hash)
+            
+            if removed:
+                print(f"🔀 Reorganized at #{ancestor_height}: rolled back {len(removed)}, applied {len(new_blocks)} blocks")
+            return removed
+    
+    def send_block_data(self, peer_id: str, hashes: List[str]):
+        """Answer getdata with the requested block bodies"""
+        for block_hash in hashes[:MAX_INV_PER_MESSAGE]:
+            block = self.get_block_by_hash(block_hash)
+            if block:
+                self.send_to_peer(peer_id, {'type': 'new_block', 'block': block.to_dict()})
+    
+    def receive_block(self, peer_id: str, block_dict: Dict):
+        """Handle a gossiped block body and relay its announcement onwards"""
+        with self.chain_lock:
+            if not block_dict:
+                return
+            
+            block_hash = block_dict.get('hash')
+            self.requested_blocks.pop(block_hash, None)
+            if not self.mark_seen(block_hash):
+                return
+            
+            if self.add_block_from_peer(block_dict):
+                self.announce_block(self.blockchain[-1], exclude=peer_id)
+                self.connect_orphans()
+            elif block_dict.get('index', 0) >= len(self.blockchain):
+                if block_dict['previous_hash'] not in self.block_index:
+                    # Parent not here yet: hold the block until it lands
+                    self.orphans.add(block_dict)
+                else:
+                    self.seen_blocks.pop(block_hash, None)
+                # We are missing intermediate blocks or the peer is on another branch;
+                # headers sync fills the gap and resolves forks
+                self.request_headers(peer_id)
+    
+    def connect_orphans(self):
+        """Attach held orphans that now extend our tip, repeatedly"""
+        with self.chain_lock:
+            while len(self.orphans):
+                children = self.orphans.pop_children(self.blockchain[-1].hash)
+                if not children:
+                    break
+                extended = False
+                for block_dict in children:
+                    if not extended and self.add_block_from_peer(block_dict):
+                        self.orphans.connected += 1
+                        self.announce_block(self.blockchain[-1])
+                        extended = True
+                    else:
+                        self.orphans.evicted += 1  # Losing sibling of the block we attached
+                if not extended:
+                    break
+    
+    def check_keepalive(self):
+        """Evict peers that missed too many pings, then ping everyone again"""
+        with self.chain_lock:
+            now = time.time()
+            for peer_id in list(self.peer_senders.keys()):
+                state = self.ping_state.setdefault(peer_id, {'nonce': None, 'sent_at': None, 'missed': 0, 'rtt': None})
+                if state['nonce'] is not None:
+                    state['missed'] += 1
+                    if state['missed'] >= self.max_missed_pings:
+                        print(f"💀 {peer_id} missed {state['missed']} pings, disconnecting")
+                        self.disconnect_peer(peer_id)
+                        continue
+                self.ping_nonce += 1
+                state['nonce'] = self.ping_nonce
+                state['sent_at'] = now
+                self.send_to_peer(peer_id, {'type': 'ping', 'nonce': self.ping_nonce})
+    
+    def process_pong(self, peer_id: str, nonce):
+        """Record round-trip time for an answered ping"""
+        state = self.ping_state.get(peer_id)
+        if not state or state['nonce'] is None or nonce != state['nonce']:
+            return
+        state['rtt'] = time.time() - state['sent_at']
+        state['nonce'] = None
+        state['missed'] = 0
+    
+    def get_peer_rtts(self) -> Dict[str, Optional[float]]:
+        """Last measured round-trip time per peer, in milliseconds"""
+        return {
+            peer_id: round(state['rtt'] * 1000, 2) if state['rtt'] is not None else None
+            for peer_id, state in list(self.ping_state.items())
+        }
+    
+    def keepalive_loop(self):
+        """Background thread driving check_keepalive"""
+        while self.running:
+            time.sleep(self.ping_interval)
+            if self.running:
+                self.check_keepalive()
+    
+    def build_locator(self) -> List[List]:
+        """Block locator: [index, hash] pairs from our tip back to genesis, exponentially spaced"""
+        locator = []
+        step = 1
+        base = chain_base(self.blockchain)
+        index = len(self.blockchain) - 1
+        while index > base:
+            locator.append([index, self.blockchain[index].hash])
+            if len(locator) >= 10:
+                step *= 2
+            index -= step
+        locator.append([base, self.blockchain[base].hash])
+        return locator
+    
+    def find_locator_fork(self, locator: List[List]) -> int:
+        """Highest block index from a peer's locator that is also on our chain"""
+        for _, block_hash in locator:
+            height = self.block_index.get(block_hash)
+            if height is not None:
+                return height
+        return -1
+    
+    def request_headers(self, peer_id: str):
+        """Ask a peer for the headers following our tip (or the branch we are fetching from it)"""
+        locator = self.build_locator()
+        fork = self.sync_forks.get(peer_id)
+        if fork and fork['blocks']:
+            branch_tip = fork['blocks'][-1]
+            locator.insert(0, [branch_tip.index, branch_tip.hash])
+        self.send_to_peer(peer_id, {
+            'type': 'getheaders',
+            'locator': locator
+        })
+    
+    def send_headers(self, peer_id: str, locator: List[List]):
+        """Answer getheaders with up to MAX_HEADERS_PER_MESSAGE headers after the fork point"""
+        fork_index = self.find_locator_fork(locator)
+        if fork_index < 0 and chain_base(self.blockchain) > 0:
+            # Their blocks are all below our snapshot: they can only start from it
+            print(f"⚠️ {peer_id} is behind our pruned history, offering snapshot")
+            self.send_snapshot(peer_id)
+            return
+        if fork_index < 0:
+            # Different genesis: fall back to a full chain transfer
+            print(f"⚠️ No common block with {peer_id}, sending full chain")
+            self.send_blockchain(peer_id)
+            return
+        
+        start = fork_index + 1
+        headers = [block.to_header() for block in self.blockchain[start:start + MAX_HEADERS_PER_MESSAGE]]
+        self.send_to_peer(peer_id, {
+            'type': 'headers',
+            'headers': headers,
+            'blockchain_length': len(self.blockchain)
+        })
+    
+    def process_headers(self, peer_id: str, headers: List[Dict]):
+        """Validate a batch of headers and start fetching their blocks"""
+        if not headers:
+            return
+        
+        for i in range(1, len(headers)):
+            if headers[i]['previous_hash'] != headers[i-1]['hash'] or headers[i]['index'] != headers[i-1]['index'] + 1:
+                print(f"❌ Received invalid headers from {peer_id}")
+                return
+        
+        first = headers[0]
+        fork = self.sync_forks.get(peer_id)
+        if fork and fork['blocks'] and first['previous_hash'] == fork['blocks'][-1].hash:
+            parent_height = fork['blocks'][-1].index  # Continuing a branch we are already fetching
+        else:
+            parent_height = self.block_index.get(first['previous_hash'])
+            if parent_height is None:
+                print(f"⚠️ Headers from {peer_id} do not connect to our chain, ignoring")
+                return
+            if parent_height != len(self.blockchain) - 1:
+                # Competing branch: download it beside our chain until it is longer
+                print(f"🍴 Fork from {peer_id} at block #{parent_height}")
+                self.sync_forks[peer_id] = {'ancestor': parent_height, 'blocks': []}
+            else:
+                self.sync_forks.pop(peer_id, None)
+        
+        if first['index'] != parent_height + 1:
+            print(f"❌ Received misnumbered headers from {peer_id}")
+            return
+        
+        print(f"📑 Received {len(headers)} headers from {peer_id}")
+        self.pending_headers[peer_id] = headers
+        self.sync_windows[peer_id] = {'blocks': {}}
+        self.request_next_blocks(peer_id)
+    
+    def request_next_blocks(self, peer_id: str):
+        """Request every block of the header window we don't have yet, in bounded batches sent at once"""
+        headers = self.pending_headers.get(peer_id)
+        window = self.sync_windows.get(peer_id)
+        if not headers or window is None:
+            self.pending_headers.pop(peer_id, None)
+            return
+        
+        missing = [header for header in headers if header['hash'] not in window['blocks']]
+        batches = [missing[i:i + MAX_BLOCKS_PER_MESSAGE] for i in range(0, len(missing), MAX_BLOCKS_PER_MESSAGE)]
+        window['outstanding'] = len(batches)
+        window['received_before'] = len(window['blocks'])
+        for batch in batches:
+            self.send_to_peer(peer_id, {
+                'type': 'getblocks',
+                'blocks': [[header['index'], header['hash']] for header in batch]
+            })
+    
+    def send_blocks(self, peer_id: str, requested: List[List]):
+        """Answer getblocks with the requested blocks we have"""
+        blocks = []
+        for _, block_hash in requested[:MAX_BLOCKS_PER_MESSAGE]:
+            block = self.get_block_by_hash(block_hash)
+            if block:
+                blocks.append(block.to_dict())
+        self.send_to_peer(peer_id, {
+            'type': 'blocks',
+            'blocks': blocks
+        })
+    
+    def process_blocks(self, peer_id: str, block_dicts: List[Dict]):
+        """Collect blocks announced by headers; once the window is complete, verify it in one go and apply it"""
+        headers = self.pending_headers.get(peer_id, [])
+        window = self.sync_windows.get(peer_id)
+        if not headers or window is None:
+            return
+        
+        expected = {header['hash'] for header in headers}
+        for block_dict in block_dicts:
+            if block_dict.get('hash') in expected:
+                window['blocks'][block_dict['hash']] = block_dict
+        window['outstanding'] = window.get('outstanding', 1) - 1
+        if len(window['blocks']) < len(headers):
+            if window['outstanding'] > 0:
+                return  # The rest of the window is still on its way
+            if len(window['blocks']) == window.get('received_before', 0):
+                # Peer did not deliver anything we asked for
+                self.pending_headers.pop(peer_id, None)
+                self.sync_windows.pop(peer_id, None)
+                self.sync_forks.pop(peer_id, None)
+                return
+            self.request_next_blocks(peer_id)
+            return
+        
+        # Hashes of the whole window are checked together, so large windows use the worker pool
+        self.pending_headers.pop(peer_id, None)
+        self.sync_windows.pop(peer_id, None)
+        block_dicts = [window['blocks'][header['hash']] for header in headers]
+        self.verify_then(self.verify_block_hashes, block_dicts,
+                         lambda valid: self.apply_window(peer_id, block_dicts, valid))
+    
+    def apply_window(self, peer_id: str, block_dicts: List[Dict], valid: bool):
+        """Append a verified sync window (or extend the fork it belongs to), then ask for the next one"""
+        if not valid:
+            print(f"❌ Blocks from {peer_id} failed hash verification, stopping sync")
+            self.sync_forks.pop(peer_id, None)
+            return
+        
+        accepted = 0
+        for block_dict in block_dicts:
+            fork = self.sync_forks.get(peer_id)
+            if fork is not None:
+                if not self.extend_fork(peer_id, fork, block_dict):
+                    return
+                accepted += 1
+                continue
+            index = block_dict['index']
+            if self.block_index.get(block_dict['hash']) == index:
+                continue  # Already received from another peer
+            if index != len(self.blockchain) or block_dict['previous_hash'] != self.blockchain[-1].hash:
+                print(f"⚠️ Block #{index} from {peer_id} does not extend our tip, stopping sync")
+                return
+            self.append_block(SimpleBlock.from_dict(block_dict))
+            self.mark_seen(block_dict['hash'])
+            accepted += 1
+        
+        if accepted:
+            print(f"🔄 Synced {accepted} blocks from {peer_id}, now at {len(self.blockchain)} blocks")
+            self.connect_orphans()
+            self.save_blockchain()
+        
+        if self.peer_heights.get(peer_id, 0) > len(self.blockchain):
+            # Headers come in bounded batches; ask for the next one
+            self.request_headers(peer_id)
+        else:
+            self.sync_forks.pop(peer_id, None)
+    
+    def extend_fork(self, peer_id: str, fork: Dict, block_dict: Dict) -> bool:
+        """Add a block to a competing branch and switch to it once it is longer"""
+        branch = fork['blocks']
+        parent = branch[-1] if branch else self.blockchain[fork['ancestor']]
+        if block_dict['index'] != parent.index + 1 or block_dict['previous_hash'] != parent.hash:
+            print(f"⚠️ Branch block #{block_dict['index']} from {peer_id} does not connect, stopping sync")
+            self.pending_headers.pop(peer_id, None)
+            self.sync_forks.pop(peer_id, None)
+            return False
+        
+        branch.append(SimpleBlock.from_dict(block_dict))
+        if fork['ancestor'] + 1 + len(branch) > len(self.blockchain):
+            self.reorganize(fork['ancestor'], branch)
+            del self.sync_forks[peer_id]
+        return True
     
     def send_blockchain(self, peer_id: str):
         """Send our blockchain to a peer"""
@@ -184,87 +898,141 @@ class SimpleP2PNode:
     
     def update_blockchain(self, blocks: List[Dict]):
         """Update our blockchain if received one is longer and valid"""
-        if len(blocks) > len(self.blockchain):
-            # Simple validation: check if it's a valid chain
-            if self.validate_blockchain(blocks):
-                print(f"🔄 Updating blockchain: {len(self.blockchain)} -> {len(blocks)} blocks")
-                self.blockchain = self.dict_to_blocks(blocks)
-            else:
-                print("❌ Received invalid blockchain")
+        if len(blocks) <= len(self.blockchain):
+            return
+        
+        ancestor = self.find_common_ancestor(blocks)
+        if chain_base(self.blockchain) and ancestor < chain_base(self.blockchain):
+            print("❌ Received blockchain forks below our snapshot, ignoring")
+            return
+        suffix = blocks[ancestor + 1:]
+        if ancestor >= 0 and suffix[0]['previous_hash'] != self.blockchain[ancestor].hash:
+            print("❌ Received invalid blockchain")
+            return
+        self.verify_then(self.validate_blockchain, suffix,
+                         lambda valid: self.adopt_blockchain(blocks, ancestor, valid))
+    
+    def adopt_blockchain(self, blocks: List[Dict], ancestor: int, valid: bool):
+        """Switch to a validated longer chain that forks from ours at ancestor"""
+        if not valid:
+            print("❌ Received invalid blockchain")
+            return
+        if len(blocks) <= len(self.blockchain) or self.find_common_ancestor(blocks) != ancestor:
+            print("⚠️ Our chain changed while the received one was verified, ignoring it")
+            return
+        suffix = blocks[ancestor + 1:]
+        
+        print(f"🔄 Updating blockchain: {len(self.blockchain)} -> {len(blocks)} blocks (fork at #{ancestor})")
+        self.reorganize(ancestor, self.dict_to_blocks(suffix))
+        self.connect_orphans()
+        self.save_blockchain()
+    
+    def find_common_ancestor(self, blocks: List[Dict]) -> int:
+        """Highest height where a received chain and ours agree; -1 if not even genesis matches"""
+        for height in range(min(len(blocks), len(self.blockchain)) - 1, -1, -1):
+            if self.block_index.get(blocks[height]['hash']) == height:
+                return height
+        return -1
+    
+    def verify_then(self, check: Callable[[List[Dict]], bool], blocks: List[Dict],
+                    apply: Callable[[bool], None]):
+        """Run check(blocks) and hand its result to apply (AsyncP2PNode runs the check off its loop)"""
+        apply(check(blocks))
     
     def validate_blockchain(self, blocks: List[Dict]) -> bool:
-        """Basic blockchain validation"""
+        """Check previous_hash linkage and recompute every block hash"""
         for i in range(1, len(blocks)):
             if blocks[i]['previous_hash'] != blocks[i-1]['hash']:
                 return False
-        return True
+        return self.verify_block_hashes(blocks)
+    
+    def verify_block_hashes(self, blocks: List[Dict]) -> bool:
+        """Recompute block hashes, in parallel for large batches"""
+        result = verify_blocks(blocks, kind='simple')
+        if result.workers > 1:
+            print(f"🔍 Verified {result.total} blocks in {result.elapsed:.2f}s "
+                  f"({result.blocks_per_second:,.0f} blocks/s, {result.workers} workers)")
+        if not result.valid:
+            print(f"❌ {len(result.invalid)} blocks have invalid hashes (first at position {result.invalid[0]})")
+        return result.valid
     
     def dict_to_blocks(self, block_dicts: List[Dict]) -> List[SimpleBlock]:
         """Convert dict representation to Block objects"""
-        blocks = []
-        for block_dict in block_dicts:
-            block = SimpleBlock(
-                block_dict['index'],
-                block_dict['data'],
-                block_dict['previous_hash']
-            )
-            # Use the hash from the dict to maintain consistency
-            block.hash = block_dict['hash']
-            blocks.append(block)
-        return blocks
+        return [SimpleBlock.from_dict(block_dict) for block_dict in block_dicts]
     
     def add_block(self, data: str):
         """Add new block to our blockchain"""
-        previous_block = self.blockchain[-1]
-        new_block = SimpleBlock(
-            len(self.blockchain),
-            data,
-            previous_block.hash
-        )
-        self.blockchain.append(new_block)
-        
-        print(f"➕ {self.node_id} added block #{new_block.index}: {data}")
-        
-        # Broadcast new block to peers
-        block_msg = {
-            'type': 'new_block',
-            'block': new_block.to_dict()
-        }
-        self.broadcast_to_peers(block_msg)
-        
-        # Save blockchain to file
-        self.save_blockchain()
+        with self.chain_lock:
+            previous_block = self.blockchain[-1]
+            new_block = SimpleBlock(
+                len(self.blockchain),
+                data,
+                previous_block.hash
+            )
+            self.append_block(new_block)
+            
+            print(f"➕ {self.node_id} added block #{new_block.index}: {data}")
+            
+            # Announce new block to peers
+            self.mark_seen(new_block.hash)
+            self.announce_block(new_block)
+            
+            # Save blockchain to file
+            self.save_blockchain()
     
-    def add_block_from_peer(self, block_dict: Dict):
+    def add_block_from_peer(self, block_dict: Dict) -> bool:
         """Add block received from peer"""
-        if not block_dict:
-            return
-        
-        # Check if this block extends our chain
-        if (block_dict['index'] == len(self.blockchain) and 
-            block_dict['previous_hash'] == self.blockchain[-1].hash):
+        with self.chain_lock:
+            if not block_dict:
+                return False
             
-            block = SimpleBlock(
-                block_dict['index'],
-                block_dict['data'],
-                block_dict['previous_hash']
-            )
-            block.hash = block_dict['hash']
-            self.blockchain.append(block)
+            # Check if this block extends our chain
+            if (block_dict['index'] == len(self.blockchain) and 
+                block_dict['previous_hash'] == self.blockchain[-1].hash):
+                
+                if SimpleBlock.hash_from_dict(block_dict) != block_dict['hash']:
+                    print(f"❌ Rejected block #{block_dict['index']} from peer: hash mismatch")
+                    return False
+                
+                block = SimpleBlock.from_dict(block_dict)
+                self.append_block(block)
+                
+                print(f"✅ {self.node_id} accepted block #{block.index} from peer")
+                return True
             
-            print(f"✅ {self.node_id} accepted block #{block.index} from peer")
+            return False
     
     def disconnect_peer(self, peer_id: str):
         """Disconnect from a peer"""
-        if peer_id in self.peer_sockets:
+        self.close_peer_sender(peer_id)
+        sock = self.peer_sockets.pop(peer_id, None)
+        if sock is not None:
             try:
-                self.peer_sockets[peer_id].close()
+                # shutdown() wakes the reader thread blocked in recv; close() alone does not
+                sock.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
+            try:
+                sock.close()
             except:
                 pass
-            del self.peer_sockets[peer_id]
         
         if peer_id in self.peers:
             self.peers.remove(peer_id)
+        
+        self.clear_peer_state(peer_id)
+    
+    def clear_peer_state(self, peer_id: str):
+        """Forget sync and gossip bookkeeping for a disconnected peer"""
+        with self.chain_lock:
+            self.peer_heights.pop(peer_id, None)
+            self.pending_headers.pop(peer_id, None)
+            self.sync_windows.pop(peer_id, None)
+            self.sync_forks.pop(peer_id, None)
+            self.ping_state.pop(peer_id, None)
+            self.peer_codecs.pop(peer_id, None)
+            for block_hash in [h for h, p in self.requested_blocks.items() if p == peer_id]:
+                del self.requested_blocks[block_hash]
     
     def start(self):
         """Start the node"""
@@ -274,48 +1042,194 @@ class SimpleP2PNode:
         server_thread = threading.Thread(target=self.start_server, daemon=True)
         server_thread.start()
         
+        # Ping peers periodically and evict dead ones
+        threading.Thread(target=self.keepalive_loop, daemon=True).start()
+        
         time.sleep(1)  # Give server time to start
         return True
     
     def save_blockchain(self):
-        """Save blockchain to JSON file"""
+        """Persist the chain: queued for the background saver, or written now"""
+        # Blocks are never modified once in the chain, so a shallow copy is a stable view
+        self.save_target = (chain_base(self.blockchain), tuple(self.blockchain))
+        if self.saver:
+            self.saver.mark_dirty()
+        else:
+            self.write_blockchain()
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every save requested so far is on disk"""
+        if self.saver:
+            return self.saver.flush(timeout)
+        return True
+    
+    def close_storage(self):
+        """Finish outstanding saves and close the block log; False if they could not be written"""
+        flushed = self.saver.stop() if self.saver else True
+        if not flushed:
+            print(f"❌ {self.node_id} stopped with unsaved blocks: {self.saver.last_error or 'save timed out'}")
+        self.block_log.close()
+        return flushed
+    
+    def archive_segments(self, keep_recent: int = 0) -> int:
+        """Compress sealed block log segments older than the last keep_recent blocks"""
+        if not isinstance(self.block_log, SegmentedBlockLog):
+            return 0
+        self.flush()
+        return self.block_log.archive_segments(len(self.blockchain) - keep_recent)
+    
+    def write_blockchain(self):
+        """Append blocks not yet on disk to the block log (rolling back a replaced suffix)"""
+        if self.save_target is None:
+            return
+        base, chain = self.save_target
+        keep = self.block_log.sync_chain([block.hash for block in chain], base)
+        new_blocks = chain[keep - base:]
+        if new_blocks:
+            self.block_log.append_many([block.to_dict() for block in new_blocks])
+            print(f"💾 Appended {len(new_blocks)} block(s) to {self.block_log.data_path}")
+        if self.snapshot_interval:
+            height = (base + len(chain)) // self.snapshot_interval * self.snapshot_interval
+            if height > (self.latest_snapshot.height if self.latest_snapshot else 0):
+                self.write_snapshot(chain[height - 1 - base])
+    
+    def build_snapshot(self, tip: SimpleBlock) -> Snapshot:
+        """Snapshot of our chain up to tip (the simple chain has no derived state)"""
+        return Snapshot('simple', tip.to_dict(), self.genesis_hash())
+    
+    def genesis_hash(self) -> str:
+        if chain_base(self.blockchain) and self.latest_snapshot:
+            return self.latest_snapshot.genesis_hash
+        return self.blockchain[0].hash
+    
+    def write_snapshot(self, tip: SimpleBlock) -> Snapshot:
+        snapshot = self.build_snapshot(tip)
+        self.snapshots.save(snapshot)
+        self.latest_snapshot = snapshot
+        print(f"📸 Snapshot at height {snapshot.height} saved ({snapshot.snapshot_id[:12]})")
+        return snapshot
+    
+    def create_snapshot(self, height: int = None) -> Snapshot:
+        """Write a snapshot at height (default: our tip) once pending saves are on disk"""
+        self.flush()
+        return self.write_snapshot(self.blockchain[(height or len(self.blockchain)) - 1])
+    
+    def verify_snapshot(self, snapshot: Snapshot) -> bool:
+        """Check a snapshot against our own chain: same genesis, same tip block and same state"""
+        height = snapshot.height
+        if snapshot.kind != 'simple' or snapshot.genesis_hash != self.genesis_hash():
+            return False
+        if not chain_base(self.blockchain) <= height - 1 < len(self.blockchain):
+            return False
+        return self.blockchain[height - 1].hash == snapshot.tip_hash and snapshot.state == {}
+    
+    def send_snapshot(self, peer_id: str):
+        self.send_to_peer(peer_id, {
+            'type': 'snapshot',
+            'snapshot': self.latest_snapshot.to_dict() if self.latest_snapshot else None
+        })
+    
+    def process_snapshot(self, peer_id: str, snapshot_dict: Optional[Dict]):
+        """Start from a peer's snapshot if we are behind it, then sync the tail from that peer"""
+        if not snapshot_dict:
+            return
+        if not self.fast_bootstrap:
+            print(f"⚠️ {peer_id} offered a snapshot but fast bootstrap is disabled")
+            return
         try:
-            blockchain_data = {
-                'node_id': self.node_id,
-                'chain_length': len(self.blockchain),
-                'blocks': [block.to_dict() for block in self.blockchain],
-                'saved_at': datetime.now().isoformat()
-            }
-            
-            with open(self.blockchain_file, 'w') as f:
-                json.dump(blockchain_data, f, indent=2)
-            
-            print(f"💾 Blockchain saved to {self.blockchain_file}")
-        except Exception as e:
-            print(f"❌ Failed to save blockchain: {e}")
+            snapshot = Snapshot.from_dict(snapshot_dict)
+        except SnapshotError as e:
+            print(f"❌ Rejected snapshot from {peer_id}: {e}")
+            return
+        if snapshot.kind != 'simple' or snapshot.genesis_hash != self.genesis_hash():
+            print(f"❌ Rejected snapshot from {peer_id}: different chain")
+            return
+        self.bootstrap_from(peer_id, snapshot)
+    
+    def bootstrap_from(self, peer_id: str, snapshot: Snapshot):
+        """Install a checked snapshot if it is ahead of us, then pull the tail from peer_id"""
+        if snapshot.height > len(self.blockchain):
+            self.install_snapshot(snapshot)
+        self.request_headers(peer_id)
+    
+    def install_snapshot(self, snapshot: Snapshot):
+        """Replace our chain with the snapshot tip; history below it is never downloaded"""
+        with self.chain_lock:
+            self.flush()
+            tip = SimpleBlock.from_dict(snapshot.tip)
+            self.blockchain = ChainView(tip.index, [tip])
+            self.rebuild_block_index()
+            self.mark_seen(tip.hash)
+            self.pending_headers.clear()
+            self.sync_windows.clear()
+            self.sync_forks.clear()
+            # The log restarts at the tip so it lines up with the chain we hold
+            self.block_log = restart_block_log(self.block_log, tip.index, self.segment_size, self.archive_dir)
+            self.block_log.append(snapshot.tip)
+            self.snapshots.save(snapshot)
+            self.latest_snapshot = snapshot
+            print(f"⚡ Bootstrapped from snapshot at height {snapshot.height} ({snapshot.snapshot_id[:12]})")
+    
+    def prune_history(self, keep_recent: int = 0) -> int:
+        """Snapshot at len - keep_recent, verify it, then drop block segments and memory below it"""
+        with self.chain_lock:
+            height = len(self.blockchain) - keep_recent
+            if height <= chain_base(self.blockchain) + 1:
+                return 0
+            snapshot = self.create_snapshot(height)
+            if not self.verify_snapshot(snapshot):
+                print(f"❌ Snapshot at height {height} failed verification, not pruning")
+                return 0
+            base = snapshot.height - 1
+            pruned = self.block_log.prune_segments(base) if isinstance(self.block_log, SegmentedBlockLog) else 0
+            self.blockchain = ChainView(base, self.blockchain[base:])
+            self.rebuild_block_index()
+            return pruned
     
     def load_blockchain(self):
-        """Load blockchain from JSON file"""
+        """Replay the block log, migrating a legacy JSON chain file on first run"""
         try:
-            with open(self.blockchain_file, 'r') as f:
-                blockchain_data = json.load(f)
+            self.latest_snapshot = self.snapshots.latest()
+            if not self.block_log.exists() and os.path.exists(self.blockchain_file):
+                # Stream the old document so it is never parsed whole
+                blocks = (value for key, value in iter_json_members(self.blockchain_file, 'blocks') if key == 'blocks')
+                for batch in batched(blocks):
+                    self.block_log.append_many(batch)
+                print(f"📦 Migrated {len(self.block_log)} blocks from {self.blockchain_file} to block log")
             
-            # Reconstruct blocks
-            for block_dict in blockchain_data['blocks']:
-                block = SimpleBlock(
-                    block_dict['index'],
-                    block_dict['data'],
-                    block_dict['previous_hash']
-                )
-                # Preserve the original timestamp and hash
-                block.timestamp = block_dict['timestamp']
-                block.hash = block_dict['hash']
-                self.blockchain.append(block)
+            start = 0
+            if first_position(self.block_log) > 0:
+                # History below the snapshot was pruned (or never downloaded): start at its tip
+                snapshot = self.latest_snapshot
+                if snapshot is None or snapshot.height - 1 < first_position(self.block_log):
+                    print(f"❌ {self.block_log.data_path} starts at #{first_position(self.block_log)} "
+                          f"with no snapshot covering the blocks below")
+                    return
+                start = snapshot.height - 1
+                self.blockchain = ChainView(start)
             
-            print(f"📁 Loaded blockchain with {len(self.blockchain)} blocks from {self.blockchain_file}")
+            # Reconstruct blocks, preserving the original timestamp and hash; every stored hash is
+            # recomputed and loading stops at the first block that fails or doesn't link
+            with VerifierPool() as pool:
+                for batch in batched(self.block_log.iter_blocks(start), DEFAULT_CHUNK_SIZE):
+                    invalid = verify_blocks(batch, kind='simple', pool=pool).invalid
+                    broken = invalid[0] if invalid else len(batch)
+                    for position, block_dict in enumerate(batch[:broken]):
+                        if self.blockchain and (block_dict['index'] != len(self.blockchain) or
+                                                block_dict['previous_hash'] != self.blockchain[-1].hash):
+                            broken = position
+                            break
+                        self.append_block(SimpleBlock.from_dict(block_dict))
+                    if broken < len(batch):
+                        print(f"❌ Block #{batch[broken]['index']} in {self.block_log.data_path} has an invalid hash "
+                              f"or does not link: chain truncated at #{len(self.blockchain)}")
+                        break
+            
+            if self.blockchain:
+                print(f"📁 Loaded blockchain with {len(self.blockchain)} blocks from {self.block_log.data_path}")
+            else:
+                print(f"📁 No existing blockchain file found, will create new one")
             
-        except FileNotFoundError:
-            print(f"📁 No existing blockchain file found, will create new one")
         except Exception as e:
             print(f"❌ Failed to load blockchain: {e}")
     
@@ -324,29 +1238,53 @@ class SimpleP2PNode:
         print(f"🛑 Stopping {self.node_id}...")
         self.running = False
         
+        if self.peer_manager:
+            self.peer_manager.stop()
+        
         # Close all peer connections
         for peer_id in list(self.peer_sockets.keys()):
             self.disconnect_peer(peer_id)
         
         # Close server socket
         if self.server_socket:
+            try:
+                # Wake the thread blocked in accept() so the port is released
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
             try:
                 self.server_socket.close()
             except:
                 pass
         
+        self.close_storage()
         print(f"✅ {self.node_id} stopped")
     
     def get_status(self) -> Dict:
         """Get node status"""
-        return {
-            'node_id': self.node_id,
-            'running': self.running,
-            'peers': len(self.peers),
-            'peer_list': self.peers.copy(),
-            'blockchain_length': len(self.blockchain),
-            'latest_block': self.blockchain[-1].to_dict() if self.blockchain else None
-        }
+        with self.chain_lock:
+            return {
+                'node_id': self.node_id,
+                'running': self.running,
+                'peers': len(self.peers),
+                'peer_list': self.peers.copy(),
+                'blockchain_length': len(self.blockchain),
+                'latest_block': self.blockchain[-1].to_dict() if self.blockchain else None,
+                'send_queue_depth': self.get_send_queue_depths(),
+                'peer_rtt_ms': self.get_peer_rtts(),
+                'orphans': self.orphans.get_stats(),
+                'messages_dropped': self.messages_dropped + sum(s.dropped for s in list(self.peer_senders.values())),
+                'peer_manager': self.peer_manager.get_status() if self.peer_manager else None,
+                'storage': {**self.block_log.get_stats(),
+                            'write_behind': self.saver.get_stats() if self.saver else None},
+                'chain_base': chain_base(self.blockchain),
+                'snapshot': {'height': self.latest_snapshot.height, 'snapshot_id': self.latest_snapshot.snapshot_id}
+                            if self.latest_snapshot else None
+            }
+    
+    def get_send_queue_depths(self) -> Dict[str, int]:
+        """Outbound queue depth per connected peer"""
+        return {peer_id: sender.depth() for peer_id, sender in list(self.peer_senders.items())}
     
     def print_status(self):
         """Print current status"""
@@ -354,6 +1292,8 @@ class SimpleP2PNode:
         print(f"   Running: {self.running}")
         print(f"   Peers: {len(self.peers)} - {self.peers}")
         print(f"   Blockchain: {len(self.blockchain)} blocks")
+        print(f"   Send queues: {self.get_send_queue_depths()}")
+        print(f"   Peer RTT (ms): {self.get_peer_rtts()}")
         if self.blockchain:
             latest = self.blockchain[-1]
             print(f"   Latest block: #{latest.index} - {latest.data[:50]}...")
@@ -388,6 +1328,8 @@ def run_interactive_node(node: SimpleP2PNode):
                 addr = cmd[8:]
                 if ':' in addr:
                     host, port = addr.split(':')
+                    if node.peer_manager:
+                        node.peer_manager.add_peer(host, int(port))
                     node.connect_to_peer(host, int(port))
                 else:
                     print("Usage: connect <host:port>")
@@ -418,6 +1360,15 @@ def main():
     parser.add_argument('--host', type=str, default='localhost', help='Host address (default: localhost)')
     parser.add_argument('--connect', type=str, help='Bootstrap node to connect to (host:port)')
     parser.add_argument('--node-id', type=str, help='Node identifier')
+    parser.add_argument('--target-peers', type=int, default=8, help='Outbound connections to maintain (default: 8)')
+    parser.add_argument('--durability', choices=DURABILITY_POLICIES, default=DURABILITY_BUFFERED,
+                        help='Block persistence policy (default: buffered)')
+    parser.add_argument('--block-codec', choices=CODECS, default=CODEC_JSON,
+                        help='Block encoding for disk and (if the peer agrees) wire (default: json)')
+    parser.add_argument('--segment-mb', type=int, help='Split the block log into segments of this many MB')
+    parser.add_argument('--snapshot-interval', type=int, help='Write a chain snapshot every N blocks')
+    parser.add_argument('--fast-bootstrap', action='store_true',
+                        help="Start from a peer's snapshot instead of syncing from genesis")
     
     args = parser.parse_args()
     
@@ -425,13 +1376,19 @@ def main():
     node = SimpleP2PNode(
         host=args.host,
         port=args.port,
-        node_id=args.node_id
+        node_id=args.node_id,
+        durability=args.durability,
+        block_codec=args.block_codec,
+        segment_size=args.segment_mb * 1024 * 1024 if args.segment_mb else None,
+        snapshot_interval=args.snapshot_interval,
+        fast_bootstrap=args.fast_bootstrap
     )
     
     print(f"🚀 Starting blockchain node on {args.host}:{args.port}")
     
     if node.start():
         print(f"✅ Node started successfully")
+        peer_manager = PeerManager(node, target_outbound=args.target_peers)
         
         # Connect to bootstrap node if specified
         if args.connect:
@@ -440,10 +1397,14 @@ def main():
                 print(f"🔗 Connecting to bootstrap node {host}:{port}...")
                 time.sleep(2)  # Give our server time to start
                 
+                peer_manager.add_peer(host, int(port))
                 if node.connect_to_peer(host, int(port)):
                     print(f"✅ Connected to bootstrap node")
                 else:
-                    print(f"❌ Failed to connect to bootstrap node")
+                    print(f"❌ Failed to connect to bootstrap node, will keep retrying")
+        
+        # Keep reconnecting to known peers in the background
+        peer_manager.start()
         
         # Run interactive mode
         try:
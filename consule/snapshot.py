@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+CHAIN SNAPSHOTS
+State of a chain at a height, so nodes can start from it instead of genesis
+
+A snapshot holds the block at its tip (height - 1), the genesis hash of the
+chain it belongs to and the state derived from every block below it (PoA:
+authorities, users, organizations and per-type counts; the simple chain has
+no derived state). Its id is a hash over all of that, so two honest nodes
+produce the same id for the same chain. A snapshot is checked on load
+(the id and tip block hash must match) and can be verified in full by any
+node that still has the history below it.
+
+A node started from a snapshot holds its chain in a ChainView: a list-like
+container indexed by absolute height that starts at the snapshot tip.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from block_store import write_json_atomic
+from block_verifier import verify_blocks, BLOCK_KINDS
+
+SNAPSHOTS_KEPT = 2  # Snapshot files kept per chain (newest first)
+
+class SnapshotError(ValueError):
+    """Raised for a snapshot that is malformed or doesn't match its id"""
+    pass
+
+def state_digest(value: Any) -> str:
+    """Hash of a JSON value, independent of key order"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+class Snapshot:
+    """Tip block plus derived state of a chain at a height"""
+    def __init__(self, kind: str, tip: Dict, genesis_hash: str, state: Dict = None, created_at: str = None):
+        if kind not in BLOCK_KINDS:
+            raise SnapshotError(f"Unknown snapshot kind: {kind}")
+        self.kind = kind
+        self.tip = tip
+        self.genesis_hash = genesis_hash
+        self.state = state or {}
+        self.created_at = created_at or datetime.now().isoformat()
+
+    @property
+    def height(self) -> int:
+        """Number of blocks covered (the tip is block height - 1)"""
+        return self.tip['index'] + 1
+
+    @property
+    def tip_hash(self) -> str:
+        return self.tip['hash']
+
+    @property
+    def state_hash(self) -> str:
+        return state_digest(self.state)
+
+    @property
+    def snapshot_id(self) -> str:
+        content = f"{self.kind}{self.height}{self.tip_hash}{self.genesis_hash}{self.state_hash}"
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def verify_tip(self) -> bool:
+        """The tip block's stored hash matches its contents"""
+        return verify_blocks([self.tip], kind=self.kind).valid
+
+    def to_dict(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'height': self.height,
+            'tip': self.tip,
+            'genesis_hash': self.genesis_hash,
+            'state': self.state,
+            'state_hash': self.state_hash,
+            'created_at': self.created_at,
+            'snapshot_id': self.snapshot_id
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Snapshot':
+        """Rebuild a snapshot, rejecting one whose contents don't match its id"""
+        try:
+            snapshot = cls(data['kind'], data['tip'], data['genesis_hash'], data['state'], data.get('created_at'))
+            tip_index = data['tip']['index']
+        except (KeyError, TypeError) as e:
+            raise SnapshotError(f"Malformed snapshot: {e}")
+        if data.get('height') != tip_index + 1 or data.get('snapshot_id') != snapshot.snapshot_id:
+            raise SnapshotError("Snapshot contents don't match its id")
+        if not snapshot.verify_tip():
+            raise SnapshotError(f"Snapshot tip block #{tip_index} has an invalid hash")
+        return snapshot
+
+class SnapshotStore:
+    """Snapshot files of one chain in <name>.snapshots/, keeping the newest few"""
+    def __init__(self, base_path: str, kept: int = SNAPSHOTS_KEPT):
+        self.dir = base_path + '.snapshots'
+        self.kept = kept
+
+    def _path(self, height: int) -> str:
+        return os.path.join(self.dir, f"{height:012d}.json")
+
+    def heights(self) -> List[int]:
+        if not os.path.isdir(self.dir):
+            return []
+        return sorted(int(name[:-5]) for name in os.listdir(self.dir)
+                      if name.endswith('.json') and name[:-5].isdigit())
+
+    def save(self, snapshot: Snapshot):
+        os.makedirs(self.dir, exist_ok=True)
+        write_json_atomic(self._path(snapshot.height), snapshot.to_dict(), fsync=True)
+        for height in self.heights()[:-self.kept]:
+            os.remove(self._path(height))
+
+    def load(self, height: int) -> Snapshot:
+        with open(self._path(height), 'r') as f:
+            return Snapshot.from_dict(json.load(f))
+
+    def latest(self) -> Optional[Snapshot]:
+        """Newest snapshot that loads and checks out"""
+        for height in reversed(self.heights()):
+            try:
+                return self.load(height)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping snapshot at height {height}: {e}")
+        return None
+
+class ChainView:
+    """Blocks from height base upwards, indexed by absolute height like a list"""
+    def __init__(self, base: int = 0, blocks: List = None):
+        self.base = base
+        self.blocks = list(blocks) if blocks else []
+
+    def __len__(self) -> int:
+        return self.base + len(self.blocks)
+
+    def __bool__(self) -> bool:
+        return bool(self.blocks)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.blocks)
+
+    def _position(self, height: int) -> int:
+        if height < 0:
+            height += len(self)
+        if not self.base <= height < len(self):
+            raise IndexError(f"Block #{height} is not held (chain starts at #{self.base})")
+        return height - self.base
+
+    def _range(self, key: slice) -> slice:
+        start, stop, step = key.indices(len(self))
+        return slice(max(start - self.base, 0), max(stop - self.base, 0), step)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.blocks[self._range(key)]
+        return self.blocks[self._position(key)]
+
+    def __delitem__(self, key):
+        if isinstance(key, slice):
+            del self.blocks[self._range(key)]
+        else:
+            del self.blocks[self._position(key)]
+
+    def append(self, block):
+        self.blocks.append(block)
+
+    def extend(self, blocks):
+        self.blocks.extend(blocks)
+
+def chain_base(chain) -> int:
+    """Height of the first block held: the ChainView base, or 0 for a plain list"""
+    return getattr(chain, 'base', 0)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+ASYNCIO NODE TEST
+Verify the asyncio engine interoperates with SimpleP2PNode and scales to many peers
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from async_blockchain import AsyncP2PNode
+from simple_blockchain import SimpleP2PNode
+from p2p_protocol import send_message
+
+def test_async_node_syncs_with_thread_node(free_port, wait_until):
+    """Chains and new blocks flow between the two engines"""
+    print("🧪 Testing asyncio <-> threaded node interop...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port_a, port_b = free_port(), free_port()
+        thread_node = SimpleP2PNode(port=port_a, blockchain_file=os.path.join(tmp, 'a.json'))
+        async_node = AsyncP2PNode(port=port_b, blockchain_file=os.path.join(tmp, 'b.json'))
+        for i in range(5):
+            thread_node.add_block(f"block {i}")
+
+        assert thread_node.start()
+        assert async_node.start()
+        try:
+            assert async_node.connect_to_peer('localhost', port_a)
+            assert wait_until(lambda: len(async_node.blockchain) == 6)
+
+            async_node.add_block("from asyncio")
+            assert wait_until(lambda: len(thread_node.blockchain) == 7)
+            assert thread_node.blockchain[-1].hash == async_node.blockchain[-1].hash
+        finally:
+            async_node.stop()
+            thread_node.stop()
+
+    print("✅ Engines interoperate!")
+
+def test_many_peers_single_thread(free_port, wait_until):
+    """Hundreds of inbound peers are served by one loop thread"""
+    print("\n🧪 Testing many concurrent peers...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        node = AsyncP2PNode(port=port, blockchain_file=os.path.join(tmp, 'n.json'))
+        assert node.start()
+        clients = []
+        try:
+            import threading
+            threads_before = threading.active_count()
+            for i in range(200):
+                sock = socket.create_connection(('localhost', port))
+                send_message(sock, {'type': 'hello', 'node_id': f'c{i}', 'blockchain_length': 1})
+                clients.append(sock)
+
+            assert wait_until(lambda: node.get_status()['connections'] == 200)
+            assert threading.active_count() == threads_before
+        finally:
+            for sock in clients:
+                sock.close()
+            node.stop()
+
+    print("✅ 200 peers served without extra threads!")
+
+def test_slow_work_runs_off_the_loop(free_port, wait_until):
+    """Window verification and save flushes run in the executor while the loop keeps serving"""
+    print("\n🧪 Testing slow work off the event loop...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port_a, port_b = free_port(), free_port()
+        source = SimpleP2PNode(port=port_a, blockchain_file=os.path.join(tmp, 'a.json'))
+        node = AsyncP2PNode(port=port_b, blockchain_file=os.path.join(tmp, 'b.json'))
+        for i in range(20):
+            source.add_block(f"block {i}")
+
+        checked_on = []
+        verify_block_hashes = node.verify_block_hashes
+        def slow_verify(blocks):
+            checked_on.append(threading.current_thread())
+            time.sleep(1.0)
+            return verify_block_hashes(blocks)
+        node.verify_block_hashes = slow_verify
+
+        flushed_on = []
+        flush, save = node.saver.flush, node.saver.save
+        def recording_flush(timeout=None):
+            if node.saver.pending():  # A flush with nothing pending returns at once
+                flushed_on.append(threading.current_thread())
+            return flush(timeout)
+        def slow_save():
+            time.sleep(0.5)
+            save()
+        node.saver.flush, node.saver.save = recording_flush, slow_save
+
+        assert source.start()
+        assert node.start()
+        try:
+            assert node.connect_to_peer('localhost', port_a)
+            assert wait_until(lambda: checked_on)
+            started = time.time()
+            assert node.get_status()['blockchain_length'] == 1  # answered while the window is checked
+            assert time.time() - started < 0.5
+            assert wait_until(lambda: len(node.blockchain) == 21)
+            assert checked_on and node._loop_thread not in checked_on
+
+            # The saver writes the copy taken on the loop, even if the chain moves on meanwhile
+            assert [block.hash for block in node.save_target[1]] == [block.hash for block in node.blockchain]
+            snapshot = node.create_snapshot()
+            assert snapshot.height == 21 and len(node.block_log) == 21
+            assert flushed_on and node._loop_thread not in flushed_on
+        finally:
+            node.stop()
+            source.stop()
+
+    print("✅ Slow work kept off the loop!")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+BLOCK CODEC TEST
+Verify the compact binary block encoding round-trips exactly on disk and wire
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from block_codec import (CODEC_JSON, CODEC_BINARY, KIND_SIMPLE, KIND_POA, KIND_POA_MERKLE, KIND_POA_SIGNED,
+                         KIND_JSON, CodecError, encode_block, decode_block, encode_blocks, decode_blocks)
+from block_store import BlockLog
+from p2p_protocol import FrameReader, encode_message
+from simple_blockchain import SimpleBlock, SimpleP2PNode
+from poa_blockchain import PoABlock
+from signing import generate_keypair, sign, block_message, validation_message
+
+def simple_chain(length: int):
+    blocks = [SimpleBlock(0, "Genesis Block", "0")]
+    for i in range(1, length):
+        blocks.append(SimpleBlock(i, f"Block data {i}", blocks[-1].hash))
+    return [block.to_dict() for block in blocks]
+
+def test_round_trip_and_size():
+    """Every block decodes to the identical dict and is much smaller than JSON"""
+    print("🧪 Testing codec round trip...")
+
+    blocks = simple_chain(500)
+    encoded = [encode_block(block) for block in blocks]
+    assert all(e[1] == KIND_SIMPLE for e in encoded)
+    assert [decode_block(e) for e in encoded] == blocks
+    assert all(SimpleBlock.hash_from_dict(decode_block(e)) == b['hash'] for e, b in zip(encoded, blocks))
+
+    json_size = len(json.dumps(blocks, indent=2))
+    assert json_size / sum(len(e) for e in encoded) > 2.5
+    # In a list, each previous_hash is the hash before it and is left out
+    listed = encode_blocks(blocks)
+    assert json_size / len(listed) > 3.5 and decode_blocks(listed) == blocks
+    linked = encode_block(blocks[6], linked_to=blocks[5]['hash'])
+    assert decode_block(linked, linked_to=blocks[5]['hash']) == blocks[6]
+    try:
+        decode_block(linked)
+        assert False, "linked block decoded without the hash before it"
+    except CodecError:
+        pass
+
+    poa = PoABlock(1, {"type": "USER_REGISTRATION", "user_id": "u1"}, blocks[1]['hash'], "AUTH", "Authority")
+    poa.add_validation("AUTH", "Authority")
+    poa.finalize_block(1)
+    for block in (poa.to_dict(), PoABlock(2, {}, "0", "AUTH", "Authority").to_dict()):
+        assert encode_block(block)[1] == KIND_POA_MERKLE
+        assert decode_block(encode_block(block)) == block
+        assert 'merkle_root' in decode_block(encode_block(block), with_data=False)
+    # Signatures are stored as raw bytes
+    private_key, _ = generate_keypair()
+    signed = PoABlock(3, {"type": "USER_REGISTRATION", "user_id": "u3"}, poa.hash, "AUTH", "Authority")
+    signed.signature = sign(private_key, block_message(signed.hash))
+    signed.add_validation("AUTH", "Authority", sign(private_key, validation_message(signed.hash)))
+    signed.add_validation("OLD", "Old Authority")
+    encoded = encode_block(signed.to_dict())
+    assert encoded[1] == KIND_POA_SIGNED and decode_block(encoded) == signed.to_dict()
+    assert len(encoded) - len(encode_block(dict(signed.to_dict(), signature=None))) == 64
+    # Blocks from before Merkle roots keep their layout
+    legacy = {key: value for key, value in poa.to_dict().items() if key != 'merkle_root'}
+    assert encode_block(legacy)[1] == KIND_POA and decode_block(encode_block(legacy)) == legacy
+
+    # Values that have no compact form are kept verbatim
+    odd = {'index': -3, 'timestamp': '2025-01-01T00:00:00+02:00', 'data': {'nested': [1, 2.5]},
+           'previous_hash': '0', 'hash': 'ABCDEF'}
+    assert decode_block(encode_block(odd)) == odd
+    for timestamp in ('2025-01-01T00:00:00+02:00', '2025-01-01 00:00:00', '2025-01-01T00:00:00.000000'):
+        block = dict(blocks[3], timestamp=timestamp)
+        assert decode_block(encode_block(block)) == block
+    extra = dict(blocks[3], note="extra field")
+    assert encode_block(extra)[1] == KIND_JSON and decode_block(encode_block(extra)) == extra
+
+    for bad in (b'', b'\x09\x00', encode_block(blocks[5])[:-4], encode_block(blocks[5]) + b'\x00'):
+        try:
+            decode_block(bad)
+            assert False, "malformed block decoded"
+        except CodecError:
+            pass
+
+    print("✅ Blocks round-trip exactly in a fraction of the space!")
+
+def test_binary_wire_envelope_and_log():
+    """Block messages and log records use the codec and read back identically"""
+    print("\n🧪 Testing binary frames and log records...")
+
+    blocks = simple_chain(50)
+    for message in ({'type': 'blocks', 'blocks': blocks}, {'type': 'new_block', 'block': blocks[7]}):
+        binary = encode_message(message, codec=CODEC_BINARY)
+        assert binary[4] == 0  # binary envelope
+        plain = encode_message(message, codec=CODEC_JSON)
+        assert len(binary) < len(plain) * (0.5 if 'blocks' in message else 0.8)
+        reader = FrameReader()
+        assert reader.feed(binary + plain) == [message, message]
+    # Only block-carrying messages use the envelope: getblocks lists [index, hash] pairs
+    getblocks = {'type': 'getblocks', 'blocks': [[b['index'], b['hash']] for b in blocks]}
+    assert encode_message(getblocks, codec=CODEC_BINARY) == encode_message(getblocks, codec=CODEC_JSON)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = BlockLog(os.path.join(tmp, 'chain'), codec=CODEC_BINARY)
+        log.append_many(blocks[:25])
+        log.close()
+        # Switching codec later leaves a log with both record kinds
+        log = BlockLog(os.path.join(tmp, 'chain'), codec=CODEC_JSON)
+        log.append_many(blocks[25:])
+        assert list(log.iter_blocks()) == blocks
+        log.close()
+
+    print("✅ Binary frames and records decode transparently!")
+
+def test_codec_negotiated_in_hello(free_port):
+    """Binary is only used between peers that both offer it"""
+    print("\n🧪 Testing codec negotiation...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ports = [free_port() for _ in range(3)]
+        source = SimpleP2PNode(port=ports[0], blockchain_file=os.path.join(tmp, 'a.json'), block_codec=CODEC_BINARY)
+        binary_peer = SimpleP2PNode(port=ports[1], blockchain_file=os.path.join(tmp, 'b.json'), block_codec=CODEC_BINARY)
+        json_peer = SimpleP2PNode(port=ports[2], blockchain_file=os.path.join(tmp, 'c.json'))
+        for i in range(30):
+            source.add_block(f"negotiated {i}")
+        nodes = [source, binary_peer, json_peer]
+        for node in nodes:
+            node.start()
+        try:
+            assert binary_peer.connect_to_peer('localhost', ports[0])
+            assert json_peer.connect_to_peer('localhost', ports[0])
+            deadline = time.time() + 5
+            while time.time() < deadline and any(len(n.blockchain) != 31 for n in nodes):
+                time.sleep(0.05)
+            assert all(n.blockchain[-1].hash == source.blockchain[-1].hash for n in nodes)
+
+            # The source saw two inbound peers but only one offered binary
+            assert list(source.peer_codecs.values()) == [CODEC_BINARY]
+            assert binary_peer.peer_codecs == {f"localhost:{ports[0]}": CODEC_BINARY}
+            assert not json_peer.peer_codecs
+        finally:
+            for node in nodes:
+                node.stop()
+
+    print("✅ Codec negotiated per peer!")
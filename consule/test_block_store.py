@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+BLOCK STORAGE TEST
+Verify the append-only block log, crash recovery and legacy migration
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from block_store import (BlockLog, INDEX_ENTRY, DURABILITY_FSYNC, DURABILITY_INTERVAL,
+                         DURABILITY_BUFFERED, WriteBehindSaver, iter_json_members, batched)
+from simple_blockchain import SimpleP2PNode
+from poa_blockchain import PoABlockchain
+from poa_store import STORAGE_LOG, STORAGE_SQLITE
+from block_codec import CODEC_BINARY
+
+def block(i: int, size: int = 20):
+    return {'index': i, 'timestamp': 't', 'data': 'x' * size, 'previous_hash': f"{i - 1:064x}", 'hash': f"{i:064x}"}
+
+def test_append_read_and_replay():
+    """Records come back in order, by position and after reopening"""
+    print("🧪 Testing append and replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = BlockLog(os.path.join(tmp, 'chain'))
+        for i in range(50):
+            assert log.append(block(i)) == i
+        assert log.read(17) == block(17)
+        log.close()
+
+        log = BlockLog(os.path.join(tmp, 'chain'))
+        assert list(log.iter_blocks()) == [block(i) for i in range(50)]
+        assert list(log.iter_blocks(48)) == [block(48), block(49)]
+
+        assert log.sync_chain([block(i)['hash'] for i in range(30)] + ["other"]) == 30
+        assert len(log) == 30
+        log.append(block(99))
+        assert log.read(30) == block(99)
+        log.close()
+
+    print("✅ Block log appends and replays!")
+
+def test_torn_tail_recovery():
+    """A partial trailing record is trimmed; a lost index entry is rebuilt"""
+    print("\n🧪 Testing crash recovery...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, 'chain')
+        log = BlockLog(base)
+        log.append_many([block(i) for i in range(10)])
+        log.close()
+
+        # Lose the last index entry and half-write an extra record
+        with open(base + '.idx', 'r+b') as f:
+            f.truncate(9 * INDEX_ENTRY.size + 5)
+        with open(base + '.blocks', 'ab') as f:
+            f.write(b'\x00\x00\x01\x00garbage')
+
+        log = BlockLog(base)
+        log.open()
+        assert len(log) == 10
+        assert log.recovered_records == 1 and log.trimmed_bytes == 11
+        assert list(log.iter_blocks()) == [block(i) for i in range(10)]
+        log.close()
+
+    print("✅ Torn writes recovered!")
+
+def test_mmap_random_access():
+    """Block N is read by offset without touching the records around it"""
+    print("\n🧪 Testing mmap random access...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = BlockLog(os.path.join(tmp, 'chain'))
+        log.append_many([block(i, size=100) for i in range(2000)])
+        assert log.read(1234) == block(1234, size=100)
+
+        # Damage an unrelated record: random reads elsewhere are unaffected
+        with open(log.data_path, 'r+b') as f:
+            f.seek(log.offsets[5] + 20)
+            f.write(b'\xff' * 10)
+        assert log.read(1999) == block(1999, size=100)
+
+        # The mapping follows appends and truncation
+        log.append(block(2000))
+        assert log.read(2000) == block(2000)
+        log.truncate(1500)
+        log.append(block(7))
+        assert log.read(1500) == block(7) and len(log) == 1501
+
+        # Payloads handed out are copies: truncating past them unmaps safely and leaves them intact
+        payload = log.read_payload(1450)
+        assert isinstance(payload, bytes)
+        log.truncate(1400)
+        assert log.data_map is None and json.loads(payload) == block(1450, size=100)
+        assert log.read(1399) == block(1399, size=100)
+        log.close()
+
+    print("✅ Random access reads are single mapping slices!")
+
+def test_group_commit_and_durability_policies():
+    """Concurrent fsync appends share one flush; interval and buffered defer it"""
+    print("\n🧪 Testing durability policies...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = BlockLog(os.path.join(tmp, 'fsync'), durability=DURABILITY_FSYNC)
+        log.open()
+        # Hold the flush while five appenders write, then let one fsync cover them all
+        with log.sync_lock:
+            writers = [threading.Thread(target=log.append, args=(block(i),)) for i in range(5)]
+            for writer in writers:
+                writer.start()
+            deadline = time.time() + 5
+            while len(log) < 5 and time.time() < deadline:
+                time.sleep(0.01)
+        for writer in writers:
+            writer.join()
+        stats = log.get_stats()
+        assert stats['flushes'] == 1 and stats['blocks_per_flush'] == 5
+        assert stats['unsynced_records'] == 0 and stats['writes'] == 5
+        log.close()
+
+        log = BlockLog(os.path.join(tmp, 'interval'), durability=DURABILITY_INTERVAL, fsync_interval_ms=50)
+        for i in range(100):
+            log.append(block(i))
+        deadline = time.time() + 5
+        while log.get_stats()['unsynced_records'] and time.time() < deadline:
+            time.sleep(0.02)
+        stats = log.get_stats()
+        assert stats['unsynced_records'] == 0 and stats['flushes'] < 100
+        log.close()
+
+        log = BlockLog(os.path.join(tmp, 'buffered'), durability=DURABILITY_BUFFERED)
+        log.append_many([block(i) for i in range(10)])
+        stats = log.get_stats()
+        assert stats['flushes'] == 0 and stats['unsynced_records'] == 10 and stats['avg_write_ms'] >= 0
+        log.close()
+
+        try:
+            BlockLog(os.path.join(tmp, 'bad'), durability="sometimes")
+            assert False, "unknown policy accepted"
+        except ValueError:
+            pass
+
+    print("✅ Group commit and durability policies work!")
+
+def test_node_writes_only_new_blocks():
+    """Adding a block costs one record, not a full rewrite"""
+    print("\n🧪 Testing incremental node saves...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'node.json')
+        node = SimpleP2PNode(blockchain_file=path)
+        for i in range(200):
+            node.add_block(f"payload {i} " + "z" * 200)
+        node.flush()
+        before = node.block_log.bytes_written
+        node.add_block("one more")
+        node.flush()
+        assert node.block_log.bytes_written - before < 400
+        hashes = [b.hash for b in node.blockchain]
+        node.stop()
+
+        reloaded = SimpleP2PNode(blockchain_file=path)
+        assert [b.hash for b in reloaded.blockchain] == hashes
+        reloaded.stop()
+
+    print("✅ Only new blocks were written!")
+
+def test_write_behind_saver():
+    """Block acceptance does not wait on a slow disk; flush and stop make it durable"""
+    print("\n🧪 Testing write-behind saver...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'slow.json')
+        node = SimpleP2PNode(blockchain_file=path)
+        append_many = node.block_log.append_many
+        def slow_append(block_dicts):
+            time.sleep(0.05)
+            return append_many(block_dicts)
+        node.block_log.append_many = slow_append
+
+        start = time.time()
+        for i in range(100):
+            node.add_block(f"fast {i}")
+        assert time.time() - start < 2.0
+
+        assert node.flush(timeout=10)
+        stats = node.get_status()['storage']
+        assert stats['records'] == 101
+        assert stats['write_behind']['pending'] == 0
+        assert stats['write_behind']['saves'] < 100
+
+        node.add_block("last")
+        node.stop()
+        reloaded = SimpleP2PNode(blockchain_file=path, write_behind=False)
+        assert len(reloaded.blockchain) == 102
+        reloaded.stop()
+
+    print("✅ Saves coalesced off the hot path and flushed on stop!")
+
+def test_failed_saves_are_not_reported_durable():
+    """A save that raises leaves the request pending: flush and stop say so, and the next try writes it"""
+    print("\n🧪 Testing failed background saves...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'broken.json')
+        node = SimpleP2PNode(blockchain_file=path)
+        append_many = node.block_log.append_many
+        broken = [True]
+        def failing_append(block_dicts):
+            if broken[0]:
+                raise OSError("disk full")
+            return append_many(block_dicts)
+        node.block_log.append_many = failing_append
+
+        node.add_block("unsaved")
+        assert not node.flush(timeout=5)
+        assert node.saver.pending()
+        assert node.get_status()['storage']['write_behind']['last_error'] == "disk full"
+
+        broken[0] = False
+        assert node.flush(timeout=5)
+        broken[0] = True
+        node.add_block("also unsaved")
+        assert not node.close_storage()
+
+        reloaded = SimpleP2PNode(blockchain_file=path, write_behind=False)
+        assert [b.data for b in reloaded.blockchain[1:]] == ["unsaved"]
+        reloaded.stop()
+
+    # Without a worker thread flush saves itself, but never while holding the request lock
+    started, release = threading.Event(), threading.Event()
+    def slow_save():
+        started.set()
+        release.wait(5)
+    saver = WriteBehindSaver(slow_save)
+    saver.requested = 1
+    flusher = threading.Thread(target=saver.flush)
+    flusher.start()
+    assert started.wait(5)
+    marked = threading.Thread(target=saver.mark_dirty)
+    marked.start()
+    marked.join(timeout=1)
+    assert not marked.is_alive()
+    release.set()
+    flusher.join(timeout=5)
+    assert saver.stop() and saver.completed == saver.requested == 2
+
+    print("✅ Failed saves stay pending until they succeed!")
+
+def test_streaming_json_loader():
+    """Legacy documents are read member by member with bounded memory"""
+    print("\n🧪 Testing streaming loader...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'doc.json')
+        document = {'node_id': 'n', 'chain_length': 123456, 'blocks': [block(i) for i in range(25)],
+                    'nested': {'blocks': [1, 2]}, 'empty': [], 'flag': True}
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2)
+        for chunk_size in (1, 5, 4096):
+            members = list(iter_json_members(path, 'blocks', chunk_size))
+            assert [value for key, value in members if key == 'blocks'] == document['blocks']
+            assert {key: value for key, value in members if key != 'blocks'} == \
+                {key: value for key, value in document.items() if key != 'blocks'}
+
+        # ~3MB of blocks streamed without ever holding the document
+        big = os.path.join(tmp, 'big.json')
+        with open(big, 'w') as f:
+            json.dump({'node_id': 'n', 'blocks': [block(i, size=1000) for i in range(3000)]}, f)
+        tracemalloc.start()
+        count = sum(1 for key, _ in iter_json_members(big) if key == 'blocks')
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert count == 3000
+        assert peak < os.path.getsize(big) / 10
+
+        assert [len(batch) for batch in batched(range(2500), 1000)] == [1000, 1000, 500]
+
+    print("✅ Streaming loader keeps memory bounded!")
+
+def test_legacy_json_migration():
+    """Existing single-file chains are migrated on first load"""
+    print("\n🧪 Testing legacy migration...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'legacy.json')
+        node = SimpleP2PNode(blockchain_file=os.path.join(tmp, 'source.json'))
+        for i in range(5):
+            node.add_block(f"legacy {i}")
+        with open(path, 'w') as f:
+            json.dump({'blocks': [b.to_dict() for b in node.blockchain]}, f)
+
+        migrated = SimpleP2PNode(blockchain_file=path)
+        assert [b.hash for b in migrated.blockchain] == [b.hash for b in node.blockchain]
+        assert os.path.exists(os.path.join(tmp, 'legacy.blocks'))
+
+        poa_path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=poa_path)
+        chain.create_block({"type": "USER_REGISTRATION", "username": "alice"}, "GENESIS_AUTH")
+        chain.validate_block(1, "GENESIS_AUTH")
+        chain.create_block({"type": "USER_REGISTRATION", "username": "bob"}, "GENESIS_AUTH")
+        chain.save_blockchain()
+        chain.flush()
+
+        # Rebuild the old one-document layout from the saved state and blocks
+        with open(chain.store.state_file) as f:
+            legacy = json.load(f)
+        legacy['blocks'] = [b.to_dict() for b in chain.chain]
+        legacy_path = os.path.join(tmp, 'poa_legacy.json')
+        with open(legacy_path, 'w') as f:
+            json.dump(legacy, f)
+
+        for reload_path in (poa_path, legacy_path):
+            reloaded = PoABlockchain("N", "Node", blockchain_file=reload_path)
+            assert [b.hash for b in reloaded.chain] == [b.hash for b in chain.chain]
+            assert [b.hash for b in reloaded.pending_blocks] == [b.hash for b in chain.pending_blocks]
+            assert reloaded.authorities["GENESIS_AUTH"].blocks_validated == 1
+
+    print("✅ Legacy chains migrated and PoA state restored!")
+
+def test_sqlite_store_queries():
+    """The SQLite backend reloads the same chain and answers indexed queries"""
+    print("\n🧪 Testing SQLite PoA store...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chains = {}
+        for storage in (STORAGE_LOG, STORAGE_SQLITE):
+            path = os.path.join(tmp, f'{storage}.json')
+            chain = PoABlockchain("N", "Node", blockchain_file=path, storage=storage)
+            for i in range(12):
+                event = "USER_REGISTRATION" if i % 3 else "ORGANIZATION_JOIN"
+                chain.create_block({"type": event, "user_id": f"user{i % 4}"}, "GENESIS_AUTH")
+                chain.validate_block(i + 1, "GENESIS_AUTH")
+            chain.create_block({"type": "USER_REGISTRATION", "user_id": "pending"}, "GENESIS_AUTH")
+            chain.save_blockchain()
+            chain.close()
+            chains[storage] = PoABlockchain("N", "Node", blockchain_file=path, storage=storage)
+
+        log_chain, sql_chain = chains[STORAGE_LOG], chains[STORAGE_SQLITE]
+        assert os.path.exists(sql_chain.store.location)
+        assert len(sql_chain.chain) == 13 and len(sql_chain.pending_blocks) == 1
+        assert sql_chain.authorities["GENESIS_AUTH"].blocks_validated == 12
+        for storage_chain in (log_chain, sql_chain):
+            assert [b.index for b in storage_chain.find_blocks(user_id="user1")] == [2, 6, 10]
+            assert [b.index for b in storage_chain.find_blocks("ORGANIZATION_JOIN")] == [1, 4, 7, 10]
+            assert [b.index for b in storage_chain.find_blocks("ORGANIZATION_JOIN", user_id="user0")] == [1]
+            assert storage_chain.count_blocks("USER_REGISTRATION") == 8
+
+        tip = sql_chain.chain[-1]
+        assert sql_chain.store.get_block_by_hash(tip.hash)['index'] == tip.index
+        plan = sql_chain.store.connect().execute(
+            "EXPLAIN QUERY PLAN SELECT block_index FROM blocks WHERE data_type = ?", ("X",)).fetchall()
+        assert "idx_blocks_type" in str(plan)
+
+        # Block details come from the indexed row, not the chain held in memory
+        details = sql_chain.get_block_details(6)
+        assert details['block_info'] == sql_chain.store.get_block(6)
+        assert details['validation_info']['validators'] and details['validation_info']['is_finalized']
+        assert sql_chain.get_block_details(13) is None
+
+        # A reset store starts over at the requested position, like the log store
+        sql_chain.store.reset(20)
+        assert sql_chain.store.first_position() == sql_chain.store.stored_height() == 20
+        assert 'store_base' not in sql_chain.store.load_state()
+        log_chain.close()
+        sql_chain.close()
+
+    print("✅ SQLite store matches the log store with indexed queries!")
+
+def test_lazy_payload_loading():
+    """A lazily loaded chain holds headers only and serves data through a bounded LRU"""
+    print("\n🧪 Testing lazy payload loading...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in (STORAGE_LOG, STORAGE_SQLITE):
+            path = os.path.join(tmp, f'{storage}.json')
+            chain = PoABlockchain("N", "Node", blockchain_file=path, storage=storage, block_codec=CODEC_BINARY)
+            for i in range(300):
+                chain.create_block({"type": "USER_REGISTRATION", "user_id": f"user{i}",
+                                    "user_data": {"bio": "b" * 5000}}, "GENESIS_AUTH")
+                chain.validate_block(i + 1, "GENESIS_AUTH")
+            expected = [block.to_dict() for block in chain.chain]
+            chain.close()
+
+            tracemalloc.start()
+            eager = PoABlockchain("N", "Node", blockchain_file=path, storage=storage)
+            eager_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            eager.close()
+            del eager
+
+            tracemalloc.start()
+            lazy = PoABlockchain("N", "Node", blockchain_file=path, storage=storage,
+                                 lazy_payloads=True, payload_cache_size=16)
+            lazy_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            assert lazy_memory < eager_memory / 3
+            assert not any(block.is_loaded for block in lazy.chain)
+
+            assert [block.to_dict() for block in lazy.chain] == expected
+            assert lazy.chain[42].data['user_id'] == "user41"
+            assert lazy.chain[42].data['user_id'] == "user41"
+            stats = lazy.get_storage_stats()['payload_cache']
+            assert stats['cached'] == 16 and stats['hits'] == 1
+            assert [b.index for b in lazy.find_blocks(user_id="user7")] == [8]
+            assert lazy.count_blocks("USER_REGISTRATION") == 300
+
+            lazy.create_block({"type": "USER_REGISTRATION", "user_id": "late"}, "GENESIS_AUTH")
+            lazy.validate_block(301, "GENESIS_AUTH")
+            assert [b.index for b in lazy.find_blocks(user_id="late")] == [301]
+            lazy.close()
+            reopened = PoABlockchain("N", "Node", blockchain_file=path, storage=storage, lazy_payloads=True)
+            assert reopened.chain[-1].data['user_id'] == "late"
+            assert reopened.verify_chain().valid
+            reopened.close()
+
+    print("✅ Headers load eagerly, payloads on demand!")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+BLOCK VERIFICATION TEST
+Verify hashes are recomputed for Simple and PoA blocks, inline and in parallel
+"""
+
+import os
+import pickle
+import tempfile
+import time
+
+import pytest
+
+import simple_blockchain
+from block_store import log_base_for
+from block_verifier import verify_blocks, VerifierPool, PARALLEL_THRESHOLDS, _verify_chunk
+from segment_store import open_block_log
+from simple_blockchain import SimpleBlock, SimpleP2PNode
+from poa_blockchain import PoABlock, PoABlockchain
+
+def make_simple_chain(length: int):
+    """Build a linked list of SimpleBlock dicts"""
+    blocks = [SimpleBlock(0, "Genesis Block")]
+    for i in range(1, length):
+        blocks.append(SimpleBlock(i, f"payload {i}", blocks[-1].hash))
+    return [block.to_dict() for block in blocks]
+
+def make_poa_chain(length: int):
+    """Build a linked list of single-registration PoABlock dicts"""
+    blocks, previous_hash = [], "0"
+    for i in range(length):
+        block = PoABlock(i, {"type": "USER_REGISTRATION", "user_id": f"user{i}"}, previous_hash, "GENESIS_AUTH", "Genesis")
+        blocks.append(block.to_dict())
+        previous_hash = block.hash
+    return blocks
+
+CHAIN_BUILDERS = {'simple': make_simple_chain, 'poa': make_poa_chain}
+MIN_POOL_WORKERS = {'simple': 4, 'poa': 2}  # Fewer workers can't outrun pickling, whatever the batch size
+
+def best_time(run, repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def test_detects_tampered_blocks():
+    """A changed payload or hash is reported at the right position"""
+    print("🧪 Testing hash verification...")
+
+    chain = make_simple_chain(100)
+    assert verify_blocks(chain).valid
+
+    chain[42]['data'] = "tampered"
+    chain[77]['hash'] = "0" * 64
+    result = verify_blocks(chain)
+    assert result.invalid == [42, 77]
+    assert result.to_dict()['blocks_per_second'] > 0
+
+    poa = PoABlock(1, {"type": "USER_REGISTRATION", "username": "a"}, "0", "GENESIS_AUTH", "Genesis").to_dict()
+    assert verify_blocks([poa], kind='poa').valid
+    poa['creator_id'] = "IMPOSTOR"
+    assert not verify_blocks([poa], kind='poa').valid
+
+    print("✅ Tampered blocks detected!")
+
+def test_parallel_matches_inline():
+    """Chunked worker-pool verification finds exactly what inline does"""
+    print("\n🧪 Testing parallel verification...")
+
+    chain = make_simple_chain(3000)
+    for position in (5, 1500, 2999):
+        chain[position]['data'] += "!"
+
+    inline = verify_blocks(chain, workers=1)
+    processes = verify_blocks(chain, workers=3, chunk_size=400, parallel_threshold=1000)
+    threads = verify_blocks(chain, workers=3, chunk_size=400, parallel_threshold=1000, use_processes=False)
+    split = verify_blocks(chain, workers=4, parallel_threshold=1000, use_processes=False)  # one chunk per worker
+
+    assert inline.invalid == processes.invalid == threads.invalid == split.invalid == [5, 1500, 2999]
+    assert processes.workers == 3
+
+    # A shared pool is started once, on the first batch large enough to need it
+    with VerifierPool(workers=3, use_processes=False) as pool:
+        assert verify_blocks(chain[:500], parallel_threshold=1000, pool=pool).workers == 1
+        assert pool._executor is None
+        assert verify_blocks(chain, parallel_threshold=1000, pool=pool).invalid == [5, 1500, 2999]
+        executor = pool.executor()
+        assert verify_blocks(chain[:2000], parallel_threshold=1000, pool=pool).invalid == [5, 1500]
+        assert pool.executor() is executor
+    assert pool._executor is None
+
+    print("✅ Parallel verification agrees with inline!")
+
+def test_node_rejects_forged_chain():
+    """A longer chain with correct linkage but forged hashes is refused"""
+    print("\n🧪 Testing forged chain rejection...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        node = SimpleP2PNode(blockchain_file=os.path.join(tmp, 'n.json'))
+        forged = [node.blockchain[0].to_dict()]
+        for i in range(1, 10):
+            forged.append({'index': i, 'timestamp': 't', 'data': 'forged',
+                           'previous_hash': forged[-1]['hash'], 'hash': f"{i:064d}"})
+        node.update_blockchain(forged)
+        assert len(node.blockchain) == 1
+
+        chain = PoABlockchain("N", "Node", blockchain_file=os.path.join(tmp, 'poa.json'))
+        assert chain.verify_chain().valid
+        chain.chain[0].data = {"type": "GENESIS", "message": "rewritten"}
+        assert chain.verify_chain().invalid == [0]
+        chain.close()
+
+    print("✅ Forged chains rejected!")
+
+def test_node_load_stops_at_tampered_block():
+    """A node reloading its block log keeps only the blocks before the first forged one"""
+    print("\n🧪 Testing tampered block log on load...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'node.json')
+        node = SimpleP2PNode(blockchain_file=path)
+        for i in range(20):
+            node.add_block(f"payload {i}")
+        node.flush()
+        hashes = [b.hash for b in node.blockchain]
+        node.stop()
+
+        log = open_block_log(log_base_for(path))
+        blocks = list(log.iter_blocks(12))
+        log.truncate(12)
+        log.append_many([dict(blocks[0], data="forged")] + blocks[1:])
+        log.close()
+
+        reloaded = SimpleP2PNode(blockchain_file=path)
+        assert [b.hash for b in reloaded.blockchain] == hashes[:12]
+        reloaded.stop()
+
+    print("✅ Loading stopped at the tampered block!")
+
+def test_node_load_shares_one_pool(monkeypatch):
+    """Every batch of a simple chain load is verified with the same worker pool"""
+    print("\n🧪 Testing one verifier pool per load...")
+
+    pools = []
+    def recording_verify(batch, kind='simple', pool=None):
+        pools.append(pool)
+        return verify_blocks(batch, kind=kind, pool=pool)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'node.json')
+        node = SimpleP2PNode(blockchain_file=path)
+        for i in range(40):
+            node.add_block(f"payload {i}")
+        node.stop()
+
+        monkeypatch.setattr(simple_blockchain, 'DEFAULT_CHUNK_SIZE', 10)
+        monkeypatch.setattr(simple_blockchain, 'verify_blocks', recording_verify)
+        reloaded = SimpleP2PNode(blockchain_file=path)
+        assert len(reloaded.blockchain) == 41
+        reloaded.stop()
+
+    assert len(pools) == 5 and pools[0] is not None and all(pool is pools[0] for pool in pools)
+
+    print("✅ One pool served the whole load!")
+
+def test_pickling_cheaper_than_hashing():
+    """Shipping a block to a worker costs less than hashing it, by the margin the thresholds assume"""
+    print("\n🧪 Benchmarking per-block dispatch cost...")
+
+    for kind, build in CHAIN_BUILDERS.items():
+        blocks = build(5000)
+        hashing = best_time(lambda: _verify_chunk(kind, 0, blocks)) / len(blocks)
+        pickling = best_time(lambda: pickle.dumps(blocks, protocol=pickle.HIGHEST_PROTOCOL)) / len(blocks)
+        print(f"   {kind}: hash {hashing * 1e6:.2f}us, pickle {pickling * 1e6:.2f}us per block")
+        # Only the caller's share of the work runs serially; workers hash the rest in parallel
+        assert pickling < hashing * (1 - 1 / MIN_POOL_WORKERS[kind])
+
+    print("✅ Dispatch is cheaper than hashing!")
+
+def test_pool_pays_off_at_threshold():
+    """At each kind's threshold a freshly started pool is no slower than verifying inline"""
+    print("\n🧪 Benchmarking pooled against inline verification...")
+
+    cpus = os.cpu_count() or 1
+    kinds = [kind for kind in CHAIN_BUILDERS if cpus >= MIN_POOL_WORKERS[kind]]
+    if not kinds:
+        pytest.skip("a worker pool can't beat inline verification on one CPU")
+    for kind in kinds:
+        blocks = CHAIN_BUILDERS[kind](PARALLEL_THRESHOLDS[kind])
+        inline = best_time(lambda: verify_blocks(blocks, kind, workers=1))
+        pooled = best_time(lambda: verify_blocks(blocks, kind, workers=cpus))
+        print(f"   {kind} x{len(blocks)}: inline {inline * 1e3:.1f}ms, pooled {pooled * 1e3:.1f}ms on {cpus} workers")
+        assert pooled < inline * 1.2
+
+    print("✅ The pool pays off at the threshold!")
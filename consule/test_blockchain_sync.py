@@ -9,6 +9,7 @@ import json
 import time
 import threading
 import sys
+from p2p_protocol import send_message
 
 class BlockchainTester:
     def __init__(self):
@@ -37,7 +38,7 @@ class BlockchainTester:
                 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 sock.settimeout(5)
                 sock.connect((host, port))
-                sock.send(json.dumps(test_block).encode())
+                send_message(sock, test_block)
                 sock.close()
                 
                 print(f"📤 Sent test block to {node_name}: '{data}'")
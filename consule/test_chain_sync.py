@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+CHAIN SYNC PROTOCOL TEST
+Exercise node-to-node sync logic over an in-memory link (no sockets)
+"""
+
+import tempfile
+import threading
+import time
+
+import simple_blockchain
+from simple_blockchain import OrphanPool
+
+def test_headers_first_sync_in_batches(linked_node):
+    """A long chain is pulled in bounded header and block batches"""
+    print("🧪 Testing headers-first sync...")
+
+    old_headers, old_blocks = simple_blockchain.MAX_HEADERS_PER_MESSAGE, simple_blockchain.MAX_BLOCKS_PER_MESSAGE
+    simple_blockchain.MAX_HEADERS_PER_MESSAGE, simple_blockchain.MAX_BLOCKS_PER_MESSAGE = 50, 20
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = linked_node("source", tmp, persist=False)
+            fresh = linked_node("fresh", tmp, persist=False)
+            for i in range(180):
+                source.add_block(f"block {i}")
+            fresh.link(source)
+            verified = []
+            verify_block_hashes = fresh.verify_block_hashes
+            fresh.verify_block_hashes = lambda blocks: verified.append(len(blocks)) or verify_block_hashes(blocks)
+
+            fresh.send_to_peer("source", fresh.build_hello())
+
+            assert len(fresh.blockchain) == len(source.blockchain)
+            assert [b.hash for b in fresh.blockchain] == [b.hash for b in source.blockchain]
+            assert 'blockchain' not in source.sent_types
+            assert source.sent_types.count('headers') == 4
+            assert source.sent_types.count('blocks') == 11
+            assert verified == [50, 50, 50, 30]  # one verification per header window, not per message
+    finally:
+        simple_blockchain.MAX_HEADERS_PER_MESSAGE, simple_blockchain.MAX_BLOCKS_PER_MESSAGE = old_headers, old_blocks
+
+    print("✅ Chain synced in bounded batches!")
+
+def test_reconnect_transfers_only_suffix(linked_node):
+    """A node that is a few blocks behind only receives the missing blocks"""
+    print("\n🧪 Testing incremental resync...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = linked_node("source", tmp, persist=False)
+        follower = linked_node("follower", tmp, persist=False)
+        for i in range(300):
+            source.add_block(f"history {i} " + "p" * 100)
+        follower.blockchain = list(source.blockchain)
+        follower.rebuild_block_index()
+        for i in range(3):
+            source.add_block(f"new {i}")
+        follower.link(source)
+
+        follower.send_to_peer("source", follower.build_hello())
+
+        assert len(follower.blockchain) == 304
+        assert source.sent_bytes < 2000
+
+    print("✅ Only the missing suffix was transferred!")
+
+def test_inventory_gossip_multi_hop(linked_node):
+    """Blocks reach every node of a meshed topology, each body once per link"""
+    print("\n🧪 Testing inv/getdata gossip...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        nodes = [linked_node(f"n{i}", tmp, persist=False) for i in range(6)]
+        # Line n0-n1-n2-n3-n4-n5 plus shortcuts that create cycles
+        for a, b in [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (0, 2), (2, 5), (1, 4)]:
+            nodes[a].link(nodes[b])
+
+        for i in range(3):
+            nodes[i * 2].add_block(f"gossip {i}")
+
+        tip = nodes[0].blockchain[-1].hash
+        for node in nodes:
+            assert len(node.blockchain) == 4
+            assert node.blockchain[-1].hash == tip
+            for count in node.bodies_sent.values():
+                assert count <= 3
+
+        links = sum(len(node.links) for node in nodes) // 2
+        bodies = sum(sum(node.bodies_sent.values()) for node in nodes)
+        assert bodies == 3 * (len(nodes) - 1)
+        assert bodies <= 3 * links
+
+    print("✅ Every node received every block, no duplicate bodies!")
+
+def test_seen_cache_is_bounded(linked_node):
+    """The seen-hash LRU never grows past its limit"""
+    print("\n🧪 Testing seen-hash LRU bound...")
+
+    old_size = simple_blockchain.SEEN_CACHE_SIZE
+    simple_blockchain.SEEN_CACHE_SIZE = 10
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            node = linked_node("solo", tmp, persist=False)
+            for i in range(25):
+                node.add_block(f"b{i}")
+            assert len(node.seen_blocks) == 10
+            assert node.blockchain[-1].hash in node.seen_blocks
+            assert node.blockchain[1].hash not in node.seen_blocks
+    finally:
+        simple_blockchain.SEEN_CACHE_SIZE = old_size
+
+    print("✅ Seen cache stays bounded!")
+
+def test_fork_resolution_rolls_back_only_suffix(linked_node):
+    """A longer competing branch replaces just the divergent blocks"""
+    print("\n🧪 Testing fork resolution...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ours = linked_node("ours", tmp, persist=False)
+        theirs = linked_node("theirs", tmp, persist=False)
+        for i in range(500):
+            ours.add_block(f"shared {i}")
+        theirs.blockchain = list(ours.blockchain)
+        theirs.rebuild_block_index()
+        shared_tip = ours.blockchain[-1]
+
+        for i in range(3):
+            ours.add_block(f"our branch {i}")
+        for i in range(6):
+            theirs.add_block(f"their branch {i}")
+        doomed = [block.hash for block in ours.blockchain[-3:]]
+        kept = ours.blockchain[:501]
+
+        ours.link(theirs)
+        ours.send_to_peer("theirs", ours.build_hello())
+
+        assert len(ours.blockchain) == 507
+        assert [b.hash for b in ours.blockchain] == [b.hash for b in theirs.blockchain]
+        assert all(a is b for a, b in zip(ours.blockchain, kept))
+        assert ours.get_block_by_hash(shared_tip.hash) is shared_tip
+        assert all(ours.get_block_by_hash(h) is None for h in doomed)
+        assert len(ours.block_index) == len(ours.blockchain)
+        assert theirs.sent_bytes < 5000
+
+    print("✅ Fork resolved by rolling back only the divergent suffix!")
+
+def test_legacy_full_chain_reorg(linked_node):
+    """update_blockchain finds the common ancestor instead of rebuilding every block"""
+    print("\n🧪 Testing legacy full-chain reorg...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ours = linked_node("ours", tmp, persist=False)
+        theirs = linked_node("theirs", tmp, persist=False)
+        for i in range(50):
+            ours.add_block(f"shared {i}")
+        theirs.blockchain = list(ours.blockchain)
+        theirs.rebuild_block_index()
+        ours.add_block("orphaned")
+        for i in range(2):
+            theirs.add_block(f"winner {i}")
+        prefix = list(ours.blockchain[:51])
+
+        assert ours.find_common_ancestor([b.to_dict() for b in theirs.blockchain]) == 50
+        ours.update_blockchain([b.to_dict() for b in theirs.blockchain])
+
+        assert [b.hash for b in ours.blockchain] == [b.hash for b in theirs.blockchain]
+        assert all(a is b for a, b in zip(ours.blockchain, prefix))
+
+    print("✅ Legacy sync reorganized from the common ancestor!")
+
+def test_threaded_reorg_waits_for_local_block(linked_node):
+    """A peer reorg from another thread cannot land between add_block reading the tip and appending"""
+    print("\n🧪 Testing concurrent reorg...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ours = linked_node("ours", tmp, persist=False)
+        theirs = linked_node("theirs", tmp, persist=False)
+        for i in range(20):
+            ours.add_block(f"shared {i}")
+        theirs.blockchain = list(ours.blockchain)
+        theirs.rebuild_block_index()
+        for i in range(30):
+            theirs.add_block(f"branch {i}")
+        branch = theirs.dict_to_blocks([b.to_dict() for b in theirs.blockchain[21:]])
+
+        reorg = threading.Thread(target=ours.reorganize, args=(20, branch))
+        append_block = ours.append_block
+        def racing_append(block):
+            if reorg.ident is None:
+                reorg.start()
+                reorg.join(timeout=0.2)  # Without the chain lock the reorg finishes right here
+            append_block(block)
+        ours.append_block = racing_append
+
+        ours.add_block("local")
+        reorg.join()
+
+        assert [b.hash for b in ours.blockchain] == [b.hash for b in theirs.blockchain]
+        assert ours.block_index == {block.hash: height for height, block in enumerate(ours.blockchain)}
+
+    print("✅ Chain and index stayed in step!")
+
+def test_out_of_order_blocks_use_orphan_pool(linked_node):
+    """Block N+2 arriving before N+1 is held and connected when its parent lands"""
+    print("\n🧪 Testing orphan pool...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = linked_node("source", tmp, persist=False)
+        sink = linked_node("sink", tmp, persist=False)
+        for i in range(4):
+            source.add_block(f"ordered {i}")
+        blocks = [b.to_dict() for b in source.blockchain[1:]]
+
+        # Deliver 4, 3, 2 before 1
+        for block_dict in reversed(blocks[1:]):
+            sink.receive_block("nobody", block_dict)
+        assert len(sink.blockchain) == 1
+        assert sink.orphans.get_stats()['held'] == 3
+
+        sink.receive_block("nobody", blocks[0])
+        assert [b.hash for b in sink.blockchain] == [b.hash for b in source.blockchain]
+        stats = sink.get_status()['orphans']
+        assert stats == {'held': 0, 'bytes': 0, 'connected': 3, 'evicted': 0}
+
+    print("✅ Orphans connected as soon as their parent arrived!")
+
+def test_orphan_pool_limits_and_expiry():
+    """The pool evicts oldest entries beyond its count/byte limits and after expiry"""
+    print("\n🧪 Testing orphan pool limits...")
+
+    def orphan(i, size=10):
+        return {'index': i + 10, 'hash': f"h{i}", 'previous_hash': f"p{i}", 'timestamp': '', 'data': 'x' * size}
+
+    pool = OrphanPool(max_orphans=5, max_bytes=10000, expiry=60)
+    for i in range(8):
+        assert pool.add(orphan(i))
+    assert len(pool) == 5 and pool.evicted == 3
+    assert "h0" not in pool and "h7" in pool
+
+    pool = OrphanPool(max_orphans=100, max_bytes=1000, expiry=60)
+    for i in range(10):
+        pool.add(orphan(i, size=300))
+    assert pool.total_bytes <= 1000
+
+    pool = OrphanPool(expiry=60)
+    pool.add(orphan(1))
+    pool.expire(now=time.time() + 120)
+    assert len(pool) == 0 and pool.evicted == 1 and pool.total_bytes == 0
+
+    print("✅ Orphan pool stays bounded!")
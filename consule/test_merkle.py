@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+MERKLE ROOT AND INCLUSION PROOF TEST
+Transaction roots in PoA block hashes and proofs checked against headers
+"""
+
+import os
+import tempfile
+
+from merkle import transaction_hash, merkle_root, merkle_proof, verify_proof
+from block_verifier import verify_blocks
+from block_codec import CODEC_BINARY
+from poa_blockchain import PoABlockchain, PoABlock
+from poa_store import open_store
+from signing import block_message, validation_message
+
+def test_proofs_for_every_leaf(registration):
+    """Every leaf of every tree size proves into the root; altered proofs don't"""
+    print("🧪 Testing Merkle proofs...")
+
+    for size in range(1, 18):
+        leaves = [transaction_hash(registration(i)) for i in range(size)]
+        root = merkle_root(leaves)
+        for position in range(size):
+            proof = merkle_proof(leaves, position)
+            assert verify_proof(leaves[position], proof, root)
+            assert len(proof) <= size.bit_length()
+            if size > 1:
+                assert not verify_proof(transaction_hash(registration(99)), proof, root)
+                flipped = [dict(step, side='left' if step['side'] == 'right' else 'right') for step in proof]
+                assert not verify_proof(leaves[position], flipped, root)
+
+    # Order matters and the last leaf is not duplicated into a second valid tree
+    a, b, c = (transaction_hash(registration(i)) for i in range(3))
+    assert merkle_root([a, b]) != merkle_root([b, a])
+    assert merkle_root([a, b, c]) != merkle_root([a, b, c, c])
+    assert transaction_hash({'x': 1, 'y': 2}) == transaction_hash({'y': 2, 'x': 1})
+
+    print("✅ Proofs verify for every leaf!")
+
+def test_block_hash_commits_to_transactions(registration):
+    """A PoA block hash covers its Merkle root; tampering with any transaction is caught"""
+    print("\n🧪 Testing block commitments...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chain = PoABlockchain("N", "Node", blockchain_file=os.path.join(tmp, 'poa.json'),
+                              max_block_transactions=50, block_seal_interval=60)
+        for i in range(50):
+            chain.submit_transaction(registration(i), "GENESIS_AUTH")
+        chain.validate_block(1, "GENESIS_AUTH")
+        block = chain.chain[1]
+        assert PoABlock.header_hash(block.header()) == block.hash
+
+        block_dict = block.to_dict()
+        assert verify_blocks([block_dict], kind='poa').valid
+        tampered = dict(block_dict, data=dict(block_dict['data'], transactions=list(block_dict['data']['transactions'])))
+        tampered['data']['transactions'][17] = registration(1000)
+        assert not verify_blocks([tampered], kind='poa').valid
+        assert not verify_blocks([dict(block_dict, merkle_root='0' * 64)], kind='poa').valid
+
+        # Blocks hashed before Merkle roots existed still verify
+        legacy = {key: value for key, value in block_dict.items() if key != 'merkle_root'}
+        legacy['hash'] = PoABlock.compute_hash(legacy['index'], legacy['timestamp'], legacy['data'],
+                                               legacy['previous_hash'], legacy['creator_id'], legacy['created_at'])
+        assert verify_blocks([legacy], kind='poa').valid
+        assert PoABlock.from_dict(legacy).transaction_proof(0) is None
+        chain.close()
+
+    print("✅ Block hashes commit to every transaction!")
+
+def test_inclusion_proofs_against_headers(registration):
+    """A client checks one registration with a proof and the header, not the whole block"""
+    print("\n🧪 Testing inclusion proofs...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path, block_codec=CODEC_BINARY,
+                              max_block_transactions=100, block_seal_interval=60)
+        for i in range(250):
+            chain.submit_transaction(registration(i), "GENESIS_AUTH")
+        chain.seal_block("GENESIS_AUTH")
+        for block in list(chain.pending_blocks):
+            chain.validate_block(block.index, "GENESIS_AUTH")
+
+        proof = chain.get_transaction_proof(2, 42)
+        assert proof['transaction'] == registration(142)
+        assert 'data' not in proof['header'] and len(proof['proof']) <= 7
+        assert PoABlock.verify_transaction_proof(proof) and chain.verify_transaction_proof(proof)
+
+        forged = dict(proof, transaction=registration(9999))
+        assert not PoABlock.verify_transaction_proof(forged)
+        moved = dict(proof, header=dict(proof['header'], index=1))
+        assert not PoABlock.verify_transaction_proof(moved)
+        assert chain.get_transaction_proof(99, 0) is None
+        chain.close()
+
+        # Header-only loading checks header hashes and still serves proofs
+        lazy = PoABlockchain("N", "Node", blockchain_file=path, lazy_payloads=True)
+        assert all(not block.is_loaded for block in lazy.chain)
+        assert lazy.verify_transaction_proof(lazy.get_transaction_proof(3, 49))
+        assert lazy.get_transaction_proof(3, 49)['transaction'] == registration(249)
+        assert lazy.verify_transaction_proof(proof)
+        lazy.close()
+
+    print("✅ Inclusion proofs check out against headers!")
+
+def test_lazy_load_checks_legacy_blocks(registration):
+    """Blocks from before Merkle roots are hashed whole on a header-only load, so changed data is caught"""
+    print("\n🧪 Testing header-only loads of legacy blocks...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path)
+        for i in range(3):
+            chain.create_block(registration(i), "GENESIS_AUTH")
+            chain.validate_block(chain.pending_blocks[-1].index, "GENESIS_AUTH")
+        # Rewrite the tip the way blocks were stored before Merkle roots, signed again under its new hash
+        legacy = chain.chain[-1].to_dict()
+        del legacy['merkle_root']
+        legacy['hash'] = PoABlock.hash_from_dict(legacy)
+        legacy['signature'] = chain.sign_as("GENESIS_AUTH", block_message(legacy['hash']))
+        for validation in legacy['validations']:
+            validation['signature'] = chain.sign_as("GENESIS_AUTH", validation_message(legacy['hash']))
+        chain.close()
+
+        for data in (legacy['data'], registration(100)):
+            store = open_store(path)
+            store.block_log.truncate(legacy['index'])
+            store.append_blocks([dict(legacy, data=data)])
+            store.close()
+            lazy = PoABlockchain("N", "Node", blockchain_file=path, lazy_payloads=True)
+            if data is legacy['data']:
+                assert len(lazy.chain) == 4 and lazy.chain[-1].merkle_root is None
+            else:
+                assert len(lazy.chain) == 3
+            lazy.close()
+
+    print("✅ Legacy blocks verified from their stored data!")
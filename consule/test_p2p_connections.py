@@ -7,6 +7,7 @@ Test actual peer connections between blockchain nodes
 import socket
 import json
 import time
+from p2p_protocol import FrameReader, send_message
 
 def test_node_connection(host, port, node_name):
     """Test connection to a node and get its status"""
@@ -23,14 +24,14 @@ def test_node_connection(host, port, node_name):
             'blockchain_length': 0
         }
         
-        sock.send(json.dumps(hello_msg).encode())
+        send_message(sock, hello_msg)
         
         # Try to receive response (nodes might not respond to test clients)
         sock.settimeout(2)
         try:
-            response = sock.recv(1024).decode()
+            response = FrameReader().read_from(sock)
             if response:
-                print(f"✅ {node_name} responded: {response[:100]}...")
+                print(f"✅ {node_name} responded: {json.dumps(response[0])[:100]}...")
             else:
                 print(f"✅ {node_name} accepted connection (no response)")
         except socket.timeout:
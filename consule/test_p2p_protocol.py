@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+P2P WIRE PROTOCOL TEST
+Verify length-prefixed framing handles split, merged and oversized frames
+"""
+
+import os
+import socket
+import tempfile
+import time
+
+from p2p_protocol import FrameReader, FrameError, encode_message, HEADER_SIZE
+from simple_blockchain import (SimpleP2PNode, PeerSender, OVERFLOW_DROP_OLDEST,
+                               OVERFLOW_DROP_NEWEST, OVERFLOW_DISCONNECT)
+
+def test_split_and_merged_frames():
+    """Messages survive arbitrary TCP chunking"""
+    print("🧪 Testing frame reassembly...")
+
+    big = {'type': 'blockchain', 'blocks': [{'index': i, 'data': 'x' * 100} for i in range(200)]}
+    small = {'type': 'hello', 'node_id': 'a', 'blockchain_length': 1}
+    stream = encode_message(big) + encode_message(small) + encode_message(small)
+
+    reader = FrameReader()
+    received = []
+    for i in range(0, len(stream), 777):
+        received.extend(reader.feed(stream[i:i + 777]))
+
+    assert received == [big, small, small]
+    assert reader.pending_bytes() == 0
+
+    print("✅ Split and merged frames decoded correctly!")
+
+def test_oversized_frame_rejected():
+    """Frames above the limit are refused on both ends"""
+    print("\n🧪 Testing max frame guard...")
+
+    reader = FrameReader(max_frame_size=64)
+    frame = encode_message({'type': 'blockchain', 'blocks': ['y' * 200]})
+    try:
+        reader.feed(frame[:HEADER_SIZE])
+        assert False, "oversized frame accepted"
+    except FrameError:
+        pass
+
+    try:
+        encode_message({'data': 'z' * 200}, max_frame_size=64)
+        assert False, "oversized frame encoded"
+    except FrameError:
+        pass
+
+    print("✅ Oversized frames rejected!")
+
+def test_large_chain_sync(free_port):
+    """A chain far larger than one recv() reaches a fresh peer"""
+    print("\n🧪 Testing large blockchain sync...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port_a, port_b = free_port(), free_port()
+        node_a = SimpleP2PNode(port=port_a, blockchain_file=os.path.join(tmp, 'a.json'))
+        node_b = SimpleP2PNode(port=port_b, blockchain_file=os.path.join(tmp, 'b.json'))
+        node_a.save_blockchain = lambda: None
+        for i in range(50):
+            node_a.add_block(f"block payload {i} " + "d" * 200)
+
+        node_a.start()
+        node_b.start()
+        try:
+            assert node_b.connect_to_peer('localhost', port_a)
+            deadline = time.time() + 5
+            while time.time() < deadline and len(node_b.blockchain) != len(node_a.blockchain):
+                time.sleep(0.05)
+            assert len(node_b.blockchain) == len(node_a.blockchain)
+            assert node_b.blockchain[-1].hash == node_a.blockchain[-1].hash
+        finally:
+            node_a.stop()
+            node_b.stop()
+
+    print("✅ Large blockchain synced over framed protocol!")
+
+def test_send_queue_overflow_policies():
+    """A peer that never reads cannot block the sender"""
+    print("\n🧪 Testing bounded send queues...")
+
+    frame = encode_message({'type': 'blocks', 'blocks': ['q' * 4096]})
+    for policy in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_DISCONNECT):
+        ours, theirs = socket.socketpair()
+        ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        sender = PeerSender("stalled", ours, max_queue=8, overflow_policy=policy)
+        try:
+            start = time.time()
+            results = [sender.enqueue(frame) for _ in range(500)]
+            assert time.time() - start < 1.0
+            assert sender.depth() <= 8
+            if policy == OVERFLOW_DISCONNECT:
+                assert results[-1] is False
+            else:
+                assert all(results)
+                assert sender.dropped > 0
+        finally:
+            sender.close()
+            ours.close()
+            theirs.close()
+
+    print("✅ Send queues stay bounded under every policy!")
+
+def test_slow_peer_does_not_stall_broadcast(free_port):
+    """add_block returns promptly and the stalled peer is disconnected"""
+    print("\n🧪 Testing slow peer isolation...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        node = SimpleP2PNode(port=port, blockchain_file=os.path.join(tmp, 'n.json'), send_queue_size=4)
+        node.save_blockchain = lambda: None
+        node.start()
+        stalled = socket.create_connection(('localhost', port))
+        stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        try:
+            deadline = time.time() + 5
+            while time.time() < deadline and not node.peer_senders:
+                time.sleep(0.05)
+            assert len(node.peer_senders) == 1
+
+            start = time.time()
+            for i in range(2000):
+                node.add_block("s" * 2000)
+            assert time.time() - start < 10
+            assert node.get_status()['send_queue_depth'] == {}
+        finally:
+            stalled.close()
+            node.stop()
+
+    print("✅ Slow peer was dropped without stalling block creation!")
+
+def test_keepalive_rtt_and_eviction(free_port):
+    """Live peers report an RTT, silent peers are evicted"""
+    print("\n🧪 Testing keepalive ping/pong...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port_a, port_b = free_port(), free_port()
+        node_a = SimpleP2PNode(port=port_a, blockchain_file=os.path.join(tmp, 'a.json'),
+                               ping_interval=0.1, max_missed_pings=3)
+        node_b = SimpleP2PNode(port=port_b, blockchain_file=os.path.join(tmp, 'b.json'))
+        node_a.start()
+        node_b.start()
+        silent = None
+        try:
+            assert node_a.connect_to_peer('localhost', port_b)
+            peer_id = f"localhost:{port_b}"
+            deadline = time.time() + 5
+            while time.time() < deadline and node_a.get_status()['peer_rtt_ms'].get(peer_id) is None:
+                time.sleep(0.05)
+            assert node_a.get_status()['peer_rtt_ms'][peer_id] >= 0
+
+            # A raw client that never answers pings
+            silent = socket.create_connection(('localhost', port_a))
+            deadline = time.time() + 5
+            while time.time() < deadline and len(node_a.peer_senders) < 2:
+                time.sleep(0.05)
+            assert len(node_a.peer_senders) == 2
+            deadline = time.time() + 5
+            while time.time() < deadline and len(node_a.peer_senders) > 1:
+                time.sleep(0.05)
+            assert list(node_a.peer_senders) == [peer_id]
+        finally:
+            if silent:
+                silent.close()
+            node_a.stop()
+            node_b.stop()
+
+    print("✅ RTT measured and dead peer evicted!")
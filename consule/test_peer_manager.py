@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+PEER MANAGER TEST
+Verify reconnect with backoff, dial limits and peer discovery
+"""
+
+import os
+import tempfile
+import time
+
+from peer_manager import PeerManager
+from simple_blockchain import SimpleP2PNode
+
+def test_backoff_grows_and_caps():
+    """Backoff doubles per failure, stays within jitter bounds and is capped"""
+    print("🧪 Testing backoff schedule...")
+
+    class Dummy:
+        host, port, running = "localhost", 1, True
+
+    manager = PeerManager(Dummy(), base_backoff=1.0, max_backoff=30.0, jitter=0.2)
+    for failures, expected in [(1, 1.0), (2, 2.0), (3, 4.0), (5, 16.0), (10, 30.0)]:
+        for _ in range(20):
+            delay = manager.backoff_delay(failures)
+            assert expected * 0.8 <= delay <= expected * 1.2
+
+    print("✅ Backoff schedule correct!")
+
+def test_reconnects_after_neighbour_restart(free_port, wait_until):
+    """A dropped neighbour is redialed once it comes back"""
+    print("\n🧪 Testing reconnect after restart...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port_a, port_b = free_port(), free_port()
+        node_a = SimpleP2PNode(port=port_a, blockchain_file=os.path.join(tmp, 'a.json'))
+        node_a.start()
+        manager = PeerManager(node_a, base_backoff=0.1, max_backoff=0.3, check_interval=0.05)
+        manager.add_peer('localhost', port_b)
+        manager.start()
+        peer_id = f"localhost:{port_b}"
+        try:
+            # Neighbour is down: failures accumulate
+            assert wait_until(lambda: manager.known_peers[peer_id].failures >= 2)
+
+            node_b = SimpleP2PNode(port=port_b, blockchain_file=os.path.join(tmp, 'b.json'))
+            node_b.start()
+            assert wait_until(lambda: node_a.is_connected(peer_id))
+            assert wait_until(lambda: manager.known_peers[peer_id].failures == 0)
+
+            # Neighbour restarts
+            node_b.stop()
+            assert wait_until(lambda: not node_a.is_connected(peer_id))
+            node_b = SimpleP2PNode(port=port_b, blockchain_file=os.path.join(tmp, 'b.json'))
+            node_b.start()
+            assert wait_until(lambda: node_a.is_connected(peer_id))
+            node_b.stop()
+        finally:
+            node_a.stop()
+
+    print("✅ Peer reconnected without operator action!")
+
+def test_learns_peers_and_respects_target(free_port, wait_until):
+    """Addresses are learned via getaddr and outbound stays at the target"""
+    print("\n🧪 Testing peer discovery and outbound target...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ports = [free_port() for _ in range(4)]
+        nodes = [SimpleP2PNode(port=p, blockchain_file=os.path.join(tmp, f'{p}.json')) for p in ports]
+        for node in nodes:
+            node.start()
+        try:
+            # Hub knows everyone; the newcomer only knows the hub
+            hub = PeerManager(nodes[0], check_interval=0.05)
+            for p in ports[1:3]:
+                hub.add_peer('localhost', p)
+            newcomer = PeerManager(nodes[3], target_outbound=2, max_concurrent_dials=1, check_interval=0.05)
+            newcomer.add_peer('localhost', ports[0])
+            hub.start()
+            newcomer.start()
+
+            assert wait_until(lambda: len(newcomer.known_peers) >= 3)
+            assert wait_until(lambda: newcomer.outbound_count() == 2)
+            time.sleep(0.3)
+            assert newcomer.outbound_count() == 2
+            assert nodes[3].get_status()['peer_manager']['target_outbound'] == 2
+        finally:
+            for node in nodes:
+                node.stop()
+
+    print("✅ Peers learned and outbound target maintained!")
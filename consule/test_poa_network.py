@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+POA VALIDATION NETWORK TEST
+Authorities proposing to each other over TCP, concurrent proposals and timeouts
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from p2p_protocol import FrameReader, send_message, MAX_FRAME_SIZE
+from poa_blockchain import PoABlockchain
+from poa_network import PoANetworkNode, MAX_BLOCKS_PER_MESSAGE
+from signing import generate_keypair, hello_message, reject_message, sign
+from snapshot import chain_base
+from tx_pool import block_transactions
+
+def founding_chain(tmp: str, authorities: int):
+    """Chain with extra authorities granted and a quorum of two; returns their private keys too"""
+    chain = PoABlockchain("A", "Founder", blockchain_file=os.path.join(tmp, 'a.json'),
+                          max_block_transactions=50, block_seal_interval=0.1)
+    ids, keys = ["GENESIS_AUTH"], [None]
+    for i in range(authorities - 1):
+        private_key, public_key = generate_keypair()
+        chain.grant_authority(f"Authority {i}", public_key, f"localhost:{9000 + i}", "GENESIS_AUTH")
+        chain.validate_block(chain.pending_blocks[-1].index, "GENESIS_AUTH")
+        ids.append(chain.chain[-1].data['new_authority_id'])
+        keys.append(private_key)
+    chain.min_validations_required = 2
+    return chain, ids, keys
+
+def joining_chain(tmp: str, name: str, private_key: str = None):
+    chain = PoABlockchain(name, f"Node {name}", blockchain_file=os.path.join(tmp, f'{name.lower()}.json'),
+                          max_block_transactions=50, block_seal_interval=0.1)
+    if private_key:
+        chain.keyring.add(private_key)
+    return chain
+
+class RawPeer:
+    """A hand-driven connection to a PoA node"""
+    def __init__(self, port: int):
+        self.sock = socket.create_connection(("localhost", port), timeout=10)
+        self.reader = FrameReader()
+        self.inbox = []
+        self.challenge = None
+
+    def send(self, message):
+        send_message(self.sock, message)
+
+    def expect(self, message_type: str):
+        while not any(message.get('type') == message_type for message in self.inbox):
+            self.inbox.extend(self.reader.read_from(self.sock) or [])
+        message = next(message for message in self.inbox if message.get('type') == message_type)
+        self.inbox.remove(message)
+        return message
+
+    def claim(self, authority_id: str, private_key: str):
+        """Hello as authority_id, answering the node's challenge with private_key"""
+        if self.challenge is None:
+            self.send({'type': 'hello', 'node_id': 'raw', 'authority_id': authority_id, 'chain_length': 0,
+                       'genesis_hash': None, 'challenge': 'x'})
+            self.challenge = self.expect('hello')['challenge']
+        self.send({'type': 'auth', 'authority_id': authority_id,
+                   'signature': sign(private_key, hello_message(self.challenge))})
+
+    def reject(self, block, authority_id: str, signature):
+        self.send({'type': 'reject', 'block_index': block['index'], 'block_hash': block['hash'],
+                   'validator_id': authority_id, 'reason': "forged", 'signature': signature})
+
+def chain_transactions(chain):
+    return [tx.get('user_id') for block in chain.chain for tx in block_transactions(block.data)
+            if tx.get('type') == 'USER_REGISTRATION']
+
+def test_authorities_finalize_each_others_blocks(wait_until, registration):
+    """Three authorities and an observer converge on one chain holding every event exactly once"""
+    print("🧪 Testing networked validation...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        founder, ids, keys = founding_chain(tmp, 3)
+        chains = [founder, joining_chain(tmp, "B", keys[1]), joining_chain(tmp, "C", keys[2]),
+                  joining_chain(tmp, "D")]
+        nodes = [PoANetworkNode(chain, authority, host="localhost", port=0, proposal_timeout=5.0)
+                 for chain, authority in zip(chains, ids + [None])]
+        try:
+            for node in nodes:
+                assert node.start()
+            # New nodes join through the founder's snapshot, then everyone meshes
+            for node in nodes[1:]:
+                assert node.connect_to_peer("localhost", nodes[0].port)
+                assert wait_until(lambda: len(node.chain.chain) == len(founder.chain), timeout=30)
+            assert nodes[2].connect_to_peer("localhost", nodes[1].port)
+            assert all(chain.min_validations_required == 2 for chain in chains)
+            assert set(chains[1].authorities) == set(ids)
+
+            submitted = []
+            for i in range(150):
+                for node, name in zip(nodes[:3], "ABC"):
+                    assert node.submit(registration(i, name))
+                    submitted.append(f"{name}-user{i}")
+            assert not nodes[3].submit(registration(0, "D"))  # observers don't create blocks
+
+            assert wait_until(lambda: all(sorted(chain_transactions(chain)) == sorted(submitted) for chain in chains),
+                              timeout=60)
+            assert wait_until(lambda: len({chain.chain[-1].hash for chain in chains}) == 1, timeout=30)
+            for chain in chains:
+                assert [b.hash for b in chain.chain] == [b.hash for b in founder.chain[chain_base(chain.chain):]]
+                assert chain.verify_chain()
+            for block in founder.chain[3:]:
+                assert len({v.validator_id for v in block.validations}) >= 2 and block.signature
+            creators = {block.creator_id for block in founder.chain[3:]}
+            assert len(creators) >= 2, "blocks should come from more than one authority"
+
+            stats = [node.get_stats() for node in nodes]
+            assert sum(s['finalized'] for s in stats) == len(founder.chain) - 3
+            assert all(s['validations_sent'] > 0 for s in stats[:3])
+            assert stats[3]['blocks_received'] > 0 and stats[3]['validations_sent'] == 0
+        finally:
+            for node in nodes:
+                node.stop()
+            for chain in chains:
+                chain.close()
+
+    print("✅ Authorities finalized each other's blocks!")
+
+def test_unanswered_proposals_time_out(wait_until, registration):
+    """Without enough validators proposals time out and their events go back to the pool"""
+    print("\n🧪 Testing proposal timeouts...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        founder, ids, _ = founding_chain(tmp, 2)
+        height = len(founder.chain)
+        node = PoANetworkNode(founder, "GENESIS_AUTH", host="localhost", port=0,
+                              proposal_timeout=0.3, max_outstanding=4)
+        try:
+            assert node.start()
+            for i in range(120):
+                node.submit(registration(i, "A"))
+            assert wait_until(lambda: node.get_stats()['timeouts'] >= 2, timeout=15)
+            stats = node.get_stats()
+            assert stats['outstanding'] <= 4 and stats['abandoned'] >= 2
+            assert len(founder.chain) == height
+        finally:
+            node.stop()
+
+        # Every event is still either pooled or pending, none lost or duplicated
+        pending = [tx['user_id'] for block in founder.pending_blocks for tx in block_transactions(block.data)]
+        pooled = [tx['user_id'] for tx in founder.tx_pool.pending()]
+        assert sorted(pending + pooled) == sorted(f"A-user{i}" for i in range(120))
+        founder.close()
+
+    print("✅ Timed-out proposals returned their events to the pool!")
+
+def test_forged_rejections_ignored(wait_until, registration):
+    """Only authorities that proved their key can reject a proposal, and only with a signed rejection"""
+    print("\n🧪 Testing forged rejections...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        founder, ids, keys = founding_chain(tmp, 3)
+        node = PoANetworkNode(founder, "GENESIS_AUTH", host="localhost", port=0, proposal_timeout=30.0)
+        peers = []
+        try:
+            assert node.start()
+            # One peer claims an authority without its key, the other holds its key but doesn't sign
+            impostor, holder = RawPeer(node.port), RawPeer(node.port)
+            peers += [impostor, holder]
+            impostor.claim(ids[1], generate_keypair()[0])
+            holder.claim(ids[2], keys[2])
+            assert wait_until(lambda: node.get_stats()['authority_peers'] == 1, timeout=30)
+
+            assert node.submit(registration(0, "A"))
+            block = impostor.expect('propose')['block']
+            holder.expect('propose')
+            impostor.reject(block, ids[1], sign(keys[1], reject_message(block['hash'])))
+            holder.reject(block, ids[2], None)
+            holder.reject(block, ids[2], sign(keys[1], reject_message(block['hash'])))
+            time.sleep(0.5)
+            assert node.get_stats()['outstanding'] == 1 and node.get_stats()['abandoned'] == 0
+
+            # Signed rejections from two proven authorities leave the block short of its quorum
+            impostor.claim(ids[1], keys[1])
+            assert wait_until(lambda: node.get_stats()['authority_peers'] == 2, timeout=30)
+            holder.reject(block, ids[2], sign(keys[2], reject_message(block['hash'])))
+            impostor.reject(block, ids[1], sign(keys[1], reject_message(block['hash'])))
+            assert wait_until(lambda: node.get_stats()['abandoned'] == 1, timeout=30)
+        finally:
+            for peer in peers:
+                peer.sock.close()
+            node.stop()
+            founder.close()
+
+    print("✅ Forged rejections ignored!")
+
+def test_snapshot_tail_larger_than_a_frame(wait_until, registration):
+    """A joiner whose snapshot is followed by more blocks than one frame holds fetches the rest with getblocks"""
+    print("\n🧪 Testing a long snapshot tail...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        founder = PoABlockchain("A", "Founder", blockchain_file=os.path.join(tmp, 'a.json'))
+        padding = "x" * 80000
+        for i in range(MAX_BLOCKS_PER_MESSAGE + 100):
+            founder.create_block(dict(registration(i, "A"), bio=padding), "GENESIS_AUTH")
+            founder.validate_block(founder.pending_blocks[-1].index, "GENESIS_AUTH")
+            if i == 0:
+                founder.create_snapshot(2)
+        assert len(founder.chain) * len(padding) > MAX_FRAME_SIZE
+        joiner = joining_chain(tmp, "B")
+        nodes = [PoANetworkNode(chain, None, host="localhost", port=0) for chain in (founder, joiner)]
+        try:
+            for node in nodes:
+                assert node.start()
+            assert nodes[1].connect_to_peer("localhost", nodes[0].port)
+            assert wait_until(lambda: len(joiner.chain) == len(founder.chain), timeout=60)
+            assert joiner.chain[-1].hash == founder.chain[-1].hash
+            assert nodes[0].get_stats()['peers'] == 1
+        finally:
+            for node in nodes:
+                node.stop()
+            founder.close()
+            joiner.close()
+
+    print("✅ Long snapshot tail fetched in pieces!")
+
+def test_slow_bootstrap_runs_off_the_loop(wait_until, registration):
+    """While a snapshot is being verified and installed the node keeps answering on its event loop"""
+    print("\n🧪 Testing bootstrap off the event loop...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        founder = PoABlockchain("A", "Founder", blockchain_file=os.path.join(tmp, 'a.json'))
+        for i in range(5):
+            founder.create_block(registration(i, "A"), "GENESIS_AUTH")
+            founder.validate_block(founder.pending_blocks[-1].index, "GENESIS_AUTH")
+        joiner = joining_chain(tmp, "B")
+        started, finished = threading.Event(), threading.Event()
+        bootstrap = joiner.bootstrap_from_snapshot
+        def slow_bootstrap(*args):
+            started.set()
+            time.sleep(1.0)
+            installed = bootstrap(*args)
+            time.sleep(0.5)  # Still running when the chain below already matches
+            finished.set()
+            return installed
+        joiner.bootstrap_from_snapshot = slow_bootstrap
+
+        nodes = [PoANetworkNode(chain, None, host="localhost", port=0) for chain in (founder, joiner)]
+        try:
+            for node in nodes:
+                assert node.start()
+            assert nodes[1].connect_to_peer("localhost", nodes[0].port)
+            assert started.wait(10)
+            begin = time.time()
+            assert nodes[1].get_stats()['peers'] == 1
+            assert time.time() - begin < 0.5
+            assert wait_until(lambda: len(joiner.chain) == len(founder.chain))
+            assert joiner.chain[-1].hash == founder.chain[-1].hash
+        finally:
+            for node in nodes:
+                node.stop()
+            # Stopping waits for chain work handed off the loop before the chain is closed
+            assert finished.is_set()
+            founder.close()
+            joiner.close()
+
+    print("✅ The loop kept serving during the bootstrap!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+POA PENDING PIPELINE TEST
+Many blocks in flight, out-of-order validations and in-order finalization
+"""
+
+import os
+import tempfile
+
+from poa_blockchain import PoABlockchain
+
+def test_blocks_chain_off_pending_tip(registration):
+    """Blocks created before any is finalized get consecutive indexes and parents"""
+    print("🧪 Testing pending block chaining...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chain = PoABlockchain("N", "Node", blockchain_file=os.path.join(tmp, 'poa.json'))
+        for i in range(5):
+            assert chain.create_block(registration(i), "GENESIS_AUTH")
+
+        pending = list(chain.pending_blocks)
+        assert [block.index for block in pending] == [1, 2, 3, 4, 5]
+        assert pending[0].previous_hash == chain.chain[0].hash
+        for parent, child in zip(pending, pending[1:]):
+            assert child.previous_hash == parent.hash
+        assert chain.pending_blocks.get(3) is pending[2]
+        assert chain.pending_blocks.find(pending[4].hash) is pending[4]
+        assert chain.pending_blocks[-1].index == 5
+        chain.close()
+
+    print("✅ Pending blocks form a pipeline!")
+
+def test_out_of_order_validation(registration):
+    """Validations arriving out of order still finalize blocks in index order"""
+    print("\n🧪 Testing out-of-order validation...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path)
+        for i in range(6):
+            chain.create_block(registration(i), "GENESIS_AUTH")
+
+        for index in (4, 3, 6):
+            assert chain.validate_block(index, "GENESIS_AUTH")
+        assert len(chain.chain) == 1 and len(chain.pending_blocks) == 6
+        assert not chain.validate_block(4, "GENESIS_AUTH")  # already validated
+
+        # Validating the head releases every validated block queued behind it
+        chain.validate_block(1, "GENESIS_AUTH")
+        assert [block.index for block in chain.chain] == [0, 1]
+        chain.validate_block(2, "GENESIS_AUTH")
+        assert [block.index for block in chain.chain] == [0, 1, 2, 3, 4]
+        assert chain.pending_blocks.head().index == 5
+        assert chain.get_authority_stats()['pipeline']['finalized'] == 4
+
+        # New blocks keep extending the pipeline, not the finalized tip
+        chain.create_block(registration(6), "GENESIS_AUTH")
+        assert chain.pending_blocks.tip().index == 7
+        assert chain.verify_chain().valid
+        chain.close()
+
+        # The pipeline survives a restart
+        reloaded = PoABlockchain("N", "Node", blockchain_file=path)
+        assert [block.index for block in reloaded.pending_blocks] == [5, 6, 7]
+        reloaded.validate_block(5, "GENESIS_AUTH")
+        assert len(reloaded.chain) == 7 and reloaded.chain[-1].previous_hash == reloaded.chain[-2].hash
+        reloaded.close()
+
+    print("✅ Blocks finalized in order!")
+
+def test_stale_pending_blocks_dropped_on_load(registration):
+    """Pending blocks saved by older versions that don't extend the chain are dropped"""
+    print("\n🧪 Testing stale pending blocks...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path, write_behind=False)
+        chain.create_block(registration(0), "GENESIS_AUTH")
+        chain.create_block(registration(1), "GENESIS_AUTH")
+        # Simulate the old behaviour: a second block on the same parent and index
+        clash = chain.pending_blocks.tip()
+        clash.previous_hash = chain.chain[-1].hash
+        clash.index = 1
+        chain.write_blockchain()
+        chain.close()
+
+        reloaded = PoABlockchain("N", "Node", blockchain_file=path)
+        assert [block.index for block in reloaded.pending_blocks] == [1]
+        reloaded.close()
+
+    print("✅ Stale pending blocks dropped!")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+SEGMENTED STORAGE TEST
+Segment rotation, rollback, archival, pruning and node integration
+"""
+
+import gzip
+import os
+import tempfile
+
+from block_store import BlockLog
+from segment_store import (SegmentedBlockLog, ArchivedSegment, PrunedBlockError, open_block_log,
+                           restart_block_log, write_archive)
+from simple_blockchain import SimpleP2PNode
+from poa_blockchain import PoABlockchain
+
+def block(i: int, size: int = 100):
+    return {'index': i, 'timestamp': 't', 'data': 'x' * size, 'previous_hash': f"{i - 1:064x}", 'hash': f"{i:064x}"}
+
+def segment_files(log: SegmentedBlockLog):
+    return sorted(name for name in os.listdir(log.dir) if name.endswith('.blocks'))
+
+def test_rotation_and_replay():
+    """Appends fill fixed-size segments; reads and replay span them transparently"""
+    print("🧪 Testing segment rotation...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, 'chain')
+        log = SegmentedBlockLog(base, segment_size=2000)
+        for start in range(0, 200, 25):
+            log.append_many([block(i) for i in range(start, start + 25)])
+
+        files = segment_files(log)
+        assert len(files) > 10 and log.rotations == len(files) - 1
+        for name in files:
+            assert os.path.getsize(os.path.join(log.dir, name)) <= 2000
+        assert log.read(123) == block(123)
+        log.close()
+
+        log = SegmentedBlockLog(base, segment_size=2000)
+        assert len(log) == 200
+        assert list(log.iter_blocks()) == [block(i) for i in range(200)]
+        assert [h['index'] for h in log.iter_headers(195)] == [195, 196, 197, 198, 199]
+        assert log.get_stats()['segments'] == len(files)
+
+        # An oversized record still gets written, alone in its own segment
+        log.append(block(200, size=5000))
+        assert log.read(200) == block(200, size=5000)
+        log.append(block(201))
+        assert len(segment_files(log)) == len(files) + 2
+        log.close()
+
+    print("✅ Segments rotate at the size limit!")
+
+def test_rollback_across_segments():
+    """Truncation and sync_chain drop whole segments past the fork point"""
+    print("\n🧪 Testing rollback across segments...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = SegmentedBlockLog(os.path.join(tmp, 'chain'), segment_size=2000)
+        log.append_many([block(i) for i in range(100)])
+        before = len(segment_files(log))
+
+        hashes = [block(i)['hash'] for i in range(40)] + ['f' * 64] * 10
+        assert log.sync_chain(hashes) == 40
+        assert len(log) == 40 and len(segment_files(log)) < before
+        log.append_many([block(i) for i in range(40, 60)])
+        log.close()
+
+        log = SegmentedBlockLog(os.path.join(tmp, 'chain'), segment_size=2000)
+        assert list(log.iter_blocks()) == [block(i) for i in range(60)]
+        log.close()
+
+    print("✅ Rollback removed only the divergent segments!")
+
+def test_archive_and_prune():
+    """Sealed segments compress into the archive and stay readable; pruned ones are gone"""
+    print("\n🧪 Testing archival and pruning...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, 'chain')
+        archive = os.path.join(tmp, 'cold')
+        log = SegmentedBlockLog(base, segment_size=4000, archive_dir=archive)
+        log.append_many([block(i, size=300) for i in range(150)])
+        hot_bytes = log.get_stats()['data_bytes']
+
+        archived = log.archive_segments(100)
+        assert archived > 0
+        assert all(name.endswith(('.blocks.gz', '.frames', '.idx')) for name in os.listdir(archive))
+        assert log.get_stats()['data_bytes'] < hot_bytes
+        assert log.read(3) == block(3, size=300)
+        try:
+            log.truncate(5)
+            assert False, "rolled back into an archived segment"
+        except ValueError:
+            pass
+        log.close()
+
+        log = SegmentedBlockLog(base, segment_size=4000, archive_dir=archive)
+        assert list(log.iter_blocks()) == [block(i, size=300) for i in range(150)]
+        assert log.get_stats()['archived_segments'] == archived
+
+        pruned = log.prune_segments(120)
+        first = log.first_position
+        assert pruned > 0 and 0 < first <= 120
+        try:
+            log.read(0)
+            assert False, "read a pruned block"
+        except PrunedBlockError:
+            pass
+        assert log.read(first) == block(first, size=300)
+        assert len(log) == 150
+        log.append(block(150, size=300))
+        log.close()
+
+        log = SegmentedBlockLog(base, segment_size=4000, archive_dir=archive)
+        assert log.first_position == first and len(log) == 151
+        assert list(log.iter_blocks(first))[-1] == block(150, size=300)
+        log.close()
+
+    print("✅ Old segments archived and pruned!")
+
+def test_archive_frames():
+    """Archived segments decompress one frame per read; older single-stream archives still read"""
+    print("\n🧪 Testing archive frames...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = BlockLog(os.path.join(tmp, 'segment'))
+        blocks = [block(i, size=300) for i in range(60)] + [block(60, size=5000), block(61, size=300)]
+        source.append_many(blocks)
+        source.close()
+
+        write_archive(os.path.join(tmp, 'segment'), os.path.join(tmp, 'framed'), frame_size=2000)
+        archived = ArchivedSegment(os.path.join(tmp, 'framed'))
+        assert len(archived.frames) > 10
+        assert [archived.read(i) for i in reversed(range(len(blocks)))] == blocks[::-1]
+        archived.read(30)
+        assert len(archived.frame[2]) <= 2000  # only the frame holding block 30 is in memory
+        archived.read(60)
+        assert len(archived.frame[2]) > 5000  # an oversized record gets a frame of its own
+        archived.close()
+
+        # A segment compressed as one gzip stream (no .frames table) is one big frame
+        with open(os.path.join(tmp, 'segment.blocks'), 'rb') as src, \
+                gzip.open(os.path.join(tmp, 'whole.blocks.gz'), 'wb') as dst:
+            dst.write(src.read())
+        os.replace(os.path.join(tmp, 'segment.idx'), os.path.join(tmp, 'whole.idx'))
+        whole = ArchivedSegment(os.path.join(tmp, 'whole'))
+        assert len(whole.frames) == 1 and list(map(whole.read, range(len(blocks)))) == blocks
+        whole.close()
+
+        # A single-file log restarted from a snapshot keeps the node's segment size and archive
+        log = BlockLog(os.path.join(tmp, 'node'))
+        log.append_many(blocks[:5])
+        log = restart_block_log(log, 40, segment_size=3000, archive_dir=os.path.join(tmp, 'cold'))
+        log.append_many(blocks[40:])
+        assert log.segment_size == 3000 and log.archive_dir == os.path.join(tmp, 'cold')
+        assert log.archive_segments(55) > 0 and os.listdir(os.path.join(tmp, 'cold'))
+        assert list(log.iter_blocks(40)) == blocks[40:]
+        log.close()
+
+    print("✅ Archives read one frame at a time!")
+
+def test_single_file_log_adopted():
+    """An existing single-file log becomes the first segment; later opens stay segmented"""
+    print("\n🧪 Testing single-file log adoption...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, 'chain')
+        single = BlockLog(base)
+        single.append_many([block(i) for i in range(30)])
+        single.close()
+
+        log = open_block_log(base, segment_size=2000)
+        assert isinstance(log, SegmentedBlockLog)
+        log.append_many([block(i) for i in range(30, 60)])
+        assert not os.path.exists(base + '.blocks')
+        log.close()
+
+        log = open_block_log(base)
+        assert isinstance(log, SegmentedBlockLog)
+        assert list(log.iter_blocks()) == [block(i) for i in range(60)]
+        log.close()
+
+    print("✅ Single-file log adopted as a segment!")
+
+def test_nodes_on_segmented_storage():
+    """Both node types reload segmented chains and archive old segments"""
+    print("\n🧪 Testing nodes on segmented storage...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'simple.json')
+        node = SimpleP2PNode(blockchain_file=path, segment_size=1500)
+        for i in range(60):
+            node.add_block(f"segmented {i}")
+        assert node.archive_segments(keep_recent=10) > 0
+        hashes = [b.hash for b in node.blockchain]
+        node.close_storage()
+
+        reloaded = SimpleP2PNode(blockchain_file=path)
+        assert [b.hash for b in reloaded.blockchain] == hashes
+        assert reloaded.get_status()['storage']['archived_segments'] > 0
+        reloaded.close_storage()
+
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path, segment_size=3000)
+        for i in range(40):
+            chain.create_block({"type": "USER_REGISTRATION", "user_id": f"user{i}"}, "GENESIS_AUTH")
+            chain.validate_block(i + 1, "GENESIS_AUTH")
+        assert chain.archive_segments() > 0
+        chain.close()
+
+        reloaded = PoABlockchain("N", "Node", blockchain_file=path, lazy_payloads=True)
+        assert len(reloaded.chain) == 41
+        assert reloaded.chain[1].data['user_id'] == "user0"
+        assert reloaded.verify_chain().valid
+        reloaded.close()
+
+    print("✅ Nodes run on segmented storage!")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+BLOCK SIGNATURE TEST
+Ed25519 signing of blocks and validations, forged signature rejection and the verified cache
+"""
+
+import os
+import tempfile
+
+import pytest
+
+import signing
+from signing import (generate_keypair, public_key_for, sign, verify, block_message, validation_message,
+                     SignatureVerifier, SigningUnavailableError)
+from poa_blockchain import PoABlockchain
+from poa_store import open_store
+
+def test_ed25519_signatures():
+    """RFC 8032 test vectors, and altered messages, signatures or keys fail"""
+    print("🧪 Testing Ed25519 signatures...")
+
+    vectors = [
+        ("9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60",
+         "d75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a", b"",
+         "e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e065224901555fb8821590a33bacc61e39701cf9b46b"
+         "d25bf5f0595bbe24655141438e7a100b"),
+        ("4ccd089b28ff96da9db6c346ec114e0f5b8a319f35aba624da8cf6ed4fb8a6fb",
+         "3d4017c3e843895a92b70aa74d1b7ebc9c982ccf2ec4968cc0cd55f12af4660c", bytes([0x72]),
+         "92a009a9f0d4cab8720e820b5f642540a2b27b5416503f8fb3762223ebdb69da085ac1e43e15996e458f3613d0f11d8c"
+         "387b2eaeb4302aeeb00d291612bb0c00"),
+    ]
+    for private_key, public_hex, message, signature in vectors:
+        public_key = public_key_for(private_key)
+        assert public_key == "ed25519:" + public_hex
+        assert sign(private_key, message) == signature
+        assert verify(public_key, message, signature)
+        assert not verify(public_key, message + b"x", signature)
+        assert not verify(public_key, message, ("0" if signature[0] != "0" else "1") + signature[1:])
+        assert not verify(generate_keypair()[1], message, signature)
+        assert not verify(public_key, message, "SIG_0123456789abcdef")
+        assert not verify("GENESIS_PUBLIC_KEY", message, signature)
+
+    # A creator's signature can't be passed off as a validation
+    private_key, public_key = generate_keypair()
+    assert not verify(public_key, validation_message("ab" * 32), sign(private_key, block_message("ab" * 32)))
+
+    print("✅ Ed25519 signatures check out!")
+
+def test_verification_only_without_cryptography(monkeypatch):
+    """Without the cryptography library nothing is signed, but signatures still verify"""
+    print("\n🧪 Testing verification without cryptography...")
+
+    private_key, public_key = generate_keypair()
+    signature = sign(private_key, block_message("ab" * 32))
+    monkeypatch.setattr(signing, "CRYPTOGRAPHY_AVAILABLE", False)
+    for make in (generate_keypair, lambda: public_key_for(private_key),
+                 lambda: sign(private_key, block_message("ab" * 32))):
+        with pytest.raises(SigningUnavailableError):
+            make()
+    assert verify(public_key, block_message("ab" * 32), signature)
+    assert not verify(public_key, block_message("cd" * 32), signature)
+
+    print("✅ Signatures verify without cryptography!")
+
+def test_forged_signatures_rejected(registration):
+    """Blocks and validations must carry their authority's signature"""
+    print("\n🧪 Testing forged signature rejection...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chain = PoABlockchain("A", "Node A", blockchain_file=os.path.join(tmp, 'a.json'))
+        private_key, public_key = generate_keypair()
+        chain.grant_authority("Authority B", public_key, "localhost:9001", "GENESIS_AUTH")
+        chain.validate_block(1, "GENESIS_AUTH")
+        authority_b = chain.chain[1].data['new_authority_id']
+        chain.min_validations_required = 2
+
+        # We don't hold B's key, so we can't sign as B
+        assert not chain.create_block(registration(0), authority_b)
+        assert chain.create_block(registration(0), "GENESIS_AUTH")
+        block = chain.pending_blocks[-1]
+        assert chain.validate_block(block.index, "GENESIS_AUTH")
+        forged = sign(generate_keypair()[0], validation_message(block.hash))
+        assert not chain.validate_block(block.index, authority_b, forged)
+        assert not chain.validate_block(block.index, authority_b)
+        assert chain.validate_block(block.index, authority_b, sign(private_key, validation_message(block.hash)))
+        assert chain.chain[-1].hash == block.hash and chain.verify_chain().valid
+
+        # A peer's finalized block needs a good creator signature and a quorum of good validations
+        peer = PoABlockchain("B", "Node B", blockchain_file=os.path.join(tmp, 'b.json'))
+        peer.keyring.add(private_key)
+        assert peer.bootstrap_from_snapshot(chain.create_snapshot(2).to_dict(), [chain.chain[2].to_dict()])
+        assert peer.create_block(registration(1), authority_b)
+        assert peer.validate_block(3, authority_b)
+        candidate = peer.pending_blocks[-1]
+        candidate.add_validation("GENESIS_AUTH", "Genesis Authority", "SIG_forged")
+        candidate.is_finalized = True
+        assert not chain.accept_finalized_block(candidate.to_dict())
+        assert not chain.accept_finalized_block(dict(candidate.to_dict(), signature=None))
+        candidate.validations[-1].signature = chain.sign_as("GENESIS_AUTH", validation_message(candidate.hash))
+        assert chain.accept_finalized_block(candidate.to_dict())
+        assert chain.chain[-1].signature == candidate.signature
+
+        # Stored signatures are checked again by verify_chain
+        chain.chain[2].validations[0].signature = chain.chain[3].validations[0].signature
+        assert chain.verify_chain().invalid == [2]
+        peer.close()
+        chain.close()
+
+    print("✅ Forged signatures rejected!")
+
+def test_non_ed25519_keys_never_skip_verification(registration):
+    """New grants need an Ed25519 key; only stored blocks from before signing skip the signature check"""
+    print("\n🧪 Testing non-Ed25519 authority keys...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chain = PoABlockchain("A", "Node A", blockchain_file=os.path.join(tmp, 'a.json'))
+        assert not chain.grant_authority("Legacy", "SEC_AUTH_PUBLIC_KEY", "localhost:9001", "GENESIS_AUTH")
+        assert len(chain.authorities) == 1 and not chain.pending_blocks
+
+        # A peer's block granting such a key is refused
+        assert chain.create_block(registration(0), "GENESIS_AUTH") and chain.validate_block(1, "GENESIS_AUTH")
+        peer = PoABlockchain("B", "Node B", blockchain_file=os.path.join(tmp, 'b.json'))
+        assert peer.bootstrap_from_snapshot(chain.create_snapshot(2).to_dict())
+        grant = {"type": "AUTHORITY_GRANT", "new_authority_id": "AUTH_X", "new_authority_public_key": "SEC_AUTH_PUBLIC_KEY"}
+        assert chain.create_block(grant, "GENESIS_AUTH") and chain.validate_block(2, "GENESIS_AUTH")
+        assert "not Ed25519" in peer.check_block(chain.chain[2].to_dict())
+        assert not peer.accept_finalized_block(chain.chain[2].to_dict())
+
+        # An authority holding a non-Ed25519 key (granted before signing) can't create or validate new blocks
+        chain.apply_authority_changes(grant)
+        assert not chain.create_block(registration(1), "AUTH_X")
+        assert chain.create_block(registration(1), "GENESIS_AUTH")
+        assert not chain.validate_block(3, "AUTH_X", "SIG_legacy")
+        unsigned = dict(chain.pending_blocks[-1].to_dict(), creator_id="AUTH_X")
+        unsigned.pop('signature')
+        assert chain.requires_signature("AUTH_X") and chain.check_block(unsigned) is not None
+
+        # ...but its blocks already in our store, which carry no signature, still load
+        assert not chain.requires_signature("AUTH_X", stored_block=unsigned)
+        assert chain.requires_signature("AUTH_X", stored_block=dict(unsigned, signature="SIG_legacy"))
+        assert chain.check_signatures([unsigned], stored=True) == []
+        assert chain.check_signatures([unsigned]) == [0]
+        peer.close()
+        chain.close()
+
+    print("✅ Non-Ed25519 keys never turn verification off!")
+
+def tamper_stored_block(path: str, index: int, **changes):
+    """Rewrite one block of a closed chain's log in place"""
+    store = open_store(path)
+    blocks = list(store.iter_blocks(index))
+    store.block_log.truncate(index)
+    store.append_blocks([dict(blocks[0], **changes)] + blocks[1:])
+    store.close()
+
+def test_tampered_log_truncates_on_load(registration):
+    """Loading stops at the first stored block with a bad hash or signature"""
+    print("\n🧪 Testing tampered block logs...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path)
+        for i in range(8):
+            chain.create_block(registration(i), "GENESIS_AUTH")
+            chain.validate_block(chain.pending_blocks[-1].index, "GENESIS_AUTH")
+        hashes = [block.hash for block in chain.chain]
+        signature = chain.chain[2].signature
+        chain.close()
+
+        # Another block's signature: both full and header-only loads stop before it
+        tamper_stored_block(path, 6, signature=signature)
+        for lazy in (False, True):
+            reopened = PoABlockchain("N", "Node", blockchain_file=path, lazy_payloads=lazy)
+            assert [block.hash for block in reopened.chain] == hashes[:6]
+            reopened.close()
+
+        # Changed data under the old hash stops a full load earlier; the next save drops the tail
+        tamper_stored_block(path, 4, data=registration(100))
+        reopened = PoABlockchain("N", "Node", blockchain_file=path)
+        assert [block.hash for block in reopened.chain] == hashes[:4]
+        assert reopened.create_block(registration(8), "GENESIS_AUTH")
+        assert reopened.validate_block(4, "GENESIS_AUTH")
+        reopened.close()
+        extended = PoABlockchain("N", "Node", blockchain_file=path)
+        assert len(extended.chain) == 5 and extended.chain[3].hash == hashes[3]
+        assert extended.verify_chain().valid
+        extended.close()
+
+    print("✅ Tampered logs truncated!")
+
+def test_verified_cache_across_restarts(registration):
+    """A restart finds every signature in the saved cache instead of verifying it again"""
+    print("\n🧪 Testing the verified-signature cache...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path, max_block_transactions=10, block_seal_interval=60)
+        for i in range(200):
+            chain.submit_transaction(registration(i), "GENESIS_AUTH")
+        for block in list(chain.pending_blocks):
+            chain.validate_block(block.index, "GENESIS_AUTH")
+        assert chain.get_authority_stats()['signatures']['misses'] == 0  # our own signatures are never re-checked
+        chain.close()
+
+        reopened = PoABlockchain("N", "Node", blockchain_file=path)
+        stats = reopened.signatures.get_stats()
+        assert stats['misses'] == 0 and stats['hits'] == 2 * len(reopened.chain)
+        reopened.close()
+
+        # Without the cache (or its secret) every signature is verified once, in a batch
+        os.remove(os.path.join(tmp, 'poa.sigcache'))
+        cold = PoABlockchain("N", "Node", blockchain_file=path)
+        assert cold.signatures.get_stats()['misses'] == 2 * len(cold.chain)
+        assert cold.verify_chain().valid
+        assert cold.signatures.get_stats()['misses'] == 2 * len(cold.chain)
+        block = cold.chain[5]
+        cold.close()
+
+        # Cache entries are bound to the node's secret: someone else's cache file proves nothing
+        stranger = SignatureVerifier(b"other secret", path=os.path.join(tmp, 'poa.sigcache'))
+        assert len(stranger.verified) == 2 * len(cold.chain)
+        assert stranger.verify(cold.authorities["GENESIS_AUTH"].public_key, block_message(block.hash), block.signature)
+        assert stranger.get_stats()['misses'] == 1
+
+        # Batches check each distinct signature once; the LRU stays bounded
+        private_key, public_key = generate_keypair()
+        good = (public_key, block_message("cd" * 32), sign(private_key, block_message("cd" * 32)))
+        wrong = (public_key, block_message("ef" * 32), good[2])
+        verifier = SignatureVerifier(b"secret", cache_size=2)
+        assert verifier.verify_batch([good, good, good, wrong]) == [True, True, True, False]
+        assert verifier.get_stats()['misses'] == 2 and verifier.verify(*good)
+        assert verifier.get_stats()['hits'] == 1 and verifier.get_stats()['failures'] == 1
+        for i in range(3):
+            verifier.remember(public_key, block_message(f"{i:064d}"), good[2])
+        assert verifier.get_stats()['cached'] == 2 and not verifier.verify(*wrong)
+
+    print("✅ Verified signatures survive restarts!")
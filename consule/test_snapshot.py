@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+SNAPSHOT AND FAST BOOTSTRAP TEST
+Snapshot integrity, pruning behind a verified snapshot and bootstrapping new nodes
+"""
+
+import os
+import tempfile
+
+from snapshot import Snapshot, SnapshotStore, SnapshotError, ChainView, chain_base
+from simple_blockchain import SimpleP2PNode, SimpleBlock, GENESIS_TIMESTAMP
+from poa_blockchain import PoABlockchain
+
+def genesis_dict():
+    genesis = SimpleBlock(0, "Genesis Block")
+    genesis.timestamp = GENESIS_TIMESTAMP
+    genesis.hash = genesis.calculate_hash()
+    return genesis.to_dict()
+
+def test_snapshot_integrity():
+    """Snapshots round-trip, reject tampering and only the newest few are kept"""
+    print("🧪 Testing snapshot integrity...")
+
+    tip = genesis_dict()
+    snapshot = Snapshot('simple', tip, tip['hash'], {'note': 'x'})
+    data = snapshot.to_dict()
+    assert Snapshot.from_dict(data).snapshot_id == snapshot.snapshot_id
+    assert Snapshot('simple', tip, tip['hash'], {'note': 'x'}).snapshot_id == snapshot.snapshot_id
+
+    for tamper in ({'state': {'note': 'y'}}, {'tip': dict(tip, data="forged")}, {'height': 7}):
+        try:
+            Snapshot.from_dict({**data, **tamper})
+            assert False, f"accepted tampered snapshot {tamper}"
+        except SnapshotError:
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SnapshotStore(os.path.join(tmp, 'chain'), kept=2)
+        for i in range(4):
+            store.save(Snapshot('simple', dict(tip, index=i), tip['hash']))
+        assert store.heights() == [3, 4]
+
+    view = ChainView(100, ['a', 'b', 'c'])
+    assert len(view) == 103 and view[101] == 'b' and view[-1] == 'c'
+    assert view[50:102] == ['a', 'b'] and chain_base(view) == 100 and chain_base([]) == 0
+    try:
+        view[99]
+        assert False, "read below the base"
+    except IndexError:
+        pass
+
+    print("✅ Snapshots are tamper-evident!")
+
+def test_fast_bootstrap_from_peer(linked_node):
+    """A new node starts from a peer's snapshot and downloads only the tail"""
+    print("\n🧪 Testing fast bootstrap...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = linked_node("source", tmp, snapshot_interval=100)
+        for i in range(500):
+            source.add_block(f"history {i}")
+        source.flush()
+        for i in range(7):
+            source.add_block(f"tail {i}")
+        assert source.latest_snapshot.height == 500
+
+        fresh = linked_node("fresh", tmp, fast_bootstrap=True)
+        fresh.link(source)
+        fresh.send_to_peer("source", fresh.build_hello())
+
+        assert len(fresh.blockchain) == 508
+        assert fresh.blockchain[-1].hash == source.blockchain[-1].hash
+        assert chain_base(fresh.blockchain) == 499
+        assert 'snapshot' in source.sent_types and 'blockchain' not in source.sent_types
+        assert source.sent_bytes < 5000
+
+        # The bootstrapped node keeps working: it extends the chain and restarts from disk
+        fresh.add_block("after bootstrap")
+        assert source.blockchain[-1].hash == fresh.blockchain[-1].hash
+        fresh.close_storage()
+        restarted = SimpleP2PNode(blockchain_file=os.path.join(tmp, "fresh.json"))
+        assert len(restarted.blockchain) == 509 and chain_base(restarted.blockchain) == 499
+        assert restarted.blockchain[-1].hash == source.blockchain[-1].hash
+        restarted.close_storage()
+
+        # Without fast bootstrap the same node syncs the full history
+        full = linked_node("full", tmp)
+        full.link(source)
+        full.send_to_peer("source", full.build_hello())
+        assert len(full.blockchain) == 509 and chain_base(full.blockchain) == 0
+
+    print("✅ New node bootstrapped from the snapshot plus the tail!")
+
+def test_prune_behind_verified_snapshot():
+    """Pruning keeps only blocks after a verified snapshot; reload starts from it"""
+    print("\n🧪 Testing pruning behind a snapshot...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'node.json')
+        node = SimpleP2PNode(blockchain_file=path, segment_size=2000)
+        for i in range(300):
+            node.add_block(f"block {i}")
+        tip = node.blockchain[-1].hash
+
+        assert node.prune_history(keep_recent=50) > 0
+        assert chain_base(node.blockchain) == 250
+        assert node.block_log.first_position <= 250
+        assert node.verify_snapshot(node.latest_snapshot)
+        node.add_block("after prune")
+        node.close_storage()
+
+        reloaded = SimpleP2PNode(blockchain_file=path)
+        assert len(reloaded.blockchain) == 302 and chain_base(reloaded.blockchain) == 250
+        assert reloaded.blockchain[300].hash == tip
+        assert reloaded.get_status()['snapshot']['height'] == 251
+        reloaded.close_storage()
+
+    print("✅ History pruned behind a verified snapshot!")
+
+def test_poa_snapshot_and_bootstrap():
+    """PoA snapshots carry authorities and projections; a new node bootstraps from one"""
+    print("\n🧪 Testing PoA snapshots...")
+
+    def finalize(chain, data):
+        chain.create_block(data, "GENESIS_AUTH")
+        chain.validate_block(chain.pending_blocks[-1].index, "GENESIS_AUTH")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = PoABlockchain("S", "Source", blockchain_file=os.path.join(tmp, 'source.json'),
+                               segment_size=3000, snapshot_interval=20)
+        finalize(source, {"type": "ORGANIZATION_CREATION", "organization_id": "org1",
+                          "organization_name": "Org", "creator_user_id": "user0"})
+        for i in range(30):
+            finalize(source, {"type": "USER_REGISTRATION", "user_id": f"user{i}", "username": f"u{i}"})
+            if i % 3 == 0:
+                finalize(source, {"type": "ORGANIZATION_JOIN", "organization_id": "org1", "user_id": f"user{i}"})
+        source.flush()
+        snapshot = source.latest_snapshot
+        assert snapshot.height == 40
+        assert source.verify_snapshot(snapshot)
+        assert snapshot.state['organizations']['org1']['members'][:2] == ["user0", "user3"]
+        assert snapshot.state['type_counts']['USER_REGISTRATION'] + 1 + 1 + snapshot.state['type_counts'].get(
+            'ORGANIZATION_JOIN', 0) == 40
+
+        forged = Snapshot('poa', snapshot.tip, snapshot.genesis_hash,
+                          dict(snapshot.state, users={}))
+        assert not source.verify_snapshot(forged)
+
+        fresh = PoABlockchain("F", "Fresh", blockchain_file=os.path.join(tmp, 'fresh.json'))
+        tail = [block.to_dict() for block in source.chain[snapshot.height:]]
+        assert fresh.bootstrap_from_snapshot(source.get_snapshot(), tail)
+        assert [b.hash for b in fresh.chain] == [b.hash for b in source.chain[snapshot.height - 1:]]
+        assert set(fresh.authorities) == set(source.authorities)
+        for data_type in ("USER_REGISTRATION", "ORGANIZATION_JOIN", "ORGANIZATION_CREATION"):
+            assert fresh.count_blocks(data_type) == source.count_blocks(data_type)
+        assert [b.index for b in fresh.find_blocks(user_id="user29")] == [source.chain[-1].index]
+        fresh.close()
+
+        reopened = PoABlockchain("F", "Fresh", blockchain_file=os.path.join(tmp, 'fresh.json'))
+        assert len(reopened.chain) == len(source.chain) and chain_base(reopened.chain) == snapshot.height - 1
+        assert reopened.count_blocks("USER_REGISTRATION") == 30
+        reopened.close()
+
+        # Pruning the source keeps its counts and reloads from the snapshot
+        assert source.prune_history(keep_recent=5) > 0
+        registrations = source.count_blocks("USER_REGISTRATION")
+        source.close()
+        pruned = PoABlockchain("S", "Source", blockchain_file=os.path.join(tmp, 'source.json'))
+        assert chain_base(pruned.chain) > 0 and pruned.count_blocks("USER_REGISTRATION") == registrations == 30
+        pruned.close()
+
+    print("✅ PoA nodes snapshot, prune and bootstrap!")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+TRANSACTION POOL TEST
+Packing many events into one PoA block, sealing on size and time limits
+"""
+
+import os
+import tempfile
+import time
+
+from tx_pool import TransactionPool, block_transactions, batch_data, TX_BATCH_TYPE
+from poa_blockchain import PoABlockchain
+from poa_store import STORAGE_SQLITE
+from snapshot import chain_base
+
+def test_pool_limits(registration):
+    """The pool hands out batches bounded by count and bytes, oldest first"""
+    print("🧪 Testing pool limits...")
+
+    pool = TransactionPool(max_transactions=10, max_bytes=400, max_age=5.0)
+    for i in range(25):
+        pool.add(registration(i), added_at=100.0)
+    assert pool.is_full() and pool.is_due(now=105.0) and not pool.is_due(now=101.0)
+
+    batch = pool.take()
+    assert batch[0] == registration(0) and len(batch) < 10  # the byte limit cut it short
+    taken = list(batch)
+    while len(pool):
+        taken.extend(pool.take())
+    assert taken == [registration(i) for i in range(25)]
+    assert pool.get_stats()['sealed_transactions'] == 25
+
+    assert block_transactions(batch_data(batch)) == batch
+    assert block_transactions(registration(1)) == [registration(1)]
+    assert block_transactions("legacy string data") == []
+
+    print("✅ Pool batches respect the limits!")
+
+def test_burst_packed_into_few_blocks(registration):
+    """A registration burst needs a handful of validation rounds, not one per event"""
+    print("\n🧪 Testing packed blocks...")
+
+    for storage in ("log", STORAGE_SQLITE):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'poa.json')
+            chain = PoABlockchain("N", "Node", blockchain_file=path, storage=storage,
+                                  max_block_transactions=200, block_seal_interval=60)
+            for i in range(1000):
+                assert chain.submit_transaction(registration(i), "GENESIS_AUTH")
+            chain.submit_transaction({"type": "ORGANIZATION_JOIN", "organization_id": "org1", "user_id": "user7"},
+                                     "GENESIS_AUTH")
+            assert len(chain.pending_blocks) == 5 and len(chain.tx_pool) == 1
+
+            # Whatever is left is sealed once the time limit passes
+            assert len(chain.seal_due_blocks("GENESIS_AUTH", now=time.time() + 61)) == 1
+            for block in list(chain.pending_blocks):
+                chain.validate_block(block.index, "GENESIS_AUTH")
+            assert len(chain.chain) == 7
+            assert chain.chain[1].data['type'] == TX_BATCH_TYPE and chain.chain[1].data['tx_count'] == 200
+            assert chain.verify_chain().valid
+
+            assert chain.count_transactions("USER_REGISTRATION") == 1000
+            assert chain.count_blocks("ORGANIZATION_JOIN") == 1
+            assert [b.index for b in chain.find_blocks(user_id="user7")] == [1, 6]
+            assert [b.index for b in chain.find_blocks("ORGANIZATION_JOIN", user_id="user7")] == [6]
+            assert chain.find_blocks("ORGANIZATION_JOIN", user_id="user8") == []
+            stats = chain.get_authority_stats()['transaction_pool']
+            assert stats['sealed_blocks'] == 6 and stats['pooled'] == 0
+            chain.close()
+
+            reloaded = PoABlockchain("N", "Node", blockchain_file=path, storage=storage)
+            assert reloaded.count_transactions("USER_REGISTRATION") == 1000
+            assert [b.index for b in reloaded.find_blocks(user_id="user999")] == [5]
+            reloaded.close()
+
+    print("✅ 1001 events packed into 6 blocks!")
+
+def test_background_sealing_and_snapshots(registration):
+    """The block builder seals on the time limit; pooled events survive a restart"""
+    print("\n🧪 Testing background sealing...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'poa.json')
+        chain = PoABlockchain("N", "Node", blockchain_file=path, block_seal_interval=0.2,
+                              snapshot_interval=2)
+        chain.start_block_builder("GENESIS_AUTH")
+        for i in range(30):
+            chain.submit_transaction(registration(i), "GENESIS_AUTH")
+        deadline = time.time() + 5
+        while len(chain.tx_pool) and time.time() < deadline:
+            time.sleep(0.05)
+        chain.stop_block_builder()
+        assert len(chain.tx_pool) == 0 and len(chain.pending_blocks) >= 1
+        for block in list(chain.pending_blocks):
+            chain.validate_block(block.index, "GENESIS_AUTH")
+        chain.flush()
+
+        # Snapshot projections see every packed transaction
+        assert len(chain.latest_snapshot.state['users']) == 30
+        assert chain.prune_history() >= 0 and chain.count_transactions("USER_REGISTRATION") == 30
+
+        chain.submit_transaction(registration(99), "GENESIS_AUTH")
+        chain.close()
+        reloaded = PoABlockchain("N", "Node", blockchain_file=path)
+        assert reloaded.tx_pool.pending() == [registration(99)]
+        reloaded.close()
+
+    print("✅ Builder sealed pooled events in the background!")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+TRANSACTION POOL
+Events waiting to be packed into multi-transaction PoA blocks
+
+Instead of one block (and one validation round) per event, an authority
+submits events to a pool and seals them into a single block whose data
+carries the list of transactions. A block is sealed once the pool reaches
+a transaction count or byte limit, or once its oldest transaction has
+waited long enough. Blocks written before packing existed carry a single
+event as their data; block_transactions() reads both shapes.
+"""
+
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+TX_BATCH_TYPE = "TRANSACTION_BATCH"
+MAX_BLOCK_TRANSACTIONS = 500     # Transactions packed into one block at most
+MAX_BLOCK_BYTES = 512 * 1024     # Serialized transaction bytes packed into one block at most
+BLOCK_SEAL_INTERVAL = 2.0        # Seconds the oldest pooled transaction waits before its block is sealed
+
+def block_transactions(data) -> List[Dict]:
+    """Events carried by a block: its transaction list, or the data itself for a single-event block"""
+    if not isinstance(data, dict):
+        return []
+    if data.get('type') == TX_BATCH_TYPE:
+        return data.get('transactions', [])
+    return [data]
+
+def batch_data(transactions: List[Dict]) -> Dict:
+    """Block data for a packed block"""
+    return {'type': TX_BATCH_TYPE, 'tx_count': len(transactions), 'transactions': transactions}
+
+class TransactionPool:
+    """Pooled events in arrival order, handed out in block-sized batches"""
+    def __init__(self, max_transactions: int = MAX_BLOCK_TRANSACTIONS, max_bytes: int = MAX_BLOCK_BYTES,
+                 max_age: float = BLOCK_SEAL_INTERVAL):
+        self.max_transactions = max_transactions
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries: List[tuple] = []  # (transaction, size, added_at), oldest first
+        self.size = 0
+        self.submitted = 0
+        self.sealed_blocks = 0
+        self.sealed_transactions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, transaction: Dict, added_at: float = None):
+        size = len(json.dumps(transaction))
+        with self.lock:
+            self.entries.append((transaction, size, added_at or time.time()))
+            self.size += size
+            self.submitted += 1
+
+    def is_full(self) -> bool:
+        """Enough is pooled to fill a block"""
+        return len(self.entries) >= self.max_transactions or self.size >= self.max_bytes
+
+    def is_due(self, now: float = None) -> bool:
+        """The oldest pooled transaction has waited max_age"""
+        with self.lock:
+            return bool(self.entries) and (now or time.time()) - self.entries[0][2] >= self.max_age
+
+    def take(self) -> List[Dict]:
+        """Remove and return the oldest transactions that fit in one block (at least one)"""
+        with self.lock:
+            count, size = 0, 0
+            for _, tx_size, _ in self.entries[:self.max_transactions]:
+                if count and size + tx_size > self.max_bytes:
+                    break
+                count += 1
+                size += tx_size
+            batch = [entry[0] for entry in self.entries[:count]]
+            del self.entries[:count]
+            self.size -= size
+            if batch:
+                self.sealed_blocks += 1
+                self.sealed_transactions += len(batch)
+            return batch
+
+    def put_back(self, transactions: List[Dict]):
+        """Return a batch that could not be sealed to the front of the pool"""
+        self.requeue(transactions)
+        with self.lock:
+            self.sealed_blocks -= 1
+            self.sealed_transactions -= len(transactions)
+
+    def requeue(self, transactions: List[Dict]):
+        """Put transactions from a block that will never be finalized back at the front of the pool"""
+        now = time.time()
+        entries = [(tx, len(json.dumps(tx)), now) for tx in transactions]
+        with self.lock:
+            self.entries[:0] = entries
+            self.size += sum(entry[1] for entry in entries)
+
+    def pending(self) -> List[Dict]:
+        with self.lock:
+            return [entry[0] for entry in self.entries]
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'pooled': len(self.entries),
+                'pooled_bytes': self.size,
+                'submitted': self.submitted,
+                'sealed_blocks': self.sealed_blocks,
+                'sealed_transactions': self.sealed_transactions,
+                'avg_transactions_per_block': (self.sealed_transactions / self.sealed_blocks
+                                               if self.sealed_blocks else 0.0)
+            }
+
+class BlockSealer:
+    """Background thread that periodically seals blocks the pool has waited long enough for"""
+    def __init__(self, seal: Callable[[], int], interval: float, name: str = "block-sealer"):
+        self.seal = seal
+        self.interval = interval
+        self.name = name
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.seal()
+            except Exception as e:
+                print(f"❌ Block sealing failed: {e}")
+
+    def stop(self, timeout: float = 10.0):
+        self.stopping.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        self.thread = None